@@ -0,0 +1,91 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from src.chatbot.chatbot import RETRIEVAL_RESOURCES, TEST_QUERIES, ChatbotEngine, build_prompt
+from src.chatbot.context_builder import estimate_tokens
+from src.utils.constants import CONTEXT_TOKEN_BUDGET
+
+# Prompt size and answer latency with the raw retrieved items in the prompt
+# (before) and with the context builder's merged, budgeted entries (after),
+# on the chatbot's TEST_QUERIES:
+#
+#   python -m src.benchmarks.bench_context [--budget 2000] [--llm]
+#
+# Tokens are estimated (about four characters per token) unless --llm is
+# given, in which case Gemini counts them and each prompt is also sent to
+# it, so end-to-end latency (retrieval, prompt building and generation) is
+# measured too. --llm needs GOOGLE_API_KEY and makes two calls per query.
+
+default_output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+
+
+def prompt_tokens(prompt, model):
+    if model is None:
+        return estimate_tokens(prompt)
+    return model.count_tokens(prompt).total_tokens
+
+
+def measure(engine, query, model, k, budgeted):
+    """(entries, prompt tokens, seconds to build the prompt, end-to-end seconds or None) for one query."""
+    started = time.perf_counter()
+    items = engine.retrieve_top_k(query, k=k)
+    context = engine.build_context(items) if budgeted else items
+    prompt = build_prompt(context, query)
+    build_seconds = time.perf_counter() - started
+    total_seconds = None
+    if model is not None:
+        model.generate_content(prompt)
+        total_seconds = time.perf_counter() - started
+    return len(context), prompt_tokens(prompt, model), build_seconds, total_seconds
+
+
+def run(engine, model, k):
+    print(f"{'query':<44} {'items':>5} {'tokens':>7} {'entries':>8} {'tokens':>7} {'saved':>6} "
+          f"{'e2e s before':>13} {'e2e s after':>12}")
+    totals = {"before": [], "after": [], "before_s": [], "after_s": [], "build_ms": []}
+    for query in TEST_QUERIES:
+        engine.retrieve_top_k(query, k=k)  # Warm: both runs read the same cached retrieval
+        items, before_tokens, _, before_s = measure(engine, query, model, k, budgeted=False)
+        entries, after_tokens, build_s, after_s = measure(engine, query, model, k, budgeted=True)
+        totals["before"].append(before_tokens)
+        totals["after"].append(after_tokens)
+        totals["build_ms"].append(build_s * 1000)
+        if model is not None:
+            totals["before_s"].append(before_s)
+            totals["after_s"].append(after_s)
+        print(f"{query[:44]:<44} {items:>5} {before_tokens:>7} {entries:>8} {after_tokens:>7} "
+              f"{1 - after_tokens / max(before_tokens, 1):>6.0%} "
+              f"{before_s if before_s is not None else float('nan'):>13.2f} "
+              f"{after_s if after_s is not None else float('nan'):>12.2f}")
+    print(f"\nMean prompt tokens: {np.mean(totals['before']):.0f} before, {np.mean(totals['after']):.0f} after "
+          f"({1 - np.sum(totals['after']) / np.sum(totals['before']):.0%} fewer); "
+          f"retrieval + context building p50 {np.percentile(totals['build_ms'], 50):.1f} ms")
+    if totals["before_s"]:
+        print(f"Mean end-to-end latency: {np.mean(totals['before_s']):.2f}s before, "
+              f"{np.mean(totals['after_s']):.2f}s after")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prompt size and latency with the context builder.")
+    parser.add_argument('--output-dir', default=default_output_dir,
+                        help="Directory holding faiss_index.bin, metadata.cols and bm25_index.bin.")
+    parser.add_argument('--budget', type=int, default=CONTEXT_TOKEN_BUDGET, help="Context token budget.")
+    parser.add_argument('--k', type=int, default=50, help="Items retrieved per query (the chatbot uses 50).")
+    parser.add_argument('--llm', action='store_true', help="Count tokens with and send the prompts to Gemini.")
+    args = parser.parse_args()
+
+    engine = ChatbotEngine(os.path.join(args.output_dir, 'faiss_index.bin'),
+                           os.path.join(args.output_dir, 'metadata.cols'),
+                           lexical_path=os.path.join(args.output_dir, 'bm25_index.bin'),
+                           context_token_budget=args.budget)
+    if not engine.load(RETRIEVAL_RESOURCES):
+        raise SystemExit(f"Retrieval resources did not load: {engine.status()}")
+    model = None
+    if args.llm:
+        model = engine.resource('llm')
+        if model is None:
+            raise SystemExit(f"Gemini is unavailable: {engine.status()['llm']}")
+    run(engine, model, args.k)
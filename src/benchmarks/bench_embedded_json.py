@@ -0,0 +1,158 @@
+import argparse
+import glob
+import json
+import os
+import re
+import time
+
+from bs4 import BeautifulSoup
+
+from src.scraper.embedded_json import extract_products, iter_script_bodies
+from src.scraper.local_eatsure_server import default_pages_dir, default_raw_path, render_page
+
+# Compares the old regex JSON sniffing in RestaurantScraper.scrape with the
+# single-pass embedded JSON extractor, on saved pages:
+#
+#   python -m src.benchmarks.bench_embedded_json [--pages-dir DIR] [--repeat N]
+#
+# Without saved pages, pages are rendered from raw_extracted_data.json. Each
+# page is also measured in a "nested" variant whose products carry nested
+# `details`/`tags` objects, as the live EatSure payloads do. Finding the script
+# bodies is timed separately for the full BeautifulSoup parse and the fast path.
+
+
+def legacy_extract(scripts):
+    """The previous extractor: non-greedy regex candidates, json.loads on each."""
+    json_regex = re.compile(r'\{.*?\}', re.DOTALL)
+    products = []
+    failed_decodes = 0
+    for text in scripts:
+        for match in json_regex.findall(text):
+            try:
+                parsed_json = json.loads(match)
+            except json.JSONDecodeError:
+                failed_decodes += 1
+                continue
+            if isinstance(parsed_json, dict) and 'product_name' in parsed_json:
+                products.append(parsed_json)
+    return products, failed_decodes
+
+
+def script_bodies(page_html):
+    soup = BeautifulSoup(page_html, 'html.parser')
+    return [script.string for script in soup.find_all('script') if script.string]
+
+
+def with_nested_fields(restaurant):
+    """Copies a restaurant with nested objects added to each product."""
+    nested = dict(restaurant)
+    nested['menu_items'] = []
+    for item in restaurant.get('menu_items', []):
+        item = dict(item)
+        item['details'] = {"serves": 1, "nutrition": {"kcal": 450, "protein_g": 18}}
+        item['tags'] = [{"id": 7, "name": "bestseller"}]
+        nested['menu_items'].append(item)
+    return nested
+
+
+def load_pages(pages_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def render_pages_from_raw(raw_path, nested=False):
+    with open(raw_path, 'r', encoding='utf-8') as f:
+        raw_data = json.load(f)
+    pages = []
+    for position, restaurant in enumerate(raw_data):
+        if nested:
+            restaurant = with_nested_fields(restaurant)
+        pages.append((f"raw-{position}", render_page(restaurant)))
+    return pages
+
+
+def run(label, pages, repeat):
+    scripts_per_page = [script_bodies(page_html) for _, page_html in pages]
+    expected = sum(1 for scripts in scripts_per_page for _ in _count_products(scripts))
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        legacy_total, failed_total = 0, 0
+        for scripts in scripts_per_page:
+            products, failed = legacy_extract(scripts)
+            legacy_total += len(products)
+            failed_total += failed
+    legacy_seconds = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        new_total = sum(len(extract_products(scripts)) for scripts in scripts_per_page)
+    new_seconds = (time.perf_counter() - started) / repeat
+
+    print(f"\n{label}: {len(pages)} pages, {expected} products embedded")
+    print(f"  regex sniffing : {legacy_seconds * 1000:8.1f} ms/run, {legacy_total:5d} items "
+          f"({legacy_total / expected:.1%} recall), {failed_total} failed json.loads calls")
+    print(f"  embedded JSON  : {new_seconds * 1000:8.1f} ms/run, {new_total:5d} items "
+          f"({new_total / expected:.1%} recall)")
+    if new_seconds > 0:
+        print(f"  speedup        : {legacy_seconds / new_seconds:.1f}x")
+
+
+def run_script_scan(label, pages, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        soup_scripts = [script_bodies(page_html) for _, page_html in pages]
+    soup_seconds = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fast_scripts = [list(iter_script_bodies(page_html)) for _, page_html in pages]
+    fast_seconds = (time.perf_counter() - started) / repeat
+
+    total_bytes = sum(len(page_html) for _, page_html in pages)
+    print(f"\n{label}: finding <script> bodies in {total_bytes / 1024 / 1024:.1f} MB of HTML")
+    print(f"  BeautifulSoup tree : {soup_seconds * 1000:8.1f} ms/run")
+    print(f"  fast script slicing: {fast_seconds * 1000:8.1f} ms/run")
+    if fast_seconds > 0:
+        print(f"  speedup            : {soup_seconds / fast_seconds:.0f}x")
+    print(f"  same script bodies : {soup_scripts == fast_scripts}")
+
+
+def _count_products(scripts):
+    """Ground truth: products reachable in the page state, decoded as a whole."""
+    for text in scripts:
+        try:
+            value = json.loads(text)
+        except ValueError:
+            continue
+        stack = [value]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                if 'product_name' in node:
+                    yield node
+                    continue
+                stack.extend(node.values())
+            elif isinstance(node, list):
+                stack.extend(node)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedded JSON extraction on saved pages.")
+    parser.add_argument('--pages-dir', default=default_pages_dir)
+    parser.add_argument('--raw', default=default_raw_path,
+                        help="Raw data used to render pages when no saved pages exist.")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    saved_pages = load_pages(args.pages_dir) if os.path.isdir(args.pages_dir) else []
+    if saved_pages:
+        label = f"saved pages ({args.pages_dir})"
+    else:
+        label, saved_pages = "pages rendered from raw data", render_pages_from_raw(args.raw)
+    run_script_scan(label, saved_pages, args.repeat)
+    run(label, saved_pages, args.repeat)
+    run("pages with nested details/tags", render_pages_from_raw(args.raw, nested=True), args.repeat)
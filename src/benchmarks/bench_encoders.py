@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+
+from src.preprocessing.encoders import BACKENDS, make_encoder, topk_overlap
+from src.preprocessing.preprocess_and_index import EMBEDDING_MODEL_NAME
+from src.utils.constants import ENCODER_BATCH_SIZE, ENCODER_CHECK_K, ENCODER_MIN_TOPK_OVERLAP
+
+# Measures indexing throughput of each encoder backend on processed_chunks.json
+# and how closely its vectors agree with the fp32 model:
+#
+#   python -m src.benchmarks.bench_encoders [--backend pool --backend onnx-int8] [--limit N]
+#
+# The first backend listed is the reference for the top-k overlap column.
+# Model loading is excluded: each backend encodes a small warm-up batch first.
+
+default_chunks_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'output', 'processed_chunks.json')
+
+
+def run(texts, backends, batch_size, workers, k):
+    reference = None
+    print(f"{'backend':<22} {'docs/sec':>10} {'top-' + str(k) + ' overlap':>15}")
+    for backend in backends:
+        encoder = make_encoder(backend, EMBEDDING_MODEL_NAME, batch_size, workers=workers)
+        try:
+            encoder.encode(texts[:batch_size])  # Warm-up: model load, pool start-up
+            encoder.docs, encoder.seconds = 0, 0.0
+            vectors = encoder.encode(texts)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"{backend:<22} unavailable: {e}")
+            continue
+        finally:
+            encoder.close()
+        if reference is None:
+            reference = vectors
+        overlap = topk_overlap(reference, vectors, k)
+        flag = '' if overlap >= ENCODER_MIN_TOPK_OVERLAP else '  (below threshold)'
+        print(f"{backend:<22} {encoder.docs / encoder.seconds:>10.1f} {overlap:>15.3f}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends.")
+    parser.add_argument('--chunks', default=default_chunks_path)
+    parser.add_argument('--backend', action='append', choices=BACKENDS, dest='backends',
+                        help="Backend to measure (repeatable; default: all).")
+    parser.add_argument('--batch-size', type=int, default=ENCODER_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=None, help="Processes for the pool backend.")
+    parser.add_argument('--limit', type=int, default=None, help="Only encode the first N chunks.")
+    parser.add_argument('--k', type=int, default=ENCODER_CHECK_K)
+    args = parser.parse_args()
+
+    with open(args.chunks, 'r', encoding='utf-8') as f:
+        chunks = json.load(f)[:args.limit]
+    print(f"{len(chunks)} documents, batch size {args.batch_size}")
+    run(chunks, args.backends or list(BACKENDS), args.batch_size, args.workers, args.k)
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import random
+import re
+import time
+from collections import Counter
+
+from src.preprocessing.preprocess_and_index import FEATURE_KEYWORDS, extract_features, extract_menu_features
+
+# Keyword feature extraction of preprocess_data, before and after the
+# compiled matcher, on a synthetic menu built from the scraped descriptions:
+#
+#   python -m src.benchmarks.bench_feature_extraction [--items 1000000] [--menu-size 100]
+#
+#   substring  the previous extract_features: a substring count / `in` scan
+#              per keyword per item (legacy_extract_features below)
+#   per item   extract_features: one pass of a compiled word-boundary regex
+#   per menu   extract_menu_features: one pass over a whole menu's text
+#
+# Synthetic items splice sentences from random real descriptions, so the
+# keyword mix is realistic. Outputs are compared item by item: the compiled
+# matcher must agree exactly with searching each keyword on its own at word
+# boundaries, and every difference from the substring version must be a
+# keyword found only inside a longer word ("nut" in "donut"), tallied below.
+
+default_raw_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output',
+                                'raw_extracted_data.json')
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+def legacy_extract_features(description, tags):
+    """extract_features as it was: substring scans, so "nut" matched "donut" and "gf" any word holding it."""
+    description = description.lower()
+    keywords = FEATURE_KEYWORDS
+    spice_counter = sum(description.count(word) * weight for word, weight in keywords["spicy"].items())
+    sweet_counter = sum(description.count(word) * weight for word, weight in keywords["sweet"].items())
+    preparation_tags = [prep for prep in keywords["preparation"] if prep in description]
+    dish_tags = [char for char in keywords["dish_characteristics"] if char in description]
+    cuisine_tags = [cuisine for cuisine in keywords["cuisine"] if cuisine in description]
+    dietary_tags = [diet for diet in keywords["dietary"] if diet in description]
+    allergens = [allergen for allergen in keywords["allergens"] if allergen in description]
+    gluten_free = any(phrase in description for phrase in keywords["gluten_free"])
+    features = {"spice_counter": spice_counter, "sweet_counter": sweet_counter, "gluten_free": gluten_free,
+                "preparation_tags": preparation_tags, "dish_tags": dish_tags, "cuisine_tags": cuisine_tags,
+                "dietary_tags": dietary_tags, "allergens": allergens}
+    if spice_counter > 0 and "spicy" not in tags:
+        tags.append("spicy")
+    if sweet_counter > 0 and "sweet" not in tags:
+        tags.append("sweet")
+    if gluten_free and "gluten-free" not in tags:
+        tags.append("gluten-free")
+    tags.extend(preparation_tags + dish_tags + cuisine_tags + dietary_tags)
+    return features
+
+
+_WORD_PATTERNS = {}
+
+
+def word_count(description, word):
+    """Whole-word matches of one keyword (plural 's' / 'es' allowed), searched on its own."""
+    pattern = _WORD_PATTERNS.get(word)
+    if pattern is None:
+        pattern = _WORD_PATTERNS[word] = re.compile(r'(?<!\w)' + re.escape(word) + r'(?:e?s)?(?!\w)')
+    return len(pattern.findall(description))
+
+
+def reference_features(description):
+    """What the compiled matcher must return: every keyword searched for on its own, at word boundaries."""
+    description = description.lower()
+    features = {"spice_counter": sum(word_count(description, word) * weight
+                                     for word, weight in FEATURE_KEYWORDS["spicy"].items()),
+                "sweet_counter": sum(word_count(description, word) * weight
+                                     for word, weight in FEATURE_KEYWORDS["sweet"].items()),
+                "gluten_free": any(word_count(description, word) for word in FEATURE_KEYWORDS["gluten_free"])}
+    for category, feature in (("preparation", "preparation_tags"), ("dish_characteristics", "dish_tags"),
+                              ("cuisine", "cuisine_tags"), ("dietary", "dietary_tags"), ("allergens", "allergens")):
+        features[feature] = [word for word in FEATURE_KEYWORDS[category] if word_count(description, word)]
+    return features
+
+
+def boundary_fixes(description, legacy, features):
+    """The keywords the substring version found inside longer words; None if a difference is anything else."""
+    description = description.lower()
+    fixes = []
+    for feature, value in legacy.items():
+        if value == features[feature]:
+            continue
+        if feature in ("spice_counter", "sweet_counter"):
+            weights = FEATURE_KEYWORDS["spicy" if feature == "spice_counter" else "sweet"]
+            inside = {word: description.count(word) - word_count(description, word) for word in weights}
+            if value - features[feature] != sum(count * weights[word] for word, count in inside.items()):
+                return None
+            fixes.extend(word for word, count in inside.items() if count > 0)
+            continue
+        if feature == "gluten_free":
+            dropped = [] if features[feature] else [word for word in FEATURE_KEYWORDS["gluten_free"] if word in description]
+        else:
+            dropped = [word for word in value if word not in features[feature]]
+            if [word for word in features[feature] if word not in value]:
+                return None  # Found by the matcher only
+        if not dropped or any(word_count(description, word) for word in dropped):
+            return None  # A dropped keyword that does stand as a word
+        fixes.extend(dropped)
+    return fixes
+
+
+def synthetic_menus(sentences, items, menu_size, seed=0):
+    """Menus of `menu_size` descriptions, each one to three random sentences, `items` descriptions in all."""
+    rng = random.Random(seed)
+    for start in range(0, items, menu_size):
+        yield [" ".join(rng.choice(sentences) for _ in range(rng.randint(1, 3)))
+               for _ in range(min(menu_size, items - start))]
+
+
+def load_sentences(raw_path):
+    with open(raw_path, 'r', encoding='utf-8') as f:
+        raw_data = json.load(f)
+    sentences = set()
+    for restaurant in raw_data:
+        for item in restaurant.get('menu_items', []):
+            for field in ('small_description', 'big_description'):
+                sentences.update(sentence.strip() for sentence in SENTENCE_PATTERN.split(item.get(field) or '')
+                                 if sentence.strip())
+    return sorted(sentences)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark keyword feature extraction on a synthetic menu.")
+    parser.add_argument('--raw', default=default_raw_path, help="Scraped data to take description sentences from.")
+    parser.add_argument('--items', type=int, default=1_000_000)
+    parser.add_argument('--menu-size', type=int, default=100, help="Items per restaurant menu (batch API).")
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.raw)
+    print(f"{args.items} synthetic items from {len(sentences)} description sentences, menus of {args.menu_size}")
+    seconds = Counter()
+    differing, mismatches, unexplained = 0, 0, 0
+    fixes = Counter()
+    for menu in synthetic_menus(sentences, args.items, args.menu_size):
+        started = time.perf_counter()
+        legacy = [legacy_extract_features(description, []) for description in menu]
+        seconds["substring"] += time.perf_counter() - started
+        started = time.perf_counter()
+        single = [extract_features(description, []) for description in menu]
+        seconds["per item"] += time.perf_counter() - started
+        started = time.perf_counter()
+        batch = extract_menu_features(menu, [[] for _ in menu])
+        seconds["per menu"] += time.perf_counter() - started
+
+        for description, old, new, batched in zip(menu, legacy, single, batch):
+            if new != batched or (old != new and new != reference_features(description)):
+                mismatches += 1
+            if old != new:
+                differing += 1
+                dropped = boundary_fixes(description, old, new)
+                if dropped is None:
+                    unexplained += 1
+                fixes.update(dropped or ())
+
+    print(f"\n{'extractor':<12} {'seconds':>9} {'us/item':>9} {'speedup':>8}")
+    for name in ("substring", "per item", "per menu"):
+        print(f"{name:<12} {seconds[name]:>9.2f} {seconds[name] / args.items * 1e6:>9.2f} "
+              f"{seconds['substring'] / seconds[name]:>7.1f}x")
+    print(f"\nItems whose features changed: {differing} ({differing / args.items:.1%}); "
+          f"not a boundary fix: {unexplained}; matcher vs per-keyword word search mismatches: {mismatches}")
+    if fixes:
+        print("Substring-only keyword hits dropped: " + ", ".join(f"{word} {count}" for word, count in fixes.most_common()))
@@ -0,0 +1,94 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src.benchmarks.bench_index_types import make_queries, synthetic_corpus
+from src.benchmarks.bench_metadata_store import build_metadata, default_kb_path
+from src.preprocessing.index_factory import INDEX_TYPES, add_vectors, default_params, internal_ids, new_index, search
+from src.preprocessing.metadata_store import MetadataStore, write_metadata_store
+
+# Compares filtered retrieval inside the FAISS search (an ID selector built
+# from the metadata store's filter indexes) with searching unfiltered and
+# discarding non-matching results (post-filtering, over-fetching
+# --overfetch times k):
+#
+#   python -m src.benchmarks.bench_filters [--scale 50] [--type hnsw]
+#
+# Metadata is knowledge_base.json replicated --scale times; vectors are a
+# synthetic clustered corpus of the same size. For each filter the script
+# reports its selectivity, how many of the k results each method returns,
+# recall@k against exact filtered search, and p50 latency.
+
+FILTERS = (
+    ("veg", {"dish_type": "veg"}),
+    ("veg under 150", {"dish_type": "veg", "price": (None, 150)}),
+    ("budget", {"affordability_tag": "budget"}),
+    ("one restaurant", {"restaurant_name": "Faasos", "price": (200, 400)}),
+    ("vegetarian tag", {"dietary_tags": "vegetarian"}),
+)
+
+
+def run(store, index, params, vectors, queries, k, overfetch):
+    ids = internal_ids(index)
+    rows = store.rows_for_ids(ids)
+    print(f"{'filter':<16} {'matches':>8} {'select %':>9} {'pre n':>6} {'pre recall':>11} {'pre ms':>7} "
+          f"{'post n':>7} {'post recall':>12} {'post ms':>8}")
+    for label, filters in FILTERS:
+        started = time.perf_counter()
+        allowed = store.filter_mask(filters, rows)
+        mask_ms = (time.perf_counter() - started) * 1000
+        matching = ids[allowed]
+        # Corpus rows follow the sorted IDs; IVF indexes list theirs cell by cell
+        exact = exact_filtered(vectors[np.searchsorted(np.sort(ids), matching)], matching, queries, k)
+        matching_set = set(matching.tolist())
+        pre, post = [], []
+        for method, out in (('pre', pre), ('post', post)):
+            latencies, counts, recalls = [], [], []
+            for query, truth in zip(queries, exact):
+                started = time.perf_counter()
+                if method == 'pre':
+                    _, I = search(index, params, query[None, :], k, allowed=allowed)
+                    found = I[0][I[0] != -1]
+                else:
+                    _, I = search(index, params, query[None, :], k * overfetch)
+                    found = np.array([vector_id for vector_id in I[0] if vector_id in matching_set][:k])
+                latencies.append((time.perf_counter() - started) * 1000)
+                counts.append(len(found))
+                recalls.append(len(set(found.tolist()) & set(truth.tolist())) / max(1, len(truth)))
+            out.extend([np.mean(counts), np.mean(recalls), np.percentile(latencies, 50)])
+        print(f"{label:<16} {len(matching):>8} {100 * len(matching) / len(ids):>9.2f} {pre[0]:>6.1f} {pre[1]:>11.3f} "
+              f"{pre[2] + mask_ms:>7.2f} {post[0]:>7.1f} {post[1]:>12.3f} {post[2]:>8.2f}")
+
+
+def exact_filtered(vectors, vector_ids, queries, k):
+    if not len(vector_ids):
+        return [np.zeros(0, dtype=np.int64) for _ in queries]
+    scores = queries @ vectors.T
+    return [vector_ids[np.argsort(-row, kind='stable')[:k]] for row in scores]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark filtered retrieval: ID selector vs post-filtering.")
+    parser.add_argument('--kb', default=default_kb_path)
+    parser.add_argument('--scale', type=int, default=50, help="Replicate the knowledge base this many times.")
+    parser.add_argument('--type', default='auto', choices=('auto',) + INDEX_TYPES)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=50)
+    parser.add_argument('--overfetch', type=int, default=4, help="Post-filtering fetches this many times k.")
+    args = parser.parse_args()
+
+    metadata = build_metadata(args.kb, args.scale)
+    vector_ids = np.array(sorted(metadata), dtype=np.int64)
+    corpus = synthetic_corpus(len(vector_ids))
+    params = default_params(args.type, len(corpus), corpus.shape[1])
+    index = new_index(params, corpus)
+    add_vectors(index, params, corpus, vector_ids)
+    print(f"{len(vector_ids)} items (knowledge base x{args.scale}), {params['type']} index, k={args.k}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_path = os.path.join(tmp_dir, 'metadata.cols')
+        write_metadata_store(store_path, metadata)
+        run(MetadataStore(store_path), index, params, corpus, make_queries(corpus, args.queries), args.k,
+            args.overfetch)
@@ -0,0 +1,172 @@
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from src.preprocessing.embedding_cache import EmbeddingCache, default_cache_dir
+from src.preprocessing.index_factory import (
+    COMPRESSIONS,
+    INDEX_TYPES,
+    add_vectors,
+    default_params,
+    index_size_bytes,
+    internal_ids,
+    is_binary,
+    needs_rescore,
+    new_index,
+    remove_ids,
+    search,
+)
+from src.preprocessing.preprocess_and_index import EMBEDDING_MODEL_NAME
+from src.preprocessing.vector_store import VectorStore, write_vector_store
+
+# Compares the FAISS index types on recall and speed:
+#
+#   python -m src.benchmarks.bench_index_types [--synthetic 1000000] [--k 10]
+#       [--compression int8 --compression binary]
+#
+# Vectors come from the embedding cache, or with --synthetic N from a
+# clustered random corpus shaped like menu embeddings (384-dim, normalized).
+# Queries are corpus vectors with noise added. For every type the script
+# reports recall@k against the exact Flat result, p50/p99 single-query
+# latency, build time and index size. Lossy configurations are measured with
+# and without exact rescoring from the memory-mapped side file, whose
+# on-disk size is listed separately (only shortlist rows are paged in).
+#
+# Each index then has a tenth of its vectors removed (as an incremental
+# update does) and is queried with kept vectors: 'self@k' is how often a
+# vector finds itself in its own top k. The script stops if a removed ID is
+# returned, a search filtered to even IDs returns an odd one, or self@k
+# falls below REMOVAL_MIN_SELF_HITS.
+
+REMOVAL_MIN_SELF_HITS = 0.9
+
+
+def synthetic_corpus(num_vectors, dim=384, clusters=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, num_vectors)]
+    vectors += 0.6 * rng.standard_normal((num_vectors, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors, num_queries, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), num_queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    return np.ascontiguousarray(queries / np.linalg.norm(queries, axis=1, keepdims=True), dtype=np.float32)
+
+
+def measure(index, params, queries, k, vector_store=None):
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for row, query in enumerate(queries):
+        started = time.perf_counter()
+        _, I = search(index, params, query[None, :], k, vector_store)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found[row] = I[0]
+    return found, latencies
+
+
+def check_removal(index, params, vectors, ids, k, stores, num_queries=200, seed=2):
+    """Removes a tenth of the vectors, then searches with kept ones; returns the self-hit rate per store."""
+    rng = np.random.default_rng(seed)
+    removed = rng.choice(ids, len(ids) // 10, replace=False)
+    index = remove_ids(index, params, removed)
+    kept = np.setdiff1d(ids, removed)
+    probes = rng.choice(kept, min(num_queries, len(kept)), replace=False)
+    self_hits = []
+    for store in stores:
+        _, I = search(index, params, vectors[probes], k, store)
+        if index.ntotal != len(kept) or np.isin(I, removed).any():
+            raise SystemExit(f"{params['type']}/{params['compression']}: removed IDs are still searchable")
+        self_hits.append(np.mean([probe in row for probe, row in zip(probes, I)]))
+        if store is None and is_binary(params) and params['type'].startswith('ivf'):
+            continue  # Filtering binary IVF needs the side file
+        _, I = search(index, params, vectors[probes], k, store, allowed=internal_ids(index) % 2 == 0)
+        if (I[I != -1] % 2).any():
+            raise SystemExit(f"{params['type']}/{params['compression']}: a filtered search returned excluded IDs")
+    return self_hits
+
+def run(vectors, queries, configs, k, overrides):
+    ids = np.arange(len(vectors), dtype=np.int64)
+    exact = faiss_exact(vectors, queries, k)
+    print(f"{'index':<22} {'recall@' + str(k):>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} "
+          f"{'size MB':>9} {'side MB':>8} {'self@' + str(k):>8}  params")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index_type, compression in configs:
+            try:
+                params = default_params(index_type, len(vectors), vectors.shape[1], compression)
+            except ValueError as e:
+                print(f"{index_type + '/' + compression:<22} skipped: {e}")
+                continue
+            params.update({key: value for key, value in overrides.items() if key in params})
+            started = time.perf_counter()
+            index = new_index(params, vectors)
+            add_vectors(index, params, vectors, ids)
+            build_seconds = time.perf_counter() - started
+            size_mb = index_size_bytes(index) / 1024 / 1024
+            shown = {key: value for key, value in params.items()
+                     if key not in ('type', 'dim', 'trained_on', 'compression', 'ids_in_lists')}
+
+            stores = [None]
+            if needs_rescore(params):
+                idx_path = os.path.join(tmp_dir, f"{index_type}-{compression}.bin")
+                write_vector_store(idx_path, ids, vectors)
+                stores.append(VectorStore.open(idx_path, vectors.shape[1]))
+            rows = []
+            for store in stores:
+                found, latencies = measure(index, params, queries, k, store)
+                recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, exact)])
+                label = index_type + ('' if compression == 'none' else '/' + compression) + \
+                    (' +rescore' if store is not None else '')
+                side_mb = f"{store.size_bytes() / 1024 / 1024:>8.1f}" if store is not None else f"{'-':>8}"
+                rows.append((label, recall, latencies, side_mb))
+            for (label, recall, latencies, side_mb), self_hits in zip(rows, check_removal(index, params, vectors,
+                                                                                           ids, k, stores)):
+                print(f"{label:<22} {recall:>9.3f} {np.percentile(latencies, 50):>8.3f} "
+                      f"{np.percentile(latencies, 99):>8.3f} {build_seconds:>8.1f} {size_mb:>9.1f} {side_mb} "
+                      f"{self_hits:>8.3f}  {shown}")
+                if self_hits < REMOVAL_MIN_SELF_HITS:
+                    raise SystemExit(f"{label}: only {self_hits:.2f} of kept vectors find themselves after a removal")
+
+def faiss_exact(vectors, queries, k):
+    flat = faiss.IndexFlatIP(vectors.shape[1])
+    flat.add(vectors)
+    return flat.search(queries, k)[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types: recall, latency and memory.")
+    parser.add_argument('--synthetic', type=int, default=None, help="Use N synthetic vectors instead of the cache.")
+    parser.add_argument('--cache-dir', default=default_cache_dir)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--type', action='append', choices=INDEX_TYPES, dest='types',
+                        help="Index type to measure (repeatable; default: all).")
+    parser.add_argument('--compression', action='append', choices=COMPRESSIONS, dest='compressions',
+                        help="Vector compression to measure (repeatable; default: all).")
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--nprobe', type=int, default=None)
+    parser.add_argument('--ef-search', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        corpus = synthetic_corpus(args.synthetic)
+        label = f"{args.synthetic} synthetic vectors"
+    else:
+        cache = EmbeddingCache(args.cache_dir, EMBEDDING_MODEL_NAME)
+        if not cache.rows:
+            raise SystemExit(f"No cached embeddings in {cache.dir}; index once or pass --synthetic N.")
+        corpus = np.array(cache.matrix(), dtype=np.float32)
+        label = f"{cache.rows} cached embeddings"
+    print(f"{label}, {args.queries} queries")
+    overrides = {key: value for key, value in
+                 (("nlist", args.nlist), ("nprobe", args.nprobe), ("ef_search", args.ef_search)) if value}
+    configs = [(index_type, compression) for index_type in args.types or INDEX_TYPES
+               for compression in args.compressions or COMPRESSIONS
+               if not (index_type == 'ivf-pq' and compression != 'none')]
+    run(corpus, make_queries(corpus, min(args.queries, len(corpus))), configs, args.k, overrides)
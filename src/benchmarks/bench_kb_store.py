@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.preprocessing.kb_store import KnowledgeBaseStore, write_kb_store
+from src.preprocessing.preprocess_and_index import make_item_id, unique_restaurant_keys
+from src.utils.jsonl import iter_json_array
+
+# Compares the knowledge base as pretty-printed JSON (the previous
+# knowledge_base.json), as preprocess_data's one-entry-per-line JSON, and as
+# the memory-mapped store of kb_store.py (knowledge_base.bin), each read in a
+# fresh process:
+#
+#   python -m src.benchmarks.bench_kb_store [--scale 100]
+#
+# The knowledge base is replicated --scale times (with distinct item IDs) to
+# stand in for a larger catalog. For each format the script reports file
+# size, the time to open it (json.load for JSON), to get one restaurant and
+# one item (by item_id) from a cold process, to read every entry, and the
+# private resident memory (RssAnon) added by opening it. processed_chunks.json
+# and metadata.cols, which repeat the same text, are listed for comparison
+# when they exist next to --kb. The store's export must equal the JSON.
+
+output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+default_kb_path = os.path.join(output_dir, 'knowledge_base.json')
+
+
+def rss_kb(field="RssAnon:"):
+    with open('/proc/self/status', 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return 0
+
+
+def replicated(kb_path, scale):
+    """Yields the knowledge base's restaurants `scale` times, each copy with its own URLs and item IDs."""
+    knowledge_base = list(iter_json_array(kb_path))
+    keys = unique_restaurant_keys(knowledge_base)
+    for copy in range(scale):
+        for key, restaurant in zip(keys, knowledge_base):
+            seen_item_ids = set()
+            menu = [dict(item, item_id=make_item_id(f"{key}#copy{copy}", item, seen_item_ids))
+                    for item in restaurant["menu"]]
+            yield dict(restaurant, url=f"{restaurant.get('url') or key}#copy{copy}", menu=menu)
+
+
+def write_json(path, restaurants, pretty):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for i, restaurant in enumerate(restaurants):
+            f.write(("\n" if i == 0 else ",\n") + (json.dumps(restaurant, indent=4, ensure_ascii=False) if pretty else
+                                                   json.dumps(restaurant, ensure_ascii=False, separators=(',', ':'))))
+        f.write("\n]\n")
+
+
+def measure_child(fmt, path, restaurant_index, item_id):
+    """Runs in a fresh process: open one format, fetch one restaurant and one item, then read everything."""
+    rss_before = rss_kb()
+    started = time.perf_counter()
+    if fmt == 'store':
+        knowledge_base = KnowledgeBaseStore(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            knowledge_base = json.load(f)
+    open_ms = (time.perf_counter() - started) * 1000
+    rss_opened = rss_kb()
+
+    started = time.perf_counter()
+    restaurant = knowledge_base.restaurant(restaurant_index) if fmt == 'store' else knowledge_base[restaurant_index]
+    restaurant_ms = open_ms + (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    if fmt == 'store':
+        item = knowledge_base.item_by_id(item_id)
+    else:
+        item = next(item for entry in knowledge_base for item in entry["menu"] if item["item_id"] == item_id)
+    item_ms = open_ms + (time.perf_counter() - started) * 1000
+    assert restaurant and item
+
+    started = time.perf_counter()
+    items = sum(len(entry["menu"]) for entry in knowledge_base)
+    full_seconds = (time.perf_counter() - started) + (open_ms / 1000 if fmt != 'store' else 0)
+    print(json.dumps({"open_ms": open_ms, "restaurant_ms": restaurant_ms, "item_ms": item_ms,
+                      "full_seconds": full_seconds, "items": items, "rss_mb": (rss_opened - rss_before) / 1024}))
+
+
+def run(kb_path, scale):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {"pretty": os.path.join(tmp_dir, 'pretty.json'), "lines": os.path.join(tmp_dir, 'lines.json'),
+                 "store": os.path.join(tmp_dir, 'knowledge_base.bin')}
+        write_json(paths["pretty"], replicated(kb_path, scale), pretty=True)
+        write_json(paths["lines"], replicated(kb_path, scale), pretty=False)
+        started = time.perf_counter()
+        restaurants, items = write_kb_store(paths["store"], iter_json_array(paths["lines"]))
+        print(f"{restaurants} restaurants, {items} items (knowledge base x{scale}); "
+              f"store written in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(0)
+        restaurant_index = rng.randrange(restaurants)
+        store = KnowledgeBaseStore(paths["store"])
+        item_id = store.item(rng.randrange(items))["item_id"]
+        export_path = os.path.join(tmp_dir, 'export.json')
+        store.export_json(export_path)
+        store.close()
+        with open(export_path, 'rb') as exported, open(paths["lines"], 'rb') as lines:
+            if exported.read() != lines.read():
+                raise SystemExit("The store's JSON export differs from the knowledge base it was built from")
+        os.remove(export_path)
+
+        print(f"{'format':<12} {'file MB':>8} {'open ms':>9} {'1 restaurant ms':>16} {'1 item ms':>10} "
+              f"{'read all s':>11} {'private MB':>11}")
+        for fmt in ('pretty', 'lines', 'store'):
+            output = subprocess.run([sys.executable, '-m', 'src.benchmarks.bench_kb_store', '--child',
+                                     'store' if fmt == 'store' else 'json', paths[fmt], str(restaurant_index),
+                                     item_id], capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            assert result["items"] == items
+            print(f"{fmt:<12} {os.path.getsize(paths[fmt]) / 1024 / 1024:>8.1f} {result['open_ms']:>9.1f} "
+                  f"{result['restaurant_ms']:>16.1f} {result['item_ms']:>10.1f} {result['full_seconds']:>11.2f} "
+                  f"{result['rss_mb']:>11.1f}")
+        print("\nThe store's JSON export is identical to the one-entry-per-line JSON.")
+    for name in ('processed_chunks.json', 'metadata.cols'):
+        path = os.path.join(os.path.dirname(kb_path), name)
+        if os.path.exists(path):
+            print(f"{name} next to {os.path.basename(kb_path)} (x1, not replicated): "
+                  f"{os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark knowledge_base.json against the knowledge base store.")
+    parser.add_argument('--kb', default=default_kb_path)
+    parser.add_argument('--scale', type=int, default=100, help="Replicate the knowledge base this many times.")
+    parser.add_argument('--child', nargs=4, metavar=('FORMAT', 'PATH', 'RESTAURANT', 'ITEM_ID'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        fmt, path, restaurant_index, item_id = args.child
+        measure_child(fmt, path, int(restaurant_index), item_id)
+    else:
+        run(args.kb, args.scale)
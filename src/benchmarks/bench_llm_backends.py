@@ -0,0 +1,87 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from src.chatbot.llm_backends import CircuitBreaker, LLMBackend, LLMError, ResilientLLM
+
+# How ResilientLLM's deadline, retries and hedging change answer latency and
+# failures against a simulated upstream with a slow tail and random errors:
+#
+#   python -m src.benchmarks.bench_llm_backends [--calls 300] [--failure-rate 0.05]
+#
+# First-chunk latency is lognormal around --median-ms, except that
+# --slow-rate of the calls hang for --slow-ms (a stuck connection);
+# --failure-rate of them raise. Reported per configuration: answered
+# share, share that fell back to the templated answer, p50/p99 time until
+# the answer (or the fallback) starts, and the wrapper's counters. The last
+# run simulates an outage to show the circuit breaker short-circuiting calls.
+
+PROMPT = "Which biryanis are vegetarian?"
+
+
+class SimulatedBackend(LLMBackend):
+    name = 'simulated'
+
+    def __init__(self, median_seconds, slow_rate, slow_seconds, failure_rate, seed=0):
+        self.median_seconds = median_seconds
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+    def stream(self, prompt, timeout):
+        roll = self.random.random()
+        delay = self.median_seconds * self.random.lognormvariate(0, 0.3)
+        if roll < self.failure_rate:
+            time.sleep(delay / 2)
+            raise LLMError("simulated upstream error")
+        if roll < self.failure_rate + self.slow_rate:
+            delay = self.slow_seconds
+        time.sleep(delay)
+        for word in "Try the Hyderabadi Veg Biryani or the Taj-e-Khumb Biryani.".split():
+            yield word + " "
+
+
+def run_config(label, llm, calls):
+    latencies, answered, fallbacks = [], 0, 0
+    for _ in range(calls):
+        started = time.perf_counter()
+        first_chunk_ms = None
+        try:
+            for _ in llm.stream(PROMPT):
+                if first_chunk_ms is None:
+                    first_chunk_ms = (time.perf_counter() - started) * 1000
+            answered += 1
+        except LLMError:
+            fallbacks += 1
+        latencies.append(first_chunk_ms if first_chunk_ms is not None else (time.perf_counter() - started) * 1000)
+    counters = ", ".join(f"{name} {count}" for name, count in llm.stats.items() if name != 'calls' and count)
+    print(f"{label:<26} {answered / calls:>9.1%} {fallbacks / calls:>9.1%} {np.percentile(latencies, 50):>8.0f} "
+          f"{np.percentile(latencies, 99):>8.0f}  {counters or '-'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LLM deadlines, retries, hedging and circuit breaking.")
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--median-ms', type=float, default=40)
+    parser.add_argument('--slow-rate', type=float, default=0.03)
+    parser.add_argument('--slow-ms', type=float, default=3000)
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    parser.add_argument('--timeout-ms', type=float, default=1000, help="Per-call deadline of the resilient configs.")
+    args = parser.parse_args()
+
+    def backend(failure_rate=args.failure_rate):
+        return SimulatedBackend(args.median_ms / 1000, args.slow_rate, args.slow_ms / 1000, failure_rate)
+
+    timeout = args.timeout_ms / 1000
+    print(f"{'configuration':<26} {'answered':>9} {'fallback':>9} {'p50 ms':>8} {'p99 ms':>8}  counters")
+    run_config("no deadline, no retries", ResilientLLM(backend(), timeout=3600, max_retries=0), args.calls)
+    run_config("deadline", ResilientLLM(backend(), timeout=timeout, max_retries=0), args.calls)
+    run_config("deadline + retries", ResilientLLM(backend(), timeout=timeout, backoff_seconds=0.05), args.calls)
+    run_config("deadline + retries + hedge", ResilientLLM(backend(), timeout=timeout, backoff_seconds=0.05,
+                                                          hedge=True), args.calls)
+    run_config("outage, circuit breaker", ResilientLLM(backend(failure_rate=1.0), timeout=timeout,
+                                                       backoff_seconds=0.05, breaker=CircuitBreaker(5, 60)),
+               min(args.calls, 50))
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.preprocessing.metadata_store import MetadataStore, write_metadata_store
+from src.preprocessing.preprocess_and_index import faiss_id, item_metadata, make_item_id, unique_restaurant_keys
+
+# Compares the old metadata.pkl (a pickled dict of dicts) with the columnar
+# metadata store, each opened in a fresh process:
+#
+#   python -m src.benchmarks.bench_metadata_store [--scale 100]
+#
+# Metadata comes from knowledge_base.json, replicated --scale times to stand
+# in for a larger catalog. For each format the script reports file size,
+# load time, private resident memory (RssAnon) added by loading and after the
+# timed queries, file-backed resident memory (RssFile, shared by every process
+# through the page cache) after the queries, and the cost of one retrieval
+# (50 rows fetched and the fields used in the prompt read).
+
+default_kb_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'output', 'knowledge_base.json')
+PROMPT_FIELDS = ('restaurant_name', 'item_name', 'price', 'short_description', 'long_description', 'location',
+                 'gluten_free', 'affordability_tag', 'tags', 'dish_type', 'popularity_score', 'available_time',
+                 'contact')
+
+
+def build_metadata(kb_path, scale):
+    with open(kb_path, 'r', encoding='utf-8') as f:
+        knowledge_base = json.load(f)
+    metadata = {}
+    for copy in range(scale):
+        for key, restaurant in zip(unique_restaurant_keys(knowledge_base), knowledge_base):
+            seen_item_ids = set()
+            for item in restaurant["menu"]:
+                item = dict(item, item_id=make_item_id(f"{key}#copy{copy}", item, seen_item_ids))
+                metadata[faiss_id(item['item_id'])] = item_metadata(restaurant, item)
+    return metadata
+
+
+def rss_kb(field="RssAnon:"):
+    with open('/proc/self/status', 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return 0
+
+
+def measure_child(fmt, path, ids_path, repeat):
+    """Runs in a fresh process: load one format, then time retrievals."""
+    ids = np.load(ids_path)
+    rss_before, file_before = rss_kb(), rss_kb('RssFile:')
+    started = time.perf_counter()
+    if fmt == 'pickle':
+        with open(path, 'rb') as f:
+            metadata = pickle.load(f)
+    else:
+        metadata = MetadataStore(path)
+    load_ms = (time.perf_counter() - started) * 1000
+    rss_loaded = rss_kb()
+
+    rng = np.random.default_rng(0)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = []
+        for vector_id in rng.choice(ids, 50):
+            if fmt == 'pickle':
+                item = metadata.get(int(vector_id)).copy()
+                item['similarity_score'] = 0.5
+            else:
+                item = metadata.get(vector_id, similarity_score=0.5)
+            results.append(item)
+        for item in results:
+            for field in PROMPT_FIELDS:
+                item.get(field)
+    query_ms = (time.perf_counter() - started) * 1000 / repeat
+    print(json.dumps({"load_ms": load_ms, "rss_mb": (rss_loaded - rss_before) / 1024,
+                      "rss_after_queries_mb": (rss_kb() - rss_before) / 1024,
+                      "shared_after_queries_mb": (rss_kb('RssFile:') - file_before) / 1024, "query_ms": query_ms}))
+
+
+def run(kb_path, scale, repeat):
+    metadata = build_metadata(kb_path, scale)
+    print(f"{len(metadata)} items (knowledge base x{scale})")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pickle_path = os.path.join(tmp_dir, 'metadata.pkl')
+        store_path = os.path.join(tmp_dir, 'metadata.cols')
+        ids_path = os.path.join(tmp_dir, 'ids.npy')
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(metadata, f)
+        write_metadata_store(store_path, metadata)
+        np.save(ids_path, np.array(list(metadata), dtype=np.int64))
+        del metadata
+
+        print(f"{'format':<10} {'file MB':>8} {'load ms':>9} {'private MB':>11} {'after queries':>14} "
+              f"{'shared MB':>10} {'ms/query':>9}")
+        for fmt, path in (('pickle', pickle_path), ('columnar', store_path)):
+            output = subprocess.run([sys.executable, '-m', 'src.benchmarks.bench_metadata_store', '--child', fmt,
+                                     path, ids_path, '--repeat', str(repeat)],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{fmt:<10} {os.path.getsize(path) / 1024 / 1024:>8.1f} {result['load_ms']:>9.1f} "
+                  f"{result['rss_mb']:>11.1f} {result['rss_after_queries_mb']:>14.1f} "
+                  f"{result['shared_after_queries_mb']:>10.1f} {result['query_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark metadata.pkl against the columnar metadata store.")
+    parser.add_argument('--kb', default=default_kb_path)
+    parser.add_argument('--scale', type=int, default=100, help="Replicate the knowledge base this many times.")
+    parser.add_argument('--repeat', type=int, default=200, help="Retrievals timed per format.")
+    parser.add_argument('--child', nargs=3, metavar=('FORMAT', 'PATH', 'IDS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child(*args.child, repeat=args.repeat)
+    else:
+        run(args.kb, args.scale, args.repeat)
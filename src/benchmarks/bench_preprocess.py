@@ -0,0 +1,135 @@
+import argparse
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.preprocessing.preprocess_and_index import preprocess_data, structure_restaurant, unique_restaurant_keys
+from src.utils.jsonl import iter_json_array
+
+# preprocess_data on a synthetic full-catalog crawl, before and after
+# streaming and the process pool, each run in a fresh process:
+#
+#   python -m src.benchmarks.bench_preprocess [--restaurants 2000] [--workers 1 2 4]
+#
+#   json.load   the previous preprocess_data (legacy_preprocess_data below):
+#               the whole raw array loaded, restaurants structured serially,
+#               the whole knowledge base dumped with indent=4
+#   streaming   preprocess_data on the JSON array and on JSONL input, with
+#               each --workers count
+#
+# Synthetic restaurants are the scraped ones repeated under distinct URLs.
+# Reported: wall time, peak resident memory of the main process and of the
+# largest worker, and the output size. Every run's knowledge base must
+# decode to the same entries as the json.load version's (compared by digest,
+# so this script's own memory stays small).
+
+default_raw_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output',
+                                'raw_extracted_data.json')
+
+
+def legacy_preprocess_data(raw_data_path, output_path):
+    """preprocess_data as it was, without the incremental reuse: everything in memory, one process."""
+    with open(raw_data_path, 'r', encoding='utf-8') as f:
+        raw_data = json.load(f)
+    knowledge_base = []
+    for key, restaurant in zip(unique_restaurant_keys(raw_data), raw_data):
+        structured_restaurant = structure_restaurant(restaurant, key)
+        if structured_restaurant:
+            knowledge_base.append(structured_restaurant)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(knowledge_base, f, indent=4, ensure_ascii=False)
+
+
+def write_synthetic_raw(raw_path, restaurants, json_path, jsonl_path):
+    """Writes `restaurants` raw records as a JSON array and as JSONL, one record in memory at a time."""
+    with open(raw_path, 'r', encoding='utf-8') as f:
+        scraped = [restaurant for restaurant in json.load(f) if restaurant.get('menu_items')]
+    with open(json_path, 'w', encoding='utf-8') as array, open(jsonl_path, 'w', encoding='utf-8') as lines:
+        array.write("[\n")
+        for i in range(restaurants):
+            restaurant = scraped[i % len(scraped)]
+            record = dict(restaurant, url=f"{restaurant.get('url') or restaurant['restaurant_name']}?copy={i}")
+            array.write(("" if i == 0 else ",\n") + json.dumps(record, indent=4, ensure_ascii=False))
+            lines.write(json.dumps(record, ensure_ascii=False) + "\n")
+        array.write("\n]\n")
+
+
+def kb_digest(kb_path):
+    digest = hashlib.sha1()
+    for restaurant in iter_json_array(kb_path):
+        digest.update(json.dumps(restaurant, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process (VmHWM, which unlike ru_maxrss starts afresh at exec)."""
+    with open('/proc/self/status', 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0
+
+
+def measure_child(mode, raw_path, output_path, workers):
+    """Runs in a fresh process: one preprocessing run, then its time and peak memory."""
+    started = time.perf_counter()
+    if mode == 'json.load':
+        legacy_preprocess_data(raw_path, output_path)
+    else:
+        preprocess_data(raw_path, output_path, incremental=False, workers=workers)
+    seconds = time.perf_counter() - started
+    print(json.dumps({"seconds": seconds,
+                      "main_mb": peak_rss_mb(),
+                      "worker_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024}))
+
+
+def run(raw_path, restaurants, worker_counts):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, 'raw.json')
+        jsonl_path = os.path.join(tmp_dir, 'raw.jsonl')
+        write_synthetic_raw(raw_path, restaurants, json_path, jsonl_path)
+        print(f"{restaurants} restaurants: raw JSON {os.path.getsize(json_path) / 1024 / 1024:.0f} MB, "
+              f"JSONL {os.path.getsize(jsonl_path) / 1024 / 1024:.0f} MB; {os.cpu_count()} cores")
+
+        configs = [('json.load', json_path, 1)]
+        configs += [('streaming', path, workers) for path in (json_path, jsonl_path) for workers in worker_counts]
+        print(f"{'version':<10} {'input':<6} {'workers':>7} {'seconds':>8} {'speedup':>8} {'main MB':>8} "
+              f"{'worker MB':>10} {'output MB':>10}")
+        reference, baseline = None, None
+        for mode, path, workers in configs:
+            output_path = os.path.join(tmp_dir, 'knowledge_base.json')
+            stdout = subprocess.run([sys.executable, '-m', 'src.benchmarks.bench_preprocess', '--child', mode,
+                                     path, output_path, str(workers)],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(stdout.strip().splitlines()[-1])
+            baseline = baseline or result['seconds']
+            print(f"{mode:<10} {os.path.splitext(path)[1][1:]:<6} {workers if mode == 'streaming' else '-':>7} "
+                  f"{result['seconds']:>8.2f} {baseline / result['seconds']:>7.2f}x {result['main_mb']:>8.0f} "
+                  f"{result['worker_mb'] if workers > 1 else 0:>10.0f} "
+                  f"{os.path.getsize(output_path) / 1024 / 1024:>10.1f}")
+            digest = kb_digest(output_path)
+            reference = reference or digest
+            if digest != reference:
+                raise SystemExit(f"{mode} on {path} with {workers} workers wrote a different knowledge base")
+            os.remove(output_path)
+        print("\nEvery run wrote the same knowledge base.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark preprocess_data on a synthetic large crawl.")
+    parser.add_argument('--raw', default=default_raw_path, help="Scraped data the synthetic crawl repeats.")
+    parser.add_argument('--restaurants', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--child', nargs=4, metavar=('MODE', 'RAW', 'OUTPUT', 'WORKERS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, raw_path, output_path, workers = args.child
+        measure_child(mode, raw_path, output_path, int(workers))
+    else:
+        run(args.raw, args.restaurants, args.workers)
@@ -0,0 +1,77 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from src.chatbot.chatbot import TEST_QUERIES, ChatbotEngine
+from src.chatbot.llm_backends import OfflineBackend
+
+# Which of the chatbot's TEST_QUERIES the query router answers from the
+# aggregate tables, and how long each query takes with and without it:
+#
+#   python -m src.benchmarks.bench_router [--llm-ms 800] [--show-answers]
+#
+# Both runs use the offline answer model, which waits --llm-ms before it
+# answers (a stand-in for the Gemini round trip), so no API key is needed.
+# The answer cache is cleared before each query. Extra questions can be
+# passed with --query; they are routed or not like the test queries.
+
+default_output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+
+
+def timed_answers(engine, queries):
+    """(seconds, intent or None, answer) of each query; the intent is that of a query the router answered."""
+    router = engine.resource('router') if engine.route_queries else None
+    results = []
+    for query in queries:
+        engine.caches.answers.clear()
+        routed_before = router.stats["routed"] if router else 0
+        started = time.perf_counter()
+        answer = engine.respond(query)
+        seconds = time.perf_counter() - started
+        routed = router is not None and router.stats["routed"] > routed_before
+        results.append((seconds, router.parse_query(query)["intent"] if routed else None, answer))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the query router on the chatbot's test queries.")
+    parser.add_argument('--output-dir', default=default_output_dir,
+                        help="Directory holding the index files and aggregates.json.")
+    parser.add_argument('--llm-ms', type=float, default=800, help="Offline LLM delay per answer.")
+    parser.add_argument('--query', action='append', default=[], help="An extra question (repeatable).")
+    parser.add_argument('--show-answers', action='store_true', help="Print the routed queries' answers.")
+    args = parser.parse_args()
+
+    queries = TEST_QUERIES + args.query
+    results = {}
+    for route_queries in (False, True):
+        engine = ChatbotEngine(os.path.join(args.output_dir, 'faiss_index.bin'),
+                               os.path.join(args.output_dir, 'metadata.cols'),
+                               lexical_path=os.path.join(args.output_dir, 'bm25_index.bin'),
+                               aggregates_path=os.path.join(args.output_dir, 'aggregates.json'),
+                               llm_backend=OfflineBackend(args.llm_ms / 1000), route_queries=route_queries)
+        engine.verbose = False
+        names = ('index', 'metadata', 'embedder', 'lexical', 'llm') + (('router',) if route_queries else ())
+        if not engine.load(names):
+            raise SystemExit(f"Engine did not load: {engine.status()}")
+        engine.warm_up()
+        results[route_queries] = timed_answers(engine, queries)
+        if route_queries:
+            router = engine.resource('router')
+
+    print(f"{'query':<60} {'intent':<12} {'LLM path ms':>12} {'routed ms':>10}")
+    for query, (before, _, _), (after, intent, _) in zip(queries, results[False], results[True]):
+        print(f"{query[:60]:<60} {intent or '-':<12} {before * 1000:>12.1f} {after * 1000:>10.1f}")
+    routed = [i for i, (_, intent, _) in enumerate(results[True]) if intent]
+    print(f"\nRouted: {len(routed)} of {len(queries)} queries ({len(routed) / len(queries):.0%})")
+    if routed:
+        print(f"Routed queries: median {np.median([results[True][i][0] for i in routed]) * 1000:.2f} ms "
+              f"from the tables vs {np.median([results[False][i][0] for i in routed]) * 1000:.0f} ms "
+              f"through retrieval and the LLM")
+    print(f"All queries: {sum(result[0] for result in results[False]):.2f}s without the router, "
+          f"{sum(result[0] for result in results[True]):.2f}s with it")
+    router.report()
+    for i in routed if args.show_answers else ():
+        print(f"\n> {queries[i]}\n{results[True][i][2]}")
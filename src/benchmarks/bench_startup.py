@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Measures chatbot start-up, each mode in a fresh process:
+#
+#   python -m src.benchmarks.bench_startup [--output-dir src/output]
+#
+#   eager       every retrieval resource loaded in turn before anything else
+#               runs (what importing chatbot.py used to do)
+#   background  ChatbotEngine.start() loads them in parallel threads and
+#               returns at once; the caller then waits for them
+#
+# Reported: import time of src.chatbot.chatbot, time until the caller can
+# render (the import plus start() or the eager load), cold start until the
+# index, metadata and embedder are ready, then the first and second
+# retrieval. The LLM is left out so no API key or network call is needed.
+
+default_output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+QUERIES = ("spicy chicken biryani", "vegan desserts under 200")
+
+
+def measure_child(mode, output_dir):
+    started = time.perf_counter()
+    from src.chatbot.chatbot import RETRIEVAL_RESOURCES, ChatbotEngine
+    import_ms = (time.perf_counter() - started) * 1000
+
+    engine = ChatbotEngine(os.path.join(output_dir, 'faiss_index.bin'), os.path.join(output_dir, 'metadata.cols'))
+    if mode == 'eager':
+        engine.load(RETRIEVAL_RESOURCES)
+    else:
+        engine.start(RETRIEVAL_RESOURCES)
+    interactive_ms = (time.perf_counter() - started) * 1000
+    if not engine.wait(RETRIEVAL_RESOURCES):
+        raise SystemExit(f"Engine did not load: {engine.status()}")
+    cold_start_ms = (time.perf_counter() - started) * 1000
+
+    query_ms = []
+    for query in QUERIES:
+        query_started = time.perf_counter()
+        results = engine.retrieve_top_k(query, k=50)
+        query_ms.append((time.perf_counter() - query_started) * 1000)
+    print(json.dumps({"import_ms": import_ms, "interactive_ms": interactive_ms, "cold_start_ms": cold_start_ms,
+                      "first_query_ms": query_ms[0], "second_query_ms": query_ms[1], "results": len(results),
+                      "load_seconds": engine.load_seconds}))
+
+
+def run(output_dir):
+    print(f"{'mode':<11} {'import ms':>10} {'interactive ms':>15} {'cold start ms':>14} {'1st query ms':>13} "
+          f"{'2nd query ms':>13}  per-resource load s")
+    for mode in ('eager', 'background'):
+        output = subprocess.run([sys.executable, '-m', 'src.benchmarks.bench_startup', '--child', mode,
+                                 '--output-dir', output_dir], capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        loads = ", ".join(f"{name} {seconds:.2f}" for name, seconds in result["load_seconds"].items())
+        print(f"{mode:<11} {result['import_ms']:>10.1f} {result['interactive_ms']:>15.1f} "
+              f"{result['cold_start_ms']:>14.1f} {result['first_query_ms']:>13.1f} "
+              f"{result['second_query_ms']:>13.1f}  {loads}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chatbot cold start and first-query latency.")
+    parser.add_argument('--output-dir', default=default_output_dir,
+                        help="Directory holding faiss_index.bin and metadata.cols.")
+    parser.add_argument('--child', choices=('eager', 'background'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child(args.child, args.output_dir)
+    else:
+        run(args.output_dir)
@@ -0,0 +1,108 @@
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+
+from src.chatbot.chatbot import RETRIEVAL_RESOURCES, TEST_QUERIES, ChatbotEngine
+
+# Time until the user sees the answer, blocking vs streamed, on the chatbot's
+# TEST_QUERIES with a local fake LLM that emits tokens on a fixed schedule:
+#
+#   python -m src.benchmarks.bench_streaming [--first-token-ms 600] [--token-ms 15]
+#
+#   blocking   respond(): nothing is shown until the whole answer exists
+#   streaming  respond_stream(): chunks are shown as they arrive; reported
+#              are the time to the first chunk and to the full answer
+#
+# The fake model waits --first-token-ms (prompt processing), then yields
+# --chunk-tokens words every --chunk-tokens x --token-ms, so no API key or
+# network is needed. The answer cache is cleared before each query, and the
+# query router is off so every query reaches the model.
+
+default_output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+ITEM_PATTERN = re.compile(r'^  Item: (.*)$', re.MULTILINE)
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text]
+
+
+class FakeStreamingResponse:
+    def __init__(self, words, first_token_seconds, token_seconds, chunk_tokens):
+        self.words = words
+        self.first_token_seconds = first_token_seconds
+        self.token_seconds = token_seconds
+        self.chunk_tokens = chunk_tokens
+        self.prompt_feedback = None
+
+    def __iter__(self):
+        time.sleep(self.first_token_seconds)
+        for start in range(0, len(self.words), self.chunk_tokens):
+            chunk = self.words[start:start + self.chunk_tokens]
+            time.sleep(self.token_seconds * len(chunk))
+            yield FakeChunk(''.join(word + ' ' for word in chunk))
+
+
+class FakeStreamingModel:
+    """Stands in for genai.GenerativeModel: answers by listing the prompt's items, on a fixed token schedule."""
+
+    def __init__(self, first_token_seconds=0.6, token_seconds=0.015, chunk_tokens=4, answer_tokens=150):
+        self.first_token_seconds = first_token_seconds
+        self.token_seconds = token_seconds
+        self.chunk_tokens = chunk_tokens
+        self.answer_tokens = answer_tokens
+
+    def generate_content(self, prompt, stream=False):
+        words = "Here's what I found:".split()
+        for name in ITEM_PATTERN.findall(prompt):
+            words.extend(name.split() + ['-'])
+        words = (words * (self.answer_tokens // max(len(words), 1) + 1))[:self.answer_tokens]
+        response = FakeStreamingResponse(words, self.first_token_seconds, self.token_seconds, self.chunk_tokens)
+        if stream:
+            return response
+        chunks = list(response)
+        return FakeChunk(''.join(chunk.text for chunk in chunks))
+
+
+def run(engine):
+    print(f"{'query':<44} {'blocking s':>11} {'first chunk s':>14} {'streamed s':>11}")
+    blocking, first_chunk, streamed = [], [], []
+    for query in TEST_QUERIES:
+        engine.caches.answers.clear()
+        started = time.perf_counter()
+        engine.respond(query)
+        blocking.append(time.perf_counter() - started)
+
+        engine.caches.answers.clear()
+        started = time.perf_counter()
+        for i, _ in enumerate(engine.respond_stream(query)):
+            if i == 0:
+                first_chunk.append(time.perf_counter() - started)
+        streamed.append(time.perf_counter() - started)
+        print(f"{query[:44]:<44} {blocking[-1]:>11.2f} {first_chunk[-1]:>14.2f} {streamed[-1]:>11.2f}")
+    print(f"\nMedian time until the user sees the answer: {np.median(blocking):.2f}s blocking, "
+          f"{np.median(first_chunk):.2f}s streamed (full answer after {np.median(streamed):.2f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark time to first token with streamed answers.")
+    parser.add_argument('--output-dir', default=default_output_dir,
+                        help="Directory holding faiss_index.bin, metadata.cols and bm25_index.bin.")
+    parser.add_argument('--first-token-ms', type=float, default=600, help="Fake LLM delay before its first token.")
+    parser.add_argument('--token-ms', type=float, default=15, help="Fake LLM time per generated token.")
+    parser.add_argument('--chunk-tokens', type=int, default=4, help="Tokens per streamed chunk.")
+    parser.add_argument('--answer-tokens', type=int, default=150)
+    args = parser.parse_args()
+
+    model = FakeStreamingModel(args.first_token_ms / 1000, args.token_ms / 1000, args.chunk_tokens, args.answer_tokens)
+    engine = ChatbotEngine(os.path.join(args.output_dir, 'faiss_index.bin'),
+                           os.path.join(args.output_dir, 'metadata.cols'),
+                           lexical_path=os.path.join(args.output_dir, 'bm25_index.bin'), llm_client=model,
+                           route_queries=False)
+    if not engine.load(RETRIEVAL_RESOURCES):
+        raise SystemExit(f"Retrieval resources did not load: {engine.status()}")
+    run(engine)
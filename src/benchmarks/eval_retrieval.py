@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from src.chatbot.chatbot import RETRIEVAL_RESOURCES, ChatbotEngine
+
+# Recall and latency of the chatbot's retrieval modes on a small labeled
+# query set (retrieval_queries.json):
+#
+#   python -m src.benchmarks.eval_retrieval [--output-dir src/output] [--k 5 10 20]
+#
+#   dense    FAISS only
+#   lexical  BM25 only
+#   hybrid   both, merged by reciprocal rank fusion
+#
+# Each query lists the item names that answer it. Every dish is sold in
+# several cities, so results are compared by name: recall@k is the share of
+# relevant names among the top k results (out of at most k of them). Caches
+# are cleared before each run, so latencies include embedding the query.
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+default_output_dir = os.path.join(os.path.dirname(benchmarks_dir), 'output')
+default_queries_path = os.path.join(benchmarks_dir, 'retrieval_queries.json')
+MODES = ('dense', 'lexical', 'hybrid')
+
+
+def recall(results, relevant, k):
+    found = {item.get('item_name') for item in results[:k]} & set(relevant)
+    return len(found) / min(len(relevant), k)
+
+
+def run(engine, labeled, ks):
+    print(f"{'mode':<8} {'k':>3} {'recall@k':>9} {'p50 ms':>7} {'p99 ms':>7} {'missed':>7}  (queries with no relevant item in the top k)")
+    for mode in MODES:
+        for k in ks:
+            engine.caches.clear()
+            recalls, latencies, missed = [], [], []
+            for entry in labeled:
+                started = time.perf_counter()
+                results = engine.retrieve_top_k(entry["query"], k=k, mode=mode)
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(recall(results, entry["relevant"], k))
+                if not recalls[-1]:
+                    missed.append(entry["query"])
+            print(f"{mode:<8} {k:>3} {np.mean(recalls):>9.3f} {np.percentile(latencies, 50):>7.2f} "
+                  f"{np.percentile(latencies, 99):>7.2f} {len(missed):>7}  {', '.join(missed[:3])}"
+                  f"{' ...' if len(missed) > 3 else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate dense, lexical and hybrid retrieval on labeled queries.")
+    parser.add_argument('--output-dir', default=default_output_dir,
+                        help="Directory holding faiss_index.bin, metadata.cols and bm25_index.bin.")
+    parser.add_argument('--queries', default=default_queries_path, help="Labeled query set (JSON).")
+    parser.add_argument('--k', type=int, nargs='+', default=[5, 10, 20])
+    args = parser.parse_args()
+
+    with open(args.queries, 'r', encoding='utf-8') as f:
+        labeled = json.load(f)
+    engine = ChatbotEngine(os.path.join(args.output_dir, 'faiss_index.bin'),
+                           os.path.join(args.output_dir, 'metadata.cols'),
+                           lexical_path=os.path.join(args.output_dir, 'bm25_index.bin'))
+    if not engine.load(RETRIEVAL_RESOURCES + ('lexical',)):
+        raise SystemExit(f"Retrieval resources did not load: {engine.status()}")
+    print(f"{len(labeled)} labeled queries")
+    run(engine, labeled, args.k)
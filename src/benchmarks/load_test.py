@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from src.chatbot.chatbot import TEST_QUERIES, ChatbotEngine
+from src.chatbot.llm_backends import OfflineBackend
+from src.chatbot.server import ChatbotService, serve
+from src.preprocessing.metadata_store import MetadataStore
+from src.utils.constants import SERVER_BATCH_WINDOW_SECONDS, SERVER_LLM_CONCURRENCY
+
+# Load generator for the async chatbot API (src/chatbot/server.py), run
+# against the offline LLM stand-in so no API key or network is needed:
+#
+#   python -m src.benchmarks.load_test [--concurrency 32] [--requests 1000] [--llm-ms 50]
+#
+# Starts the HTTP endpoint in-process twice, with micro-batching (queries
+# within --batch-window-ms share one embedding batch and FAISS search) and
+# without (every query alone), and drives each with --concurrency
+# keep-alive clients posting to /respond. Queries are distinct ("<template>
+# <menu item>"), so the answer cache doesn't serve them. Reported: QPS,
+# p50/p99 latency, and the mean retrieval batch size. Finally the
+# chatbot's TEST_QUERIES go through /respond_batch in one request.
+
+default_output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+TEMPLATES = ("Tell me about", "How much is", "Where can I get", "Is there anything like", "Recommend something like")
+
+
+def make_queries(metadata_path, count, seed=0):
+    store = MetadataStore.open(metadata_path)
+    if store is None:
+        raise SystemExit("Build the index first: python -m src.preprocessing.preprocess_and_index")
+    names = sorted({store.get(int(vector_id))['item_name'] for vector_id in store.ids})
+    rng = random.Random(seed)
+    return [f"{rng.choice(TEMPLATES)} {rng.choice(names)} #{i}" for i in range(count)]
+
+
+async def post(reader, writer, path, payload):
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    response = json.loads(await reader.readexactly(length))
+    if status != 200:
+        raise RuntimeError(f"{path} returned {status}: {response}")
+    return response
+
+
+async def client(port, queries, latencies):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while queries:
+            query = queries.pop()
+            started = time.perf_counter()
+            await post(reader, writer, '/respond', {"query": query})
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run_config(label, engine, queries, args, batch_window, max_batch):
+    service = ChatbotService(engine, batch_window, max_batch, args.llm_concurrency)
+    server = await serve(service, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    engine.caches.clear()
+    latencies = []
+    pending = list(queries)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, pending, latencies) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stats = service.report()["service"]
+    print(f"{label:<14} {len(latencies) / elapsed:>8.1f} {np.percentile(latencies, 50) * 1000:>8.1f} "
+          f"{np.percentile(latencies, 99) * 1000:>8.1f} {stats['mean_batch']:>11.1f} {stats['largest_batch']:>9}")
+    if label == 'micro-batched':
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        response = await post(reader, writer, '/respond_batch', {"queries": TEST_QUERIES})
+        writer.close()
+        await writer.wait_closed()
+        print(f"\n/respond_batch with the {len(TEST_QUERIES)} TEST_QUERIES: {response['seconds'] * 1000:.0f} ms")
+    server.close()
+    await server.wait_closed()
+    await service.close()
+
+
+async def main(args):
+    engine = ChatbotEngine(os.path.join(args.output_dir, 'faiss_index.bin'),
+                           os.path.join(args.output_dir, 'metadata.cols'),
+                           lexical_path=os.path.join(args.output_dir, 'bm25_index.bin'),
+                           aggregates_path=os.path.join(args.output_dir, 'aggregates.json'),
+                           llm_backend=OfflineBackend(args.llm_ms / 1000, 0.0))
+    if not engine.load():
+        raise SystemExit(f"Engine did not load: {engine.status()}")
+    queries = make_queries(engine.metadata_path, args.requests)
+    print(f"{args.requests} requests, {args.concurrency} concurrent clients, offline LLM {args.llm_ms:g} ms, "
+          f"{args.llm_concurrency} LLM calls at a time")
+    print(f"{'mode':<14} {'QPS':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>11} {'max batch':>9}")
+    await run_config('unbatched', engine, queries, args, 0.0, 1)
+    await run_config('micro-batched', engine, queries, args, args.batch_window_ms / 1000, args.max_batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the async chatbot API against the offline LLM.")
+    parser.add_argument('--output-dir', default=default_output_dir,
+                        help="Directory holding faiss_index.bin, metadata.cols, bm25_index.bin and aggregates.json.")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--llm-ms', type=float, default=50, help="Offline LLM delay per answer.")
+    parser.add_argument('--llm-concurrency', type=int, default=SERVER_LLM_CONCURRENCY)
+    parser.add_argument('--batch-window-ms', type=float, default=SERVER_BATCH_WINDOW_SECONDS * 1000)
+    parser.add_argument('--max-batch', type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
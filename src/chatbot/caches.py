@@ -0,0 +1,206 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.preprocessing.embedding_cache import normalize_text
+from src.utils.constants import (
+    ANSWER_CACHE_MIN_SIMILARITY,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL_SECONDS,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    RETRIEVAL_CACHE_BUCKET_SCALE,
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+)
+
+# In-memory caches in front of the three expensive steps of a chatbot answer:
+#
+#   query embeddings  normalized query text -> embedding (skips the model encode)
+#   retrieval         (embedding bucket, k, filters) -> FAISS IDs and scores
+#                     (skips the index search; rows are re-read from the mmapped
+#                     metadata store, which is cheap)
+#   answers           query embedding -> answer, served when a new query's
+#                     embedding is at least ANSWER_CACHE_MIN_SIMILARITY
+#                     (cosine) to a cached one with the same filters
+#
+# Every cache is bounded (least recently used entries go first), expires
+# entries after a TTL, is safe to share between threads, and counts hits and
+# misses. ChatbotCaches.clear() drops everything when the index changes.
+
+
+def query_key(query):
+    """Cache key for a query: normalized text, case-folded."""
+    return normalize_text(query).casefold()
+
+
+def filters_key(filters):
+    """Hashable, order-independent form of a filters dict (None for no filters)."""
+    if not filters:
+        return None
+    return tuple(sorted((name, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+                        for name, value in filters.items()))
+
+
+def embedding_bucket(embedding, scale=RETRIEVAL_CACHE_BUCKET_SCALE):
+    """Embedding rounded to a 1/scale grid: near-identical query vectors share a bucket."""
+    return np.rint(np.asarray(embedding, dtype=np.float32).ravel() * scale).astype(np.int16).tobytes()
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire `ttl_seconds` after being stored."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self._entries = OrderedDict()  # key -> (stored_at, value), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+
+class SemanticAnswerCache:
+    """Answers keyed by query embedding, matched by cosine similarity instead of exact text.
+
+    Embeddings are L2-normalized, so similarity is a dot product against the
+    matrix of cached embeddings (at most `max_entries` rows).
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+                 min_similarity=ANSWER_CACHE_MIN_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self._embeddings = None  # (max_entries, dim) float32, rows in use given by _slots
+        self._slots = {}  # slot -> {"stored_at", "last_used", "filters", "answer", "query"}
+        self._lock = threading.Lock()
+
+    def get(self, embedding, filters=None):
+        """The cached answer for the closest matching query, or None."""
+        key = filters_key(filters)
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        now = time.monotonic()
+        with self._lock:
+            for slot in [slot for slot, entry in self._slots.items() if now - entry["stored_at"] > self.ttl_seconds]:
+                del self._slots[slot]
+                self.stats["expired"] += 1
+            candidates = [slot for slot, entry in self._slots.items() if entry["filters"] == key]
+            if candidates:
+                similarities = self._embeddings[candidates] @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.min_similarity:
+                    entry = self._slots[candidates[best]]
+                    entry["last_used"] = now
+                    self.stats["hits"] += 1
+                    return entry["answer"]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, embedding, answer, filters=None, query=None):
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        now = time.monotonic()
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_entries, len(embedding)), dtype=np.float32)
+            free = [slot for slot in range(self.max_entries) if slot not in self._slots]
+            if free:
+                slot = free[0]
+            else:
+                slot = min(self._slots, key=lambda used: self._slots[used]["last_used"])
+                self.stats["evictions"] += 1
+            self._embeddings[slot] = embedding
+            self._slots[slot] = {"stored_at": now, "last_used": now, "filters": filters_key(filters),
+                                 "answer": answer, "query": query}
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+
+class ChatbotCaches:
+    """The query-embedding, retrieval and answer caches of one ChatbotEngine."""
+
+    def __init__(self, embedding_entries=QUERY_EMBEDDING_CACHE_SIZE, retrieval_entries=RETRIEVAL_CACHE_SIZE,
+                 answer_entries=ANSWER_CACHE_SIZE, min_similarity=ANSWER_CACHE_MIN_SIMILARITY):
+        self.embeddings = TTLCache(embedding_entries, QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+        self.retrieval = TTLCache(retrieval_entries, RETRIEVAL_CACHE_TTL_SECONDS)
+        self.answers = SemanticAnswerCache(answer_entries, ANSWER_CACHE_TTL_SECONDS, min_similarity)
+        self.invalidations = 0
+
+    def get_embedding(self, query):
+        return self.embeddings.get(query_key(query))
+
+    def put_embedding(self, query, embedding):
+        self.embeddings.put(query_key(query), embedding)
+
+    def get_retrieval(self, embedding, k, filters=None):
+        """(scores, ids) of an earlier search for this embedding bucket, k and filters, or None."""
+        return self.retrieval.get((embedding_bucket(embedding), k, filters_key(filters)))
+
+    def put_retrieval(self, embedding, k, filters, scores, ids):
+        self.retrieval.put((embedding_bucket(embedding), k, filters_key(filters)), (scores, ids))
+
+    def clear(self):
+        """Drops every entry, e.g. because the index they were computed from has changed.
+
+        Query embeddings only depend on the model, but are dropped too: a
+        rebuilt index may come with a different one.
+        """
+        self.embeddings.clear()
+        self.retrieval.clear()
+        self.answers.clear()
+        self.invalidations += 1
+
+    def stats(self):
+        return {name: dict(cache.stats, entries=len(cache), hit_rate=cache.hit_rate())
+                for name, cache in (("query_embeddings", self.embeddings), ("retrieval", self.retrieval),
+                                    ("answers", self.answers))}
+
+    def report(self):
+        print("\n>>> Chatbot cache stats")
+        for name, stats in self.stats().items():
+            print(f"    {name}: hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {stats['hit_rate']:.1%}, "
+                  f"entries: {stats['entries']}, expired: {stats['expired']}, evictions: {stats['evictions']}")
+        print(f"    invalidations (index changed): {self.invalidations}")
@@ -1,15 +1,55 @@
-import faiss
-import pickle
-import numpy as np
-from sentence_transformers import SentenceTransformer
 import os
-import google.generativeai as genai
+import threading
+import time
+from collections import deque
+
 from dotenv import load_dotenv # Import load_dotenv
 
-# Load environment variables from .env file
+from src.chatbot.context_builder import build_context, format_item
+from src.utils.constants import (
+    CONTEXT_TOKEN_BUDGET,
+    INDEX_VERSION_CHECK_SECONDS,
+    LLM_BACKEND,
+    RESOURCE_RETRY_SECONDS,
+    RETRIEVAL_MODE,
+    ROUTER_ENABLED,
+)
+
+# Heavy libraries (faiss, sentence-transformers, google-generativeai) are
+# imported by the loaders below, so importing this module is nearly free.
+# ChatbotEngine loads each resource once, on first use or in background
+# threads started with start(); a resource that fails to load is reported
+# and retried on a later request (at most every RESOURCE_RETRY_SECONDS)
+# instead of exiting the process.
+#
+# Retrieval combines FAISS with a BM25 index (lexical_index.py) by
+# reciprocal rank fusion, so exact dish and brand names are found even when
+# the embedding ranks them low; without the BM25 file it is FAISS only.
+# The prompt gets the retrieved items merged across outlets and trimmed to a
+# token budget (see context_builder.py).
+#
+# Counting and price questions ("price range for desserts at Sweet Truth",
+# "which restaurant has the most vegetarian options") skip retrieval and the
+# LLM: router.py answers them from aggregate tables built at index time.
+#
+# Answers are streamed from Gemini: respond_stream() yields them chunk by
+# chunk (respond() joins the chunks), and the time to the first chunk is
+# recorded in answer_timings. The model sits behind llm_backends.ResilientLLM
+# (deadline, retries, circuit breaker); when it can't answer, the reply is a
+# templated list of the retrieved items. CHATBOT_LLM_BACKEND=offline swaps
+# Gemini for a local stand-in.
+#
+# Query embeddings, retrieval results and answers are cached (see caches.py).
+# When preprocess_and_index rewrites the index files, the engine reloads the
+# index and metadata and clears the caches.
+#
+# Full knowledge-base entries (restaurant features and type, an item's
+# allergens and counters, which the metadata store doesn't carry) are read
+# from the memory-mapped knowledge_base.bin (kb_store.py) by menu_item() and
+# restaurant_info(), one entry at a time.
+
 # Go up two levels from src/chatbot to the project root to find .env
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-load_dotenv(dotenv_path=os.path.join(project_root, '.env')) # Load .env from project root
 
 # Define paths relative to the script's location and then navigate correctly
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,110 +59,625 @@ output_dir = os.path.join(current_dir, '..', 'output')
 output_dir = os.path.normpath(output_dir)
 
 index_path = os.path.join(output_dir, 'faiss_index.bin')
-metadata_path = os.path.join(output_dir, 'metadata.pkl')
+metadata_path = os.path.join(output_dir, 'metadata.cols')
+lexical_path = os.path.join(output_dir, 'bm25_index.bin')
+aggregates_path = os.path.join(output_dir, 'aggregates.json')
+kb_path = os.path.join(output_dir, 'knowledge_base.bin')
+
+EMBEDDING_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+RESOURCES = ('index', 'metadata', 'embedder', 'lexical', 'router', 'llm')
+RETRIEVAL_RESOURCES = ('index', 'metadata', 'embedder')
+ON_DEMAND_RESOURCES = ('knowledge_base',)  # Not loaded by load() / start() unless named
+WARM_UP_QUERY = "spicy chicken biryani"
+# Orderings of the retrieved items the answer is written from: (key, descending).
+# Items without the field go last; the default keeps relevance order.
+SORT_ORDERS = {
+    "price_asc": ('price', False),
+    "price_desc": ('price', True),
+    "rating": ('popularity_score', True),
+}
+
+
+class ChatbotEngine:
+    """The retrieval and answer pipeline, with its index, metadata, embedder, BM25 index, router and LLM loaded lazily."""
+
+    def __init__(self, index_path=index_path, metadata_path=metadata_path,
+                 embedding_model=EMBEDDING_MODEL_NAME, llm_model=GEMINI_MODEL_NAME, lexical_path=lexical_path,
+                 retrieval_mode=RETRIEVAL_MODE, context_token_budget=CONTEXT_TOKEN_BUDGET, llm_client=None,
+                 llm_backend=None, aggregates_path=aggregates_path, route_queries=ROUTER_ENABLED,
+                 kb_path=kb_path):
+        """`llm_backend` picks the answer model: 'gemini', 'offline' or an LLMBackend (default: the
+        CHATBOT_LLM_BACKEND environment variable, else LLM_BACKEND). `llm_client` is any object with
+        Gemini's generate_content(prompt, stream=True), used instead. `route_queries=False` sends
+        every question to retrieval and the LLM. `kb_path` is the knowledge-base store read by
+        menu_item() and restaurant_info()."""
+        self.index_path = index_path
+        self.metadata_path = metadata_path
+        self.lexical_path = lexical_path
+        self.aggregates_path = aggregates_path
+        self.kb_path = kb_path
+        self.route_queries = route_queries
+        self.retrieval_mode = retrieval_mode
+        self.context_token_budget = context_token_budget  # None: every retrieved item, as retrieved
+        self.embedding_model = embedding_model
+        self.llm_model = llm_model
+        self.created = time.perf_counter()
+        self.load_seconds = {}
+        self.ready_seconds = None  # Engine creation until retrieval (index, metadata, embedder) could run
+        self.first_query_seconds = None
+        self.answer_timings = deque(maxlen=1000)  # (time to first chunk, total) seconds of recent answers
+        self.verbose = True  # Print each query's retrieved items and answer
+        self._resources = {}
+        self._errors = {}
+        self._failed_at = {}  # resource -> time.monotonic() of its last failed load
+        self._locks = {name: threading.Lock() for name in RESOURCES + ON_DEMAND_RESOURCES}
+        self._threads = {}
+        self._caches = None
+        self._caches_lock = threading.Lock()
+        self.loaded_index_version = None
+        self._version_checked_at = 0.0
+        self._index_rows = None  # (index, metadata, metadata row of each vector) for filtered search
+        self._lexical_rows = None  # (lexical, metadata, metadata row of each BM25 document)
+        self.llm_backend = llm_backend
+        if llm_client is not None:
+            from src.chatbot.llm_backends import GenerateContentBackend, ResilientLLM
+            self._resources['llm'] = ResilientLLM(GenerateContentBackend(llm_client))
+
+    @property
+    def caches(self):
+        """The engine's ChatbotCaches, created on first use (keeps numpy out of the import)."""
+        with self._caches_lock:
+            if self._caches is None:
+                from src.chatbot.caches import ChatbotCaches
+                self._caches = ChatbotCaches()
+            return self._caches
+
+    # --- Loading ---
+
+    def _load_index(self):
+        from src.preprocessing.index_factory import apply_search_params, load_index_params, needs_rescore, read_index
+        from src.preprocessing.vector_store import VectorStore
+
+        print(f"Attempting to load FAISS index from: {self.index_path}")
+        if not os.path.exists(self.index_path):
+            raise FileNotFoundError(f"FAISS index file not found at {self.index_path}. "
+                                    "Please run the preprocessing and indexing script first.")
+        self.loaded_index_version = self.index_version()
+        index_params = load_index_params(self.index_path) or {}
+        index = read_index(self.index_path, index_params)
+        apply_search_params(index, index_params)  # nprobe / efSearch for IVF and HNSW
+        # Compressed indexes rescore their shortlist from memory-mapped float vectors
+        vector_store = VectorStore.open(self.index_path, index_params["dim"]) if needs_rescore(index_params) else None
+        print("FAISS index loaded successfully.")
+        return index, index_params, vector_store
 
-# Ensure output directory exists (optional, good practice)
-# os.makedirs(output_dir, exist_ok=True) # Uncomment if needed
+    def _load_metadata(self):
+        from src.preprocessing.metadata_store import MetadataStore
 
-# Load FAISS index
-print(f"Attempting to load FAISS index from: {index_path}") # Added print statement
-if os.path.exists(index_path):
-    try:
-        index = faiss.read_index(index_path)
-        print("FAISS index loaded successfully.")
-    except Exception as e:
-        print(f"Error loading FAISS index: {e}")
-        exit()
-else:
-    print(f"Error: FAISS index file not found at {index_path}")
-    exit() # Or handle the error appropriately
-
-# Load metadata
-print(f"Attempting to load metadata from: {metadata_path}") # Added print statement
-if os.path.exists(metadata_path):
-    try:
-        with open(metadata_path, 'rb') as f:
-            metadata = pickle.load(f)
+        # Memory-mapped: rows are decoded only when a result is read
+        print(f"Attempting to load metadata from: {self.metadata_path}")
+        metadata = MetadataStore.open(self.metadata_path)
+        if metadata is None:
+            raise FileNotFoundError("Please rerun the preprocessing and indexing script to build the metadata store.")
         print("Metadata loaded successfully.")
-    except Exception as e:
-        print(f"Error loading metadata: {e}")
-        exit()
-else:
-    print(f"Error: Metadata file not found at {metadata_path}")
-    exit()
-
-# Load SentenceTransformer model
-try:
-    embedder = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-except Exception as e:
-    print(f"Error loading SentenceTransformer model: {e}")
-    print("Please ensure you have internet connectivity and the 'sentence-transformers' library installed.")
-    exit()
-
-# Configure Gemini
-try:
-    # IMPORTANT: Store your API key securely, e.g., environment variable
-    GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY') # This will now read from the loaded .env file
-    if not GOOGLE_API_KEY:
-        raise ValueError("GOOGLE_API_KEY not found in environment or .env file.")
-    genai.configure(api_key=GOOGLE_API_KEY)
-    # Choose a Gemini model (e.g., 'gemini-1.5-flash' or 'gemini-pro')
-    gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-    print("Gemini model loaded successfully.")
-except Exception as e:
-    print(f"Error configuring or loading Gemini model: {e}")
-    print("Please ensure you have set the GOOGLE_API_KEY environment variable and installed 'google-generativeai'.")
-    exit()
-
-def retrieve_top_k(query, k=10):
-    """Retrieve top-k most relevant documents"""
-    try:
-        query_embedding = embedder.encode([query], convert_to_numpy=True, normalize_embeddings=True)
-        D, I = index.search(query_embedding, k)
-
-        results = []
-        for i, idx in enumerate(I[0]):
-            if idx != -1 and idx < len(metadata): # FAISS returns -1 for no result
-                result_item = metadata[idx].copy() # Make a copy to avoid modifying original metadata
-                result_item['similarity_score'] = float(D[0][i]) # Add similarity score
-                results.append(result_item)
+        return metadata
+
+    def _load_embedder(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(self.embedding_model)
+        except Exception as e:
+            raise RuntimeError(f"{e}. Please ensure you have internet connectivity and the "
+                               "'sentence-transformers' library installed.") from e
+
+    def _load_lexical(self):
+        from src.preprocessing.lexical_index import LexicalIndex
+
+        lexical = LexicalIndex.open(self.lexical_path)
+        if lexical is None:
+            raise FileNotFoundError("Please rerun the preprocessing and indexing script to build the BM25 index.")
+        print("BM25 index loaded successfully.")
+        return lexical
+
+    def _load_router(self):
+        from src.chatbot.router import QueryRouter
+        from src.preprocessing.aggregates import AggregateTables
+
+        tables = AggregateTables.open(self.aggregates_path)
+        if tables is None:
+            raise FileNotFoundError("Please rerun the preprocessing and indexing script to build the aggregate tables.")
+        # Price-filtered lists read the metadata store; without it only the tables answer
+        return QueryRouter(tables, self.resource('metadata'))
+
+    def _load_knowledge_base(self):
+        from src.preprocessing.kb_store import KnowledgeBaseStore
+
+        knowledge_base = KnowledgeBaseStore.open(self.kb_path)
+        if knowledge_base is None:
+            raise FileNotFoundError("Please rerun preprocess_and_index with --from-raw to build knowledge_base.bin.")
+        return knowledge_base
+
+    def _load_llm(self):
+        from src.chatbot.llm_backends import GeminiBackend, LLMBackend, OfflineBackend, ResilientLLM
+
+        load_dotenv(dotenv_path=os.path.join(project_root, '.env')) # Load .env from project root
+        backend = self.llm_backend or os.getenv('CHATBOT_LLM_BACKEND', LLM_BACKEND)
+        if isinstance(backend, LLMBackend):
+            return ResilientLLM(backend)
+        if backend == 'offline':
+            print("Using the offline answer model (no Gemini calls).")
+            return ResilientLLM(OfflineBackend())
+        if backend != 'gemini':
+            raise ValueError(f"Unknown LLM backend {backend!r}; expected 'gemini' or 'offline'.")
+        try:
+            # IMPORTANT: Store your API key securely, e.g., environment variable
+            GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY') # This will now read from the loaded .env file
+            if not GOOGLE_API_KEY:
+                raise ValueError("GOOGLE_API_KEY not found in environment or .env file.")
+            gemini_backend = GeminiBackend(self.llm_model, GOOGLE_API_KEY)
+        except Exception as e:
+            raise RuntimeError(f"{e}. Please ensure you have set the GOOGLE_API_KEY environment variable and "
+                               "installed 'google-generativeai'.") from e
+        print("Gemini model loaded successfully.")
+        return ResilientLLM(gemini_backend)
+
+    def resource(self, name):
+        """The loaded resource `name`, loading it now if needed; None (with the error recorded) if that fails."""
+        resource = self._resources.get(name)
+        if resource is not None:
+            return resource
+        with self._locks[name]:
+            if name in self._resources:  # Loaded by another thread while this one waited
+                return self._resources[name]
+            if name in self._errors and time.monotonic() - self._failed_at[name] < RESOURCE_RETRY_SECONDS:
+                return None  # Failed recently; don't retry (and log) on every request
+            started = time.perf_counter()
+            try:
+                self._resources[name] = getattr(self, '_load_' + name)()
+            except Exception as e:
+                self._errors[name] = str(e)
+                self._failed_at[name] = time.monotonic()
+                print(f"Error loading {name}: {e}")
+                return None
+            self.load_seconds[name] = time.perf_counter() - started
+            self._errors.pop(name, None)
+            if self.ready_seconds is None and self.ready(RETRIEVAL_RESOURCES):
+                self.ready_seconds = time.perf_counter() - self.created
+            return self._resources[name]
+
+    def index_version(self):
+        """Identifies the files the engine loads (index, metadata, BM25, aggregates, knowledge base) as they are on disk."""
+        version = []
+        for path in (self.index_path, self.metadata_path, self.lexical_path, self.aggregates_path, self.kb_path):
+            try:
+                stat = os.stat(path)
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def check_index_version(self, force=False):
+        """Reloads the index, metadata, BM25 index and router, and clears the caches, if the files changed since they were loaded."""
+        now = time.monotonic()
+        if 'index' not in self._resources:
+            return False
+        if not force and now - self._version_checked_at < INDEX_VERSION_CHECK_SECONDS:
+            return False
+        self._version_checked_at = now
+        if self.index_version() == self.loaded_index_version:
+            return False
+        print("Index files changed on disk; reloading the index, metadata, BM25 index and router and clearing caches.")
+        for name in ('index', 'metadata', 'lexical', 'router', 'knowledge_base'):
+            with self._locks[name]:
+                self._resources.pop(name, None)  # Results still being read keep the old store mapped
+                self._errors.pop(name, None)  # A file that was missing may exist now
+        self.caches.clear()
+        return True
+
+    def load(self, names=RESOURCES):
+        """Loads `names` in the calling thread; True when all of them are available."""
+        return all([self.resource(name) is not None for name in names])
+
+    def start(self, names=RESOURCES, warm_up=False):
+        """Loads `names` in background threads (each in its own) and returns the engine immediately."""
+        for name in names:
+            thread = self._threads.get(name)
+            if name not in self._resources and (thread is None or not thread.is_alive()):
+                thread = threading.Thread(target=self.resource, args=(name,), name=f"chatbot-load-{name}",
+                                          daemon=True)
+                self._threads[name] = thread
+                thread.start()
+        if warm_up:
+            threading.Thread(target=self.warm_up, name="chatbot-warm-up", daemon=True).start()
+        return self
+
+    def wait(self, names=RESOURCES, timeout=None):
+        """Waits for background loading of `names`; True when all of them are available."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for name in names:
+            thread = self._threads.get(name)
+            if thread is not None:
+                thread.join(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        return self.ready(names)
+
+    def ready(self, names=RESOURCES):
+        return all(name in self._resources for name in names)
+
+    def status(self):
+        """{resource: 'ready' | 'loading' | 'not loaded' | 'error: ...'}"""
+        status = {}
+        for name in RESOURCES:
+            thread = self._threads.get(name)
+            if name in self._resources:
+                status[name] = 'ready'
+            elif thread is not None and thread.is_alive():
+                status[name] = 'loading'
+            elif name in self._errors:
+                status[name] = f"error: {self._errors[name]}"
             else:
-                print(f"Warning: Index {idx} out of bounds or invalid in FAISS search results.")
+                status[name] = 'not loaded'
+        return status
+
+    def warm_up(self, query=WARM_UP_QUERY):
+        """Runs one retrieval (no LLM call) so the first user query does not pay for first-use costs."""
+        started = time.perf_counter()
+        self.retrieve_top_k(query, k=10)
+        return time.perf_counter() - started
+
+    def report(self):
+        loads = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.load_seconds.items())
+        print(f"Chatbot engine: loaded {loads or 'nothing yet'}")
+        if self.ready_seconds is not None:
+            print(f"  Cold start (engine created to retrieval ready): {self.ready_seconds:.2f}s")
+        if self.first_query_seconds is not None:
+            print(f"  First query (retrieval): {self.first_query_seconds * 1000:.1f} ms")
+        if self.answer_timings:
+            first_chunk, total = (sorted(times)[len(times) // 2] for times in zip(*self.answer_timings))
+            print(f"  Answers: {len(self.answer_timings)}, median time to first token {first_chunk * 1000:.0f} ms, "
+                  f"to full answer {total * 1000:.0f} ms")
+        for name, error in self._errors.items():
+            print(f"  {name} unavailable: {error}")
+        if self._caches is not None:
+            self._caches.report()
+        if 'router' in self._resources:
+            self._resources['router'].report()
+        if 'llm' in self._resources:
+            self._resources['llm'].report()
+
+    # --- Knowledge base ---
+
+    def menu_item(self, item_id):
+        """The knowledge-base entry of the menu item `item_id` (e.g. a retrieved item's), or None."""
+        knowledge_base = self.resource('knowledge_base')
+        return None if knowledge_base is None else knowledge_base.item_by_id(item_id)
+
+    def restaurant_info(self, restaurant_name, location=None, menu=False):
+        """Knowledge-base entries of the restaurant's outlets (in `location` only, if given), without menus by default."""
+        knowledge_base = self.resource('knowledge_base')
+        if knowledge_base is None:
+            return []
+        return [knowledge_base.restaurant(index, menu) for index in knowledge_base.find_restaurants(restaurant_name,
+                                                                                                    location)]
+
+    # --- Answering ---
+
+    def embed_query(self, query):
+        """The normalized (1, dim) embedding of `query`, from the query-embedding cache when possible."""
+        embeddings = self.embed_queries([query])
+        return None if embeddings is None else embeddings[:1]
+
+    def embed_queries(self, queries):
+        """Normalized (n, dim) embeddings of `queries`; those not in the cache are encoded in one batch."""
+        import numpy as np
+
+        embeddings = [self.caches.get_embedding(query) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            embedder = self.resource('embedder')
+            if embedder is None:
+                return None
+            encoded = embedder.encode([queries[i] for i in missing], convert_to_numpy=True, normalize_embeddings=True)
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding[None, :]
+                self.caches.put_embedding(queries[i], embeddings[i])
+        return np.vstack(embeddings)
+
+    def _allowed_vectors(self, index, metadata, filters):
+        """Which of the index's vectors (in internal_ids order) have metadata matching `filters`."""
+        from src.preprocessing.index_factory import internal_ids
+
+        index_rows = self._index_rows
+        if index_rows is None or index_rows[0] is not index or index_rows[1] is not metadata:
+            index_rows = self._index_rows = (index, metadata, metadata.rows_for_ids(internal_ids(index)))
+        return metadata.filter_mask(filters, index_rows[2])
+
+    def _lexical_allowed(self, lexical, metadata, filters):
+        """Which BM25 documents (in row order) have metadata matching `filters`."""
+        lexical_rows = self._lexical_rows
+        if lexical_rows is None or lexical_rows[0] is not lexical or lexical_rows[1] is not metadata:
+            lexical_rows = self._lexical_rows = (lexical, metadata, metadata.rows_for_ids(lexical.ids))
+        return metadata.filter_mask(filters, lexical_rows[2])
+
+    def _dense_search(self, metadata, embeddings, k, filters):
+        """(scores, FAISS IDs) of the FAISS search for each row of `embeddings`, from the retrieval cache when possible.
+
+        `filters` holds each query's filters; cache misses with the same
+        filters are searched together, in one batch.
+        """
+        from src.chatbot.caches import filters_key
+        from src.preprocessing.index_factory import search
+
+        index, index_params, vector_store = self.resource('index')
+        results = [self.caches.get_retrieval(embeddings[i:i + 1], k, filters[i]) for i in range(len(embeddings))]
+        groups = {}
+        for i, cached in enumerate(results):
+            if cached is None:
+                groups.setdefault(filters_key(filters[i]), []).append(i)
+        for rows in groups.values():
+            query_filters = filters[rows[0]]
+            allowed = self._allowed_vectors(index, metadata, query_filters) if query_filters else None
+            D, I = search(index, index_params, embeddings[rows], k, vector_store, allowed)
+            for row, scores, ids in zip(rows, D, I):
+                results[row] = (scores, ids)
+                self.caches.put_retrieval(embeddings[row:row + 1], k, query_filters, scores, ids)
         return results
-    except Exception as e:
-        print(f"Error during FAISS search: {e}")
-        return []
-
 
-def generate_answer(context_texts, user_query):
-    """Generate a natural answer based on retrieved context using Gemini"""
-    if not context_texts:
-        return "I couldn't find relevant information to answer your question based on the available data."
-
-    # Improved context formatting
-    context_parts = []
-    # print("context_texts:", context_texts)  # Debugging line (keep commented out unless needed)
-    for i, item in enumerate(context_texts):
-        # print(item)
-        # Ensure price is formatted reasonably, handle potential non-numeric data if necessary
-        price_str = str(item.get('price', 'N/A'))
-        context_parts.append(
-            f"Result {i+1}:\n"
-            f"  Restaurant: {item.get('restaurant_name', 'N/A')}\n"
-            f"  Item: {item.get('item_name', 'N/A')}\n"
-            f"  Price: {price_str}\n" 
-            f"  Description: {item.get('short_description', '').strip()} {item.get('long_description', '').strip()}\n" # Use strip()
-            f"  Location: {item.get('location', 'N/A')}\n"
-            f"  Gluten Free: {item.get('gluten_free', 'N/A')}\n"
-            f"  affordability: {item.get('affordability_tag', 'N/A')}\n"
-            f"  Vegetarian: {item.get('tags', 'N/A')}\n"
-            f"  Tags / Features : {item.get('dish_type', 'N/A')}\n"
-            f"  popularity score / Famous / Rated: {item.get('popularity_score', 'N/A')}\n"
-            f"  avaiable time : {item.get('available_time', 'N/A')}\n"
-            f"  contact / phone number of restaurant: {item.get('contact', 'N/A')}\n"
-            # Add similarity score to context if needed for debugging or advanced prompting
-            # f"  Similarity Score: {item.get('similarity_score', 'N/A'):.4f}\n"
-        )
+    def _lexical_search(self, lexical, metadata, query, k, filters):
+        """(BM25 scores, FAISS IDs) of the documents matching `query`'s terms."""
+        allowed = self._lexical_allowed(lexical, metadata, filters) if filters else None
+        return lexical.search(query, k, allowed)
+
+    def retrieve_top_k(self, query, k=10, filters=None, mode=None):
+        """Retrieve top-k most relevant documents
+
+        `filters` restricts results to items whose metadata matches, inside the
+        FAISS search (see MetadataStore.filter_mask for the format), e.g.
+        {"dish_type": "veg", "price": (None, 150)}.
+
+        `mode` is 'dense' (FAISS), 'lexical' (BM25) or 'hybrid' (the top k of
+        each, merged by reciprocal rank fusion); it defaults to the engine's
+        retrieval_mode. Without a BM25 index every mode searches FAISS only.
+        """
+        return self.retrieve_many([query], k, [filters], mode)[0]
+
+    def retrieve_many(self, queries, k=10, filters=None, mode=None, embeddings=None):
+        """retrieve_top_k for several queries at once: one embedding batch and one FAISS search per distinct filters.
+
+        `filters` is one filters dict for every query or a list with one per
+        query; `embeddings` are the queries' (from embed_queries) if already known.
+        """
+        from src.preprocessing.lexical_index import rrf_fuse
+
+        filters = filters if isinstance(filters, list) else [filters] * len(queries)
+        self.check_index_version()
+        mode = mode or self.retrieval_mode
+        lexical = self.resource('lexical') if mode != 'dense' else None
+        if lexical is None:
+            mode = 'dense'
+        needed = ('metadata',) if mode == 'lexical' else RETRIEVAL_RESOURCES
+        if any(self.resource(name) is None for name in needed):
+            return [[] for _ in queries]
+        metadata = self.resource('metadata')
+
+        started = time.perf_counter()
+        try:
+            if mode != 'lexical':
+                if embeddings is None:
+                    embeddings = self.embed_queries(queries)
+                dense = self._dense_search(metadata, embeddings, k, filters)
+            batch = []
+            for position, query in enumerate(queries):
+                if mode == 'lexical':
+                    scores, ids = self._lexical_search(lexical, metadata, query, k, filters[position])
+                else:
+                    scores, ids = dense[position]
+                    if mode == 'hybrid':
+                        _, lexical_ids = self._lexical_search(lexical, metadata, query, k, filters[position])
+                        fused = rrf_fuse([[int(idx) for idx in ids if idx != -1], lexical_ids.tolist()], k)
+                        ids = [idx for idx, _ in fused]
+                        scores = [score for _, score in fused]  # The fused score stands in for similarity
+
+                results = []
+                for i, idx in enumerate(ids):
+                    # Lightweight row view with the similarity score layered on top; FAISS returns -1 for no result
+                    item = metadata.get(idx, similarity_score=float(scores[i])) if idx != -1 else None
+                    if item is not None:
+                        results.append(item)
+                    elif idx != -1 or not filters[position]:  # Fewer than k items matching the filters is not an error
+                        print(f"Warning: Index {idx} out of bounds or invalid in FAISS search results.")
+                batch.append(results)
+            return batch
+        except Exception as e:
+            print(f"Error during {mode} search: {e}")
+            return [[] for _ in queries]
+        finally:
+            if self.first_query_seconds is None:
+                self.first_query_seconds = time.perf_counter() - started
+
+    def build_context(self, items):
+        """The prompt context for the retrieved `items` (see context_builder.build_context)."""
+        if self.context_token_budget is None:
+            return items
+        return build_context(items, self.context_token_budget)
+
+    def generate_answer(self, context_texts, user_query):
+        """Generate a natural answer based on retrieved context using Gemini"""
+        return self._generate_answer(context_texts, user_query)[0]
+
+    def generate_answer_stream(self, context_texts, user_query):
+        """Like generate_answer, but yields the answer in chunks as Gemini produces them."""
+        yield from self._generate_answer_stream(context_texts, user_query)
+
+    def _generate_answer(self, context_texts, user_query):
+        """(answer, True) for a model answer; (message, False) when none could be generated."""
+        chunks = []
+        stream = self._generate_answer_stream(context_texts, user_query)
+        while True:
+            try:
+                chunks.append(next(stream))
+            except StopIteration as stop:
+                return "".join(chunks), stop.value
+
+    def _generate_answer_stream(self, context_texts, user_query):
+        """Yields the answer's chunks; returns True for a complete model answer, False otherwise."""
+        from src.chatbot.llm_backends import LLMBlocked, LLMUnavailable, templated_answer
+
+        if not context_texts:
+            yield "I couldn't find relevant information to answer your question based on the available data."
+            return False
+        context = self.build_context(context_texts)
+        llm = self.resource('llm')
+        if llm is None:
+            yield templated_answer(context)
+            return False
+        prompt = build_prompt(context, user_query)
+
+        generated = False
+        try:
+            # Stream the content from the answer model; each chunk holds the next few tokens
+            for chunk in llm.stream(prompt):
+                generated = True
+                yield chunk
+            return True
+        except LLMBlocked as e:
+            print(f"Warning: Gemini response blocked. Reason: {e.reason}")
+            yield str(e)
+        except LLMUnavailable as e:
+            print(f"Answer model unavailable ({e}); answering from the retrieved items.")
+            # Part of the answer may already be on screen
+            yield "\n\n(The rest of the answer timed out, sorry!)" if generated else templated_answer(context)
+        return False
+
+    def respond(self, user_query, filters=None, sort=None):
+        """Main chatbot function
+
+        `filters` restrict the retrieved items (see retrieve_top_k); `sort` is a
+        key of SORT_ORDERS, applied to them before the answer is written.
+        """
+        return "".join(self.respond_stream(user_query, filters, sort))
+
+    def respond_stream(self, user_query, filters=None, sort=None):
+        """Like respond, but yields the answer in chunks as it is generated (e.g. for st.write_stream)."""
+        started = time.perf_counter()
+        prepared = self.prepare_many([user_query], [filters], [sort])[0]
+        first_chunk_at = None
+        for chunk in self.answer_stream(prepared):
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            yield chunk
+        if first_chunk_at is not None:
+            self.answer_timings.append((first_chunk_at - started, time.perf_counter() - started))
+
+    def prepare_many(self, queries, filters=None, sorts=None):
+        """Everything before the LLM call for several queries at once (see retrieve_many).
+
+        Returns one dict per query for answer_stream: the query, its answer
+        cache key and embedding, and either a final "answer" (from the query
+        router or the answer cache, or a message when nothing was retrieved)
+        or the retrieved "items", sorted. Routed queries are not embedded.
+        """
+        filters = filters if isinstance(filters, list) else [filters] * len(queries)
+        sorts = sorts if isinstance(sorts, list) else [sorts] * len(queries)
+        self.check_index_version()
+        router = self.resource('router') if self.route_queries else None
+        prepared = []
+        for position, user_query in enumerate(queries):
+            if self.verbose:
+                print(f"\nUser Query: {user_query}")
+            sort = sorts[position]
+            answer_key = dict(filters[position] or {}, _sort=sort) if sort else filters[position]
+            entry = {"query": user_query, "answer_key": answer_key, "embedding": None}
+            # Aggregate questions are answered from the precomputed tables (the sidebar filters don't apply to them)
+            routed_answer = router.route(user_query) if router is not None and not filters[position] else None
+            if routed_answer is not None:
+                if self.verbose:
+                    print(f"\nGenerated Answer (from the aggregate tables): {routed_answer}")
+                entry["answer"] = routed_answer
+            prepared.append(entry)
+
+        unrouted = [position for position, entry in enumerate(prepared) if "answer" not in entry]
+        if not unrouted:
+            return prepared
+        embeddings = self.embed_queries([queries[position] for position in unrouted])
+        embedding_rows = {position: row for row, position in enumerate(unrouted)}
+        for position, row in embedding_rows.items():
+            entry = prepared[position]
+            entry["embedding"] = None if embeddings is None else embeddings[row:row + 1]
+            # A near-identical earlier question (by embedding similarity) gets its stored answer
+            if entry["embedding"] is not None:
+                cached_answer = self.caches.answers.get(entry["embedding"], entry["answer_key"])
+                if cached_answer is not None:
+                    if self.verbose:
+                        print(f"\nGenerated Answer (from answer cache): {cached_answer}")
+                    entry["answer"] = cached_answer
+
+        pending = [position for position, entry in enumerate(prepared) if "answer" not in entry]
+        if not pending:
+            return prepared
+        # Retrieve top 50 relevant documents to provide more context for specific/comparative queries
+        retrieved = self.retrieve_many([queries[position] for position in pending], k=50, # Increased k to 50
+                                       filters=[filters[position] for position in pending],
+                                       embeddings=None if embeddings is None else
+                                       embeddings[[embedding_rows[position] for position in pending]])
+        for position, retrieved_context in zip(pending, retrieved):
+            entry = prepared[position]
+            if not retrieved_context:
+                if not self.ready(RETRIEVAL_RESOURCES):
+                    print(f"Retrieval unavailable: {self.status()}")
+                    entry["answer"] = "Sorry, the menu search isn't available right now. Please try again in a moment."
+                elif filters[position]:
+                    entry["answer"] = "I couldn't find any menu items matching your filters. Try loosening them a bit!"
+                else:
+                    entry["answer"] = "I couldn't find any relevant menu items for your query based on the available data."
+                continue
+            sort = sorts[position]
+            if sort in SORT_ORDERS:
+                field, descending = SORT_ORDERS[sort]
+                present = [item for item in retrieved_context if item.get(field) is not None]
+                missing = [item for item in retrieved_context if item.get(field) is None]
+                retrieved_context = sorted(present, key=lambda item: item.get(field), reverse=descending) + missing
+            entry["items"] = retrieved_context
+        return prepared
+
+    def answer_stream(self, prepared):
+        """Yields the answer for one entry of prepare_many, generating it with the LLM if needed."""
+        if "answer" in prepared:
+            yield prepared["answer"]
+            return
+        retrieved_context = prepared["items"]
+        if self.verbose:
+            print(retrieved_context)
+            print(f"\nRetrieved Context ({len(retrieved_context)} items):") # Show how many items were retrieved
+            # Only print the top few retrieved items to avoid cluttering the console
+            max_items_to_print = 10
+            for i, item in enumerate(retrieved_context[:max_items_to_print]):
+                 print(f"  {i+1}. Restaurant: {item.get('restaurant_name', 'N/A')}, Item: {item.get('item_name', 'N/A')}, Score: {item.get('similarity_score', 'N/A'):.4f}")
+            if len(retrieved_context) > max_items_to_print:
+                print(f"  ... (and {len(retrieved_context) - max_items_to_print} more)")
+
+
+        chunks = []
+        stream = self._generate_answer_stream(retrieved_context, prepared["query"])
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                generated = stop.value
+                break
+            chunks.append(chunk)
+            yield chunk
+        answer = "".join(chunks)
+        if generated and prepared["embedding"] is not None:
+            self.caches.answers.put(prepared["embedding"], answer, prepared["answer_key"], query=prepared["query"])
+        if self.verbose:
+            print(f"\nGenerated Answer: {answer}")
+
+
+def build_prompt(context_texts, user_query):
+    """The Gemini prompt for `user_query` over the retrieved items."""
+    # Improved context formatting: merged entries from build_context, or raw retrieved items
+    context_parts = [format_item(i + 1, item) for i, item in enumerate(context_texts)]
     context = "\n".join(context_parts)
     # print(f"Formatted Context:\n{context}")  # Debugging line (keep commented out unless needed)
 
@@ -171,51 +726,65 @@ Context:
 User Question: {user_query}
 
 Answer:"""
+    return prompt
+
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The process-wide engine, created on first use (its resources load lazily)."""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = ChatbotEngine()
+        return _default_engine
+
 
-    try:
-        # Generate content using the Gemini model
-        response = gemini_model.generate_content(prompt)
-        # Access the generated text
-        if response.parts:
-            answer = response.text
-        elif hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason:
-             answer = f"Blocked due to: {response.prompt_feedback.block_reason}"
-             print(f"Warning: Gemini response blocked. Reason: {response.prompt_feedback.block_reason}")
-        else:
-            # Handle cases where response might be empty or lack 'parts' unexpectedly
-            answer = "Sorry, I could not generate a valid answer from the model."
-            print(f"Warning: Gemini returned an unexpected or empty response structure: {response}")
-
-
-        return answer
-    except Exception as e:
-        # Log the full exception for debugging
-        import traceback
-        print(f"Error during Gemini text generation: {e}\n{traceback.format_exc()}")
-        return "Sorry, I encountered an error while generating the answer with Gemini."
-
-def chatbot_respond(user_query):
+def retrieve_top_k(query, k=10, filters=None, mode=None):
+    """Retrieve top-k most relevant documents"""
+    return get_engine().retrieve_top_k(query, k, filters, mode)
+
+
+def generate_answer(context_texts, user_query):
+    """Generate a natural answer based on retrieved context using Gemini"""
+    return get_engine().generate_answer(context_texts, user_query)
+
+
+def generate_answer_stream(context_texts, user_query):
+    """Generate the answer in chunks, as Gemini produces them"""
+    return get_engine().generate_answer_stream(context_texts, user_query)
+
+
+def chatbot_respond(user_query, filters=None, sort=None):
     """Main chatbot function"""
-    print(f"\nUser Query: {user_query}")
-    # Retrieve top 50 relevant documents to provide more context for specific/comparative queries
-    retrieved_context = retrieve_top_k(user_query, k=50) # Increased k to 50
-
-    if not retrieved_context:
-        print("No relevant context found.")
-        return "I couldn't find any relevant menu items for your query based on the available data."
-    print(retrieved_context)
-    print(f"\nRetrieved Context ({len(retrieved_context)} items):") # Show how many items were retrieved
-    # Only print the top few retrieved items to avoid cluttering the console
-    max_items_to_print = 10
-    for i, item in enumerate(retrieved_context[:max_items_to_print]):
-         print(f"  {i+1}. Restaurant: {item.get('restaurant_name', 'N/A')}, Item: {item.get('item_name', 'N/A')}, Score: {item.get('similarity_score', 'N/A'):.4f}")
-    if len(retrieved_context) > max_items_to_print:
-        print(f"  ... (and {len(retrieved_context) - max_items_to_print} more)")
-
-
-    answer = generate_answer(retrieved_context, user_query)
-    print(f"\nGenerated Answer: {answer}")
-    return answer
+    return get_engine().respond(user_query, filters, sort)
+
+
+def chatbot_respond_stream(user_query, filters=None, sort=None):
+    """Main chatbot function, yielding the answer in chunks as it is generated"""
+    return get_engine().respond_stream(user_query, filters, sort)
+
+
+# --- Test Queries --- (run by __main__ below and by the benchmarks)
+TEST_QUERIES = [
+    "Find spicy chicken dishes",
+    "Are there any vegan options?",
+    "Show me budget-friendly meals under 150", # Answered by the query router from a price filter
+    "What desserts are available?",
+    "Tell me about Italian food",
+    "Any gluten-free pasta?",
+    "Where can I get biryani?",
+    # --- New Test Queries ---
+    "Which restaurant has the most vegetarian options in their menu based on this data?", # Modified 'best'
+    "Does 'Pizza Place' have any gluten-free appetizers?", # Replace 'Pizza Place' with an actual name from your data if possible
+    "What's the price range for desserts at 'Curry House'?", # Replace 'Curry House' with an actual name
+    "Compare the spice levels mentioned for dishes at 'Spice King' and 'Noodle Bar'", # Replace with actual names
+    "List vegetarian main courses",
+
+]
+
 
 # Example usage (optional, for testing)
 if __name__ == "__main__":
@@ -224,25 +793,9 @@ if __name__ == "__main__":
         print("Error: FAISS index or metadata file not found.")
         print("Please run the preprocessing and indexing script first (e.g., preprocess_and_index.py).")
     else:
-        # --- Test Queries ---
-        test_queries = [
-            "Find spicy chicken dishes",
-            "Are there any vegan options?",
-            "Show me budget-friendly meals under 150", # Price filtering still relies on LLM interpretation of context
-            "What desserts are available?",
-            "Tell me about Italian food",
-            "Any gluten-free pasta?",
-            "Where can I get biryani?",
-            # --- New Test Queries ---
-            "Which restaurant has the most vegetarian options in their menu based on this data?", # Modified 'best'
-            "Does 'Pizza Place' have any gluten-free appetizers?", # Replace 'Pizza Place' with an actual name from your data if possible
-            "What's the price range for desserts at 'Curry House'?", # Replace 'Curry House' with an actual name
-            "Compare the spice levels mentioned for dishes at 'Spice King' and 'Noodle Bar'", # Replace with actual names
-            "List vegetarian main courses",
-
-        ]
-
-        for query in test_queries:
+        engine = get_engine().start(warm_up=True)
+
+        for query in TEST_QUERIES:
             chatbot_respond(query)
             print("-" * 50)
 
@@ -0,0 +1,185 @@
+import re
+
+from src.utils.constants import CONTEXT_MMR_LAMBDA, CONTEXT_TOKEN_BUDGET
+
+# Turns the retrieved items into the context of the Gemini prompt:
+#
+#   1. items that are the same dish of the same restaurant (names equal up to
+#      case, punctuation and '&' / 'and', e.g. "Paneer Wrap." and "Paneer
+#      Wrap .") are merged into one entry that lists every outlet selling it
+#   2. the short and long descriptions are kept once when one repeats the other
+#   3. entries are picked by maximal marginal relevance (relevance to the
+#      query minus overlap with entries already picked) until the rendered
+#      context reaches the token budget
+#
+# Picked entries keep their retrieval order, so a sort applied to the
+# retrieved items still holds in the prompt. Pure Python: no tokenizer or
+# model is loaded.
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def estimate_tokens(text):
+    """Approximate LLM token count: about four characters per token for English text."""
+    return (len(text) + 3) // 4
+
+
+def _words(text):
+    return WORD_PATTERN.findall(text.casefold().replace('&', ' and '))
+
+
+def dedupe_description(short_description, long_description):
+    """The item's description with a repeated short/long description kept once."""
+    short_description = (short_description or '').strip()
+    long_description = (long_description or '').strip()
+    short_words, long_words = _words(short_description), _words(long_description)
+    if not short_words or ' '.join(short_words) in ' '.join(long_words):
+        return long_description
+    if not long_words or ' '.join(long_words) in ' '.join(short_words):
+        return short_description
+    return f"{short_description} {long_description}"
+
+
+def merge_duplicates(items):
+    """One entry per dish and restaurant, in order of first appearance.
+
+    An entry is the first (best ranked) item's fields plus "outlets" (one
+    {location, contact, available_time, price} per item merged into it),
+    "description", and "similarity_score" / "popularity_score" maxed over
+    its items.
+    """
+    entries = {}
+    for item in items:
+        key = (str(item.get('restaurant_name', '')).casefold(), ' '.join(_words(str(item.get('item_name', '')))))
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = dict(item, outlets=[], description=dedupe_description(
+                item.get('short_description'), item.get('long_description')))
+        outlet = {field: item.get(field) for field in ('location', 'contact', 'available_time', 'price')}
+        if outlet not in entry["outlets"]:
+            entry["outlets"].append(outlet)
+        for field in ('similarity_score', 'popularity_score'):
+            if item.get(field) is not None and (entry.get(field) is None or item[field] > entry[field]):
+                entry[field] = item[field]
+    return list(entries.values())
+
+
+def _price_text(entry):
+    prices = sorted({outlet["price"] for outlet in entry["outlets"] if outlet["price"] is not None})
+    if len(prices) > 1:
+        return f"{prices[0]}-{prices[-1]} depending on the outlet"
+    return str(prices[0]) if prices else 'N/A'
+
+
+def _outlets_text(entry):
+    """Outlet locations, with the contact and opening hours said once when every outlet shares them."""
+    outlets = entry["outlets"]
+    shared = [field for field in ('contact', 'available_time') if len({outlet[field] for outlet in outlets}) == 1]
+    parts = []
+    for outlet in outlets:
+        details = [f"{field.replace('_', ' ')} {outlet[field]}" for field in ('contact', 'available_time')
+                   if field not in shared and outlet[field]]
+        parts.append(f"{outlet['location']} ({', '.join(details)})" if details else str(outlet['location']))
+    text = ", ".join(parts)
+    for field in shared:
+        if outlets[0][field]:
+            text += f"; {field.replace('_', ' ')} {outlets[0][field]}"
+    return text
+
+
+def format_item(position, item):
+    """One result of the prompt context: an entry from build_context or, as before it, a raw retrieved item."""
+    if "outlets" not in item:
+        # Ensure price is formatted reasonably, handle potential non-numeric data if necessary
+        price_str = str(item.get('price', 'N/A'))
+        return (
+            f"Result {position}:\n"
+            f"  Restaurant: {item.get('restaurant_name', 'N/A')}\n"
+            f"  Item: {item.get('item_name', 'N/A')}\n"
+            f"  Price: {price_str}\n"
+            f"  Description: {item.get('short_description', '').strip()} {item.get('long_description', '').strip()}\n" # Use strip()
+            f"  Location: {item.get('location', 'N/A')}\n"
+            f"  Gluten Free: {item.get('gluten_free', 'N/A')}\n"
+            f"  affordability: {item.get('affordability_tag', 'N/A')}\n"
+            f"  Vegetarian: {item.get('tags', 'N/A')}\n"
+            f"  Tags / Features : {item.get('dish_type', 'N/A')}\n"
+            f"  popularity score / Famous / Rated: {item.get('popularity_score', 'N/A')}\n"
+            f"  avaiable time : {item.get('available_time', 'N/A')}\n"
+            f"  contact / phone number of restaurant: {item.get('contact', 'N/A')}\n"
+        )
+    description = f"  Description: {item['description']}\n" if item["description"] else ''
+    return (
+        f"Result {position}:\n"
+        f"  Restaurant: {item.get('restaurant_name', 'N/A')}\n"
+        f"  Item: {item.get('item_name', 'N/A')}\n"
+        f"  Price: {_price_text(item)}\n"
+        f"{description}"
+        f"  Outlets: {_outlets_text(item)}\n"
+        f"  Gluten Free: {item.get('gluten_free', 'N/A')}\n"
+        f"  affordability: {item.get('affordability_tag', 'N/A')}\n"
+        f"  Vegetarian: {item.get('tags', 'N/A')}\n"
+        f"  Tags / Features : {item.get('dish_type', 'N/A')}\n"
+        f"  popularity score / Famous / Rated: {item.get('popularity_score', 'N/A')}\n"
+    )
+
+
+def summarize_items(items, limit=8):
+    """A bullet list of the first `limit` items (raw or merged entries): name, restaurant, price and outlets."""
+    lines = []
+    for item in items[:limit]:
+        if "outlets" in item:
+            price = _price_text(item)
+            where = ", ".join(str(outlet["location"]) for outlet in item["outlets"] if outlet["location"])
+        else:
+            price, where = item.get('price'), item.get('location')
+        line = f"- {item.get('item_name', 'N/A')} from {item.get('restaurant_name', 'N/A')}"
+        if price not in (None, '', 'N/A'):
+            line += f", ₹{price}"
+        if where:
+            line += f" ({where})"
+        lines.append(line)
+    if len(items) > limit:
+        lines.append(f"...and {len(items) - limit} more.")
+    return "\n".join(lines)
+
+
+def _relevance(entries):
+    """Each entry's retrieval score scaled to [0, 1]; rank order when the scores don't separate them."""
+    scores = [entry.get('similarity_score') for entry in entries]
+    if None not in scores and max(scores) > min(scores):
+        low, high = min(scores), max(scores)
+        return [(score - low) / (high - low) for score in scores]
+    return [1 - position / len(entries) for position in range(len(entries))]
+
+
+def _overlap(words, other_words):
+    return len(words & other_words) / len(words | other_words) if words and other_words else 0.0
+
+
+def build_context(items, token_budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=CONTEXT_MMR_LAMBDA):
+    """Merged, de-duplicated entries of `items` (best retrieved first) whose rendering fits `token_budget`.
+
+    Entries are taken by maximal marginal relevance: mmr_lambda * relevance
+    minus (1 - mmr_lambda) * the largest word overlap (Jaccard) with an
+    entry already taken. One that doesn't fit the remaining budget is
+    skipped for smaller ones; the best entry is always kept.
+    """
+    entries = merge_duplicates(items)
+    if not entries:
+        return []
+    relevance = _relevance(entries)
+    words = [set(_words(f"{entry.get('item_name', '')} {entry['description']}")) for entry in entries]
+    costs = [estimate_tokens(format_item(position + 1, entry)) for position, entry in enumerate(entries)]
+    redundancy = [0.0] * len(entries)  # Largest overlap with a chosen entry, updated as entries are chosen
+    chosen, remaining = [], set(range(len(entries)))
+    used = 0
+    while remaining:
+        best = max(remaining, key=lambda i: mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy[i])
+        remaining.discard(best)
+        if chosen and used + costs[best] > token_budget:
+            continue
+        chosen.append(best)
+        used += costs[best]
+        for i in remaining:
+            redundancy[i] = max(redundancy[i], _overlap(words[i], words[best]))
+    return [entries[i] for i in sorted(chosen)]
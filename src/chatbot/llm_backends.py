@@ -0,0 +1,288 @@
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from src.chatbot.context_builder import summarize_items
+from src.utils.constants import (
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_RESET_SECONDS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_REQUESTS,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF_SECONDS,
+    LLM_TIMEOUT_SECONDS,
+)
+
+# The chatbot's answer model behind one interface, LLMBackend.stream(prompt,
+# timeout), which yields the answer's text chunks:
+#
+#   GeminiBackend           Google Gemini (needs GOOGLE_API_KEY)
+#   GenerateContentBackend  any object with Gemini's generate_content(), e.g. a test double
+#   OfflineBackend          a deterministic local stand-in that lists the prompt's
+#                           items, optionally on a token schedule; no network or key
+#
+# ResilientLLM wraps a backend for the chatbot: every call has a deadline,
+# failed attempts are retried (exponential backoff with full jitter) while
+# nothing has been streamed yet, an optional hedged attempt starts when the
+# first one has not produced a chunk by the p95 of recent first-chunk
+# latencies, and a circuit breaker stops calling a failing backend for a
+# while. When it gives up it raises LLMUnavailable, and the chatbot answers
+# from a template built from the retrieved items (templated_answer).
+
+
+class LLMError(Exception):
+    """A failed model call; worth retrying."""
+
+
+class LLMBlocked(LLMError):
+    """The model refused the prompt (safety block); retrying won't help."""
+
+    def __init__(self, reason):
+        super().__init__(f"Blocked due to: {reason}")
+        self.reason = reason
+
+
+class LLMUnavailable(LLMError):
+    """ResilientLLM gave up: deadline passed, retries exhausted, or the circuit is open."""
+
+
+class LLMBackend:
+    """Yields the model's answer to a prompt in text chunks."""
+
+    name = 'backend'
+
+    def stream(self, prompt, timeout):
+        raise NotImplementedError
+
+
+class GenerateContentBackend(LLMBackend):
+    """Any model object with Gemini's generate_content(prompt, stream=True)."""
+
+    name = 'client'
+
+    def __init__(self, model, pass_timeout=False):
+        self.model = model
+        self.pass_timeout = pass_timeout
+
+    def stream(self, prompt, timeout):
+        options = {"request_options": {"timeout": timeout}} if self.pass_timeout else {}
+        response = self.model.generate_content(prompt, stream=True, **options)
+        generated = False
+        for chunk in response:
+            if chunk.parts:
+                generated = True
+                yield chunk.text
+        if generated:
+            return
+        feedback = getattr(response, 'prompt_feedback', None)
+        if feedback is not None and feedback.block_reason:
+            raise LLMBlocked(feedback.block_reason)
+        raise LLMError(f"Empty or unexpected response structure: {response}")
+
+
+class GeminiBackend(GenerateContentBackend):
+    name = 'gemini'
+
+    def __init__(self, model_name, api_key):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        super().__init__(genai.GenerativeModel(model_name), pass_timeout=True)
+
+
+PROMPT_ITEM_PATTERN = re.compile(r'^  Restaurant: (.*)\n  Item: (.*)\n  Price: (.*)$', re.MULTILINE)
+PROMPT_QUESTION_PATTERN = re.compile(r'^User Question: (.*)$', re.MULTILINE)
+
+
+class OfflineBackend(LLMBackend):
+    """Deterministic stand-in: answers by listing the prompt's items, for load tests and CI.
+
+    Waits `first_token_seconds`, then yields `chunk_words` words every
+    `chunk_words` x `token_seconds` (both 0 by default).
+    """
+
+    name = 'offline'
+
+    def __init__(self, first_token_seconds=0.0, token_seconds=0.0, chunk_words=4):
+        self.first_token_seconds = first_token_seconds
+        self.token_seconds = token_seconds
+        self.chunk_words = chunk_words
+
+    def stream(self, prompt, timeout):
+        items = [{"restaurant_name": restaurant, "item_name": item, "price": price}
+                 for restaurant, item, price in PROMPT_ITEM_PATTERN.findall(prompt)]
+        question = PROMPT_QUESTION_PATTERN.search(prompt)
+        intro = f'Here\'s what I found for "{question.group(1)}":' if question else "Here's what I found:"
+        words = re.split(r'(?<=\s)', f"{intro}\n{summarize_items(items)}" if items else
+                         "Hmm, I couldn't find anything on the menu for that.")
+        time.sleep(self.first_token_seconds)
+        for start in range(0, len(words), self.chunk_words):
+            chunk = words[start:start + self.chunk_words]
+            time.sleep(self.token_seconds * len(chunk))
+            yield ''.join(chunk)
+
+
+def templated_answer(items):
+    """The fallback answer when the model can't be reached: the best retrieved items, listed."""
+    if not items:
+        return "Sorry, the answer model isn't available right now. Please try again in a moment."
+    return ("I can't reach the answer model right now, but here's what matched your question on the menu:\n"
+            + summarize_items(items))
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive failed calls; after `reset_seconds` lets one trial call through."""
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = 'half-open'
+                return True  # The trial call
+            return self.state == 'closed'
+
+    def record(self, success):
+        with self._lock:
+            if success:
+                self.state = 'closed'
+                self._consecutive_failures = 0
+                return
+            self._consecutive_failures += 1
+            if self.state == 'half-open' or self._consecutive_failures >= self.failures:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+class _Attempt:
+    """One backend call, run in a daemon thread that posts (attempt, kind, value) events to a queue."""
+
+    def __init__(self, backend, prompt, timeout, events):
+        self.cancelled = False
+        self.finished = False
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, args=(backend, prompt, timeout, events),
+                                        name="llm-attempt", daemon=True)
+        self._thread.start()
+
+    def _run(self, backend, prompt, timeout, events):
+        try:
+            for chunk in backend.stream(prompt, timeout):
+                if self.cancelled:
+                    return
+                events.put((self, 'chunk', chunk))
+            events.put((self, 'done', None))
+        except Exception as e:
+            events.put((self, 'error', e))
+
+
+class ResilientLLM:
+    """A backend with deadlines, retries with jitter, optional hedging and a circuit breaker."""
+
+    def __init__(self, backend, timeout=LLM_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES,
+                 backoff_seconds=LLM_RETRY_BACKOFF_SECONDS, hedge=LLM_HEDGE_REQUESTS, breaker=None):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self.first_chunk_seconds = deque(maxlen=500)  # Of recent successful calls, for the hedge delay
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0, "failures": 0,
+                      "short_circuits": 0}
+
+    def hedge_delay(self):
+        """p95 of recent first-chunk latencies, or None while there are too few to tell."""
+        if not self.hedge or len(self.first_chunk_seconds) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self.first_chunk_seconds)
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def stream(self, prompt):
+        """Yields the answer's chunks; raises LLMBlocked, or LLMUnavailable when no answer could be had.
+
+        A failure after chunks were yielded is raised as LLMUnavailable too
+        (what was streamed can't be taken back, so it is not retried).
+        """
+        self.stats["calls"] += 1
+        if not self.breaker.allow():
+            self.stats["short_circuits"] += 1
+            raise LLMUnavailable(f"{self.backend.name} circuit is open after repeated failures")
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        events = queue.Queue()
+        attempts = [_Attempt(self.backend, prompt, self.timeout, events)]
+        hedge_delay = self.hedge_delay()
+        hedge_at = None if hedge_delay is None else started + hedge_delay
+        retries = 0
+        winner = None
+        try:
+            while True:
+                now = time.perf_counter()
+                wait = deadline - now if hedge_at is None else min(deadline, hedge_at) - now
+                try:
+                    attempt, kind, value = events.get(timeout=max(wait, 0.0))
+                except queue.Empty:
+                    if time.perf_counter() >= deadline:
+                        self.stats["timeouts"] += 1
+                        raise LLMUnavailable(f"{self.backend.name} did not answer within {self.timeout:g}s")
+                    # The first attempt is slower than p95: race a second one against it
+                    hedge_at = None
+                    self.stats["hedges"] += 1
+                    attempts.append(_Attempt(self.backend, prompt, deadline - time.perf_counter(), events))
+                    continue
+                if winner is not None and attempt is not winner:
+                    continue  # A losing hedge
+                if kind == 'chunk':
+                    if winner is None:
+                        winner = attempt
+                        hedge_at = None
+                        self.breaker.record(True)  # The backend is answering
+                        self.first_chunk_seconds.append(time.perf_counter() - attempt.started)
+                        if attempt is not attempts[0]:
+                            self.stats["hedge_wins"] += 1
+                        for other in attempts:
+                            other.cancelled = other is not attempt
+                    yield value
+                    continue
+                attempt.finished = True
+                if kind == 'done':
+                    return
+                if isinstance(value, LLMBlocked):
+                    self.breaker.record(True)  # The backend works; it refused this prompt
+                    raise value
+                print(f"Warning: {self.backend.name} call failed: {value}")
+                if winner is not None:
+                    raise LLMUnavailable(f"{self.backend.name} failed mid-answer: {value}")
+                if any(not other.finished for other in attempts):
+                    continue  # A hedge is still running
+                if retries >= self.max_retries:
+                    raise LLMUnavailable(f"{self.backend.name} failed after {retries + 1} attempts: {value}")
+                retries += 1
+                self.stats["retries"] += 1
+                # Full jitter: a random wait up to the exponential backoff, within the deadline
+                time.sleep(min(random.uniform(0, self.backoff_seconds * 2 ** (retries - 1)),
+                               max(0.0, deadline - time.perf_counter())))
+                attempts = [_Attempt(self.backend, prompt, deadline - time.perf_counter(), events)]
+                hedge_at = None if hedge_delay is None else time.perf_counter() + hedge_delay
+        except LLMUnavailable:
+            self.stats["failures"] += 1
+            self.breaker.record(False)
+            raise
+        finally:
+            for attempt in attempts:
+                attempt.cancelled = True
+
+    def report(self):
+        stats = ", ".join(f"{name}: {count}" for name, count in self.stats.items())
+        print(f"\n>>> LLM backend ({self.backend.name}) stats")
+        print(f"    {stats}, circuit: {self.breaker.state}")
@@ -0,0 +1,337 @@
+import re
+import time
+
+from src.chatbot.context_builder import merge_duplicates, summarize_items
+from src.utils.constants import ROUTER_LIST_LIMIT
+
+# Sends counting and price questions to the aggregate tables
+# (src/preprocessing/aggregates.py) instead of retrieval and the LLM, which
+# often gets the arithmetic wrong over 50 retrieved items:
+#
+#   price_range  "What's the price range for desserts at Sweet Truth?"
+#   rank         "Which restaurant has the most vegetarian options?"
+#   count        "How many beverages does Faasos in Mumbai have?", and of
+#                restaurants or outlets: "How many places in Pune serve desserts?"
+#   under_price  "Show me veg meals under 150" (a price filter on the
+#                metadata store, listed without the LLM)
+#
+# parse_query is a small intent/slot parser: regular expressions for the
+# intent cues, plus the restaurant, outlet location, category and price
+# slots (and, for counts, whether dishes, restaurants or outlets are
+# counted). A question is only routed when every word is accounted for by the
+# cue, a slot or filler ("show me", "options", "in their menu"), so anything
+# open-ended ("... under 150 with paneer") still goes to the LLM.
+
+# Category slot: phrase -> aggregates category
+CATEGORY_SYNONYMS = {
+    "vegetarian": 'type:veg', "veg": 'type:veg', "veggie": 'type:veg',
+    "non vegetarian": 'type:non-veg', "non veg": 'type:non-veg', "nonveg": 'type:non-veg',
+    "vegan": 'dietary_tags:vegan', "keto": 'dietary_tags:keto', "high protein": 'dietary_tags:high protein',
+    "low carb": 'dietary_tags:low-carb', "low fat": 'dietary_tags:low fat',
+    "dessert": 'dish_tags:dessert', "desserts": 'dish_tags:dessert', "sweets": 'dish_tags:dessert',
+    "beverage": 'dish_tags:beverage', "beverages": 'dish_tags:beverage', "drink": 'dish_tags:beverage',
+    "drinks": 'dish_tags:beverage',
+    "snack": 'dish_tags:snack', "snacks": 'dish_tags:snack',
+    "appetizer": 'dish_tags:appetizer', "appetizers": 'dish_tags:appetizer', "starter": 'dish_tags:appetizer',
+    "starters": 'dish_tags:appetizer',
+    "main course": 'dish_tags:main course', "main courses": 'dish_tags:main course', "mains": 'dish_tags:main course',
+    "savory": 'dish_tags:savory', "savoury": 'dish_tags:savory',
+    "comfort food": 'dish_tags:comfort food', "healthy": 'dish_tags:healthy',
+}
+# How the answers name a category
+CATEGORY_NAMES = {
+    'all': "dishes", 'type:veg': "vegetarian options", 'type:non-veg': "non-veg options",
+    'dish_tags:dessert': "desserts", 'dish_tags:beverage': "beverages", 'dish_tags:snack': "snacks",
+    'dish_tags:appetizer': "appetizers", 'dish_tags:main course': "main courses",
+    'dish_tags:comfort food': "comfort food dishes", 'dish_tags:healthy': "healthy dishes",
+    'dish_tags:savory': "savory dishes",
+}
+# Metadata store filter of each category, for under_price
+CATEGORY_FILTERS = {'type': 'dish_type', 'dish_tags': 'dish_tags', 'dietary_tags': 'dietary_tags'}
+FEWEST_ORDERS = ('fewest', 'least', 'smallest number of', 'lowest number of')
+AVERAGE_CUES = ('average', 'typical')
+LOCATION_ALIASES = {"bangalore": 'Bengaluru', "delhi": 'New Delhi', "bombay": 'Mumbai', "madras": 'Chennai'}
+
+INTENT_PATTERNS = (
+    ('rank', re.compile(r"\b(?:which|what) (?:restaurants?|places?|brands?|outlets?|one) (?:has|have|had|offers?|serves?"
+                        r"|gives?|got) (?:the )?(?P<order>most|largest number of|biggest number of|fewest|least"
+                        r"|smallest number of|lowest number of)\b")),
+    ('count', re.compile(r"\bhow many\b|\b(?:number|count) of\b")),
+    ('price_range', re.compile(r"\bprice range\b|\brange of prices?\b|\bprice ranges?\b|\bhow (?:expensive|pricey|cheap)"
+                               r"\b|\b(?P<statistic>average|typical|median|lowest|highest|min|max|minimum|maximum) prices?\b"
+                               r"|\b(?:cheapest|priciest|most expensive|least expensive)\b|\bprices? of\b")),
+    ('under_price', re.compile(r"\b(?:under|below|less than|cheaper than|within|up ?to|at most|not more than|max)"
+                               r" (?:rs\.? ?|inr ?|₹ ?)?(?P<price>\d+(?:\.\d+)?)(?: ?(?:rs|rupees|inr|₹))?\b")),
+)
+FILLER_WORDS = set("""
+a an the any some all of for at in on from with by to and or is are was were be do does did has have had
+what whats which who where how me i we you my our your their its it this that these those there here
+show list find give get tell see know want need looking please can could would should will just also
+restaurant restaurants place places brand brands outlet outlets branch branches menu menus option options
+item items dish dishes food foods meal meals thing things stuff something anything available offer offers offered
+serve serves served based data according s their one ones kind kinds type types cheap budget friendly affordable
+total overall
+""".split())
+# Count slot: the first of these after the cue says what a count question
+# counts ("how many vegan places", "number of desserts at the restaurants")
+COUNTED_NOUNS = {
+    "restaurant": 'restaurants', "restaurants": 'restaurants', "place": 'restaurants', "places": 'restaurants',
+    "brand": 'restaurants', "brands": 'restaurants',
+    "outlet": 'outlets', "outlets": 'outlets', "branch": 'outlets', "branches": 'outlets',
+}
+COUNTED_NOUNS.update({noun: 'dishes' for noun in """
+dish dishes item items option options meal meals food foods thing things dessert desserts sweets beverage beverages
+drink drinks snack snacks appetizer appetizers starter starters mains course courses
+""".split()})
+# A quoted name where a restaurant would be: "at 'Curry House'", "does 'Pizza Place' have"
+QUOTED_PATTERN = re.compile(r"""\b(?:at|from|does|by)\s+['"‘“]([^'"‘’“”]{2,60})['"’”](?!\w)""", re.IGNORECASE)
+WORD_PATTERN = re.compile(r"[\w₹']+")
+
+
+def _normalize(text):
+    return ' '.join(re.findall(r"[\w₹.']+", text.casefold().replace('-', ' ').replace('&', ' and '))).replace("'", '')
+
+
+def _phrase_pattern(phrases):
+    """One regex matching any of `phrases` as whole words, longest first (so 'lunchbox' loses to 'pure veg meals by lunchbox')."""
+    ordered = sorted({_normalize(phrase) for phrase in phrases}, key=len, reverse=True)
+    return re.compile(r'\b(' + '|'.join(re.escape(phrase) for phrase in ordered if phrase) + r')\b')
+
+
+class QueryRouter:
+    """Answers the questions parse_query recognizes from the aggregate tables (and the metadata store)."""
+
+    def __init__(self, tables, metadata=None):
+        self.tables = tables
+        self.metadata = metadata
+        self._restaurants = {_normalize(name): name for name in tables.restaurants}
+        self._locations = {_normalize(location): location for location in tables.locations}
+        self._locations.update({alias: location for alias, location in LOCATION_ALIASES.items()
+                                if location in tables.locations})
+        self._categories = {_normalize(phrase): category for phrase, category in CATEGORY_SYNONYMS.items()}
+        self._restaurant_pattern = _phrase_pattern(self._restaurants)
+        self._location_pattern = _phrase_pattern(self._locations)
+        self._category_pattern = _phrase_pattern(self._categories)
+        self.stats = {"queries": 0, "routed": 0, "seconds": 0.0}
+
+    def parse_query(self, query):
+        """{"intent", "restaurant", "location", "category", "price", "counted", ...} for an aggregate question, else None."""
+        slots = {"restaurant": None, "location": None, "category": 'all', "unknown_restaurant": None}
+        # A quoted name that is no restaurant or location we know is still the restaurant slot
+        for quoted in QUOTED_PATTERN.findall(query):
+            name = _normalize(quoted)
+            if name not in self._restaurants and name not in self._locations and name not in self._categories:
+                slots["unknown_restaurant"] = quoted.strip()
+                query = query.replace(quoted, ' ')
+        text = _normalize(query)
+        intent = None
+        for name, pattern in INTENT_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                intent = name
+                slots.update({key: value for key, value in match.groupdict().items() if value})
+                if intent == 'count':
+                    # Restaurant names can hold these nouns ("... Place"), so they go first
+                    after = self._restaurant_pattern.sub(' ', text[match.end():])
+                    counted = [COUNTED_NOUNS[word] for word in WORD_PATTERN.findall(after) if word in COUNTED_NOUNS]
+                    slots["counted"] = counted[0] if counted else 'dishes'
+                text = text[:match.start()] + ' ' + text[match.end():]
+                break
+        if intent is None:
+            return None
+        for slot, pattern, names in (("restaurant", self._restaurant_pattern, self._restaurants),
+                                     ("location", self._location_pattern, self._locations),
+                                     ("category", self._category_pattern, self._categories)):
+            matches = pattern.findall(text)
+            if len(set(matches)) > 1:
+                return None  # "desserts and beverages", two restaurants: a comparison for the LLM
+            if matches:
+                slots[slot] = names[matches[0]]
+                text = pattern.sub(' ', text)
+        if [word for word in WORD_PATTERN.findall(text) if word not in FILLER_WORDS]:
+            return None  # Something the tables can't answer ("price range of the chicken biryani")
+        if intent == 'rank' and (slots["restaurant"] or slots["unknown_restaurant"]):
+            return None
+        if intent == 'under_price' and slots["unknown_restaurant"] is None and self.metadata is None:
+            return None
+        slots["intent"] = intent
+        if "price" in slots:
+            slots["price"] = float(slots["price"])
+        return slots
+
+    def route(self, query):
+        """The answer to `query` when it is an aggregate question, else None (answer it with the LLM)."""
+        started = time.perf_counter()
+        self.stats["queries"] += 1
+        try:
+            parsed = self.parse_query(query)
+            answer = None if parsed is None else self.answer(parsed)
+        except Exception as e:  # A router bug must not cost the user an answer
+            print(f"Error routing {query!r}: {e}")
+            answer = None
+        if answer is not None:
+            self.stats["routed"] += 1
+            self.stats["seconds"] += time.perf_counter() - started
+            self.stats[parsed["intent"]] = self.stats.get(parsed["intent"], 0) + 1
+        return answer
+
+    def answer(self, parsed):
+        if parsed["unknown_restaurant"]:
+            return (f"Hmm, I couldn't find a restaurant called '{parsed['unknown_restaurant']}' on the menus I know. "
+                    f"I've got {_join(list(self.tables.restaurants))}.")
+        restaurant, location = parsed["restaurant"], parsed["location"]
+        if restaurant is not None and location is not None and location not in self.tables.restaurants[restaurant]:
+            return (f"{restaurant} doesn't have an outlet in {location} on my list; "
+                    f"it's in {_join(self.tables.restaurants[restaurant])}.")
+        return getattr(self, '_answer_' + parsed["intent"])(parsed)
+
+    def _answer_price_range(self, parsed):
+        category, restaurant, location = parsed["category"], parsed["restaurant"], parsed["location"]
+        if restaurant is None and location is not None:
+            return None  # City-wide tables aren't kept; the LLM can still answer from retrieved items
+        entry = self.tables.category(category, restaurant, location)
+        where = _where(restaurant, location)
+        name = _category_name(category)
+        price = entry["price"]
+        if not entry["count"]:
+            return f"Hmm, I didn't spot any {name}{where}."
+        if price is None:
+            return f"Couldn't find prices for {name}{where}!"
+        if price["min"] == price["max"]:
+            return f"The {name}{where} are all ₹{_amount(price['min'])}."
+        if parsed.get("statistic") in AVERAGE_CUES:
+            return (f"The average price of {name}{where} is ₹{price['mean']:.0f} across {entry['count']} "
+                    f"{_plural(entry['count'], name)}. They go from ₹{_amount(price['min'])} ({price['min_item']}) "
+                    f"to ₹{_amount(price['max'])} ({price['max_item']}), with a median of ₹{price['p50']:.0f}.")
+        return (f"{name[0].upper() + name[1:]}{where} go from ₹{_amount(price['min'])} ({price['min_item']}) "
+                f"to ₹{_amount(price['max'])} ({price['max_item']}). Most are between ₹{price['p25']:.0f} "
+                f"and ₹{price['p75']:.0f}, and the median is ₹{price['p50']:.0f} "
+                f"across {entry['count']} {_plural(entry['count'], name)}.")
+
+    def _answer_rank(self, parsed):
+        category, location = parsed["category"], parsed["location"]
+        fewest = parsed.get("order") in FEWEST_ORDERS
+        ranking = self.tables.rank(category, location)
+        if fewest:
+            ranking = sorted(ranking, key=lambda entry: (entry[1], entry[0]))
+        name = _category_name(category)
+        where = f" in {location}" if location else ''
+        if not any(count for _, count in ranking):
+            return f"Hmm, I didn't spot any {name} at the restaurants{where}."
+        best, count = ranking[0]
+        tied = [restaurant for restaurant, other_count in ranking[1:] if other_count == count]
+        if tied:
+            answer = (f"{_join([best] + tied)} are tied for the {'fewest' if fewest else 'most'} {name}{where}, "
+                      f"with {count} each")
+        else:
+            answer = f"{best} has the {'fewest' if fewest else 'most'} {name}{where}, with {count}"
+        others = [(restaurant, other_count) for restaurant, other_count in ranking[1:] if other_count != count][:3]
+        if others:
+            answer += ". Next up: " + ", ".join(f"{restaurant} ({other_count})" for restaurant, other_count in others)
+        return answer + "."
+
+    def _answer_count(self, parsed):
+        if parsed["counted"] != 'dishes':
+            return self._answer_restaurant_count(parsed)
+        category, restaurant, location = parsed["category"], parsed["restaurant"], parsed["location"]
+        name = _category_name(category)
+        if restaurant is None and location is not None:
+            ranking = self.tables.rank(category, location)
+            total = sum(count for _, count in ranking)
+            return (f"There are {total} {_plural(total, name)} across the {len(ranking)} restaurants in {location}: "
+                    + ", ".join(f"{restaurant} {count}" for restaurant, count in ranking) + ".")
+        count = self.tables.category(category, restaurant, location)["count"]
+        if restaurant is None:
+            return f"There are {count} {_plural(count, name)} across all {len(self.tables.restaurants)} restaurants."
+        return f"{restaurant}{f' in {location}' if location else ''} has {count} {_plural(count, name)}."
+
+    def _answer_restaurant_count(self, parsed):
+        category, restaurant, location = parsed["category"], parsed["restaurant"], parsed["location"]
+        if restaurant is not None:
+            if category != 'all':
+                return None  # Outlets of one brand by what they serve: left to the LLM
+            if location is not None:
+                return f"{restaurant} has an outlet in {location}."
+            locations = self.tables.restaurants[restaurant]
+            return f"{restaurant} has {len(locations)} {_plural(len(locations), 'outlets')}: {_join(locations)}."
+        outlets = [(name, outlet) for name, locations in self.tables.restaurants.items() for outlet in locations
+                   if location in (None, outlet)
+                   and (category == 'all' or self.tables.category(category, name, outlet)["count"])]
+        names = list(dict.fromkeys(name for name, _ in outlets))
+        serving = '' if category == 'all' else f" with {_category_name(category)}"
+        where = f" in {location}" if location else ''
+        if not names:
+            return f"Hmm, I didn't spot any restaurants{serving}{where}."
+        count = len(outlets) if parsed["counted"] == 'outlets' else len(names)
+        answer = f"There {'is' if count == 1 else 'are'} {count} {_plural(count, parsed['counted'])}{serving}{where}"
+        if parsed["counted"] == 'outlets':
+            answer += f", of {len(names)} {_plural(len(names), 'restaurants')}"
+        return f"{answer}: {_join(names)}."
+
+    def _answer_under_price(self, parsed):
+        category, restaurant, location, limit = (parsed["category"], parsed["restaurant"], parsed["location"],
+                                                 parsed["price"])
+        filters = {"price": (None, limit)}
+        if category != 'all':
+            field, value = category.split(':', 1)
+            filters[CATEGORY_FILTERS[field]] = value
+        if restaurant is not None:
+            filters["restaurant_name"] = restaurant
+        if location is not None:
+            filters["location"] = location
+        try:
+            rows = self.metadata.filter_mask(filters).nonzero()[0]
+        except ValueError as e:  # A metadata store written before the field had a filter index
+            print(f"Router: {e}")
+            return None
+        items = [{field: self.metadata.value(field, int(row)) for field in
+                  ('restaurant_name', 'item_name', 'location', 'price', 'popularity_score')} for row in rows]
+        entries = merge_duplicates(items)
+        name = _category_name(category)
+        where = _where(restaurant, location) or (f" in {location}" if location else '')
+        if not entries:
+            return f"Hmm, I didn't spot any {name}{where} for ₹{_amount(limit)} or less."
+        entries.sort(key=lambda entry: (-(entry.get('popularity_score') or 0), entry.get('item_name', '')))
+        restaurants = len({entry['restaurant_name'] for entry in entries})
+        intro = (f"Found {len(entries)} {_plural(len(entries), name)}{where} for ₹{_amount(limit)} or less"
+                 + ("" if restaurant else f" across {restaurants} restaurant{'s' if restaurants != 1 else ''}")
+                 + (". The most popular:" if len(entries) > ROUTER_LIST_LIMIT else ":"))
+        return f"{intro}\n{summarize_items(entries, ROUTER_LIST_LIMIT)}"
+
+    def report(self):
+        routed = self.stats["routed"]
+        mean_ms = self.stats["seconds"] / routed * 1000 if routed else 0.0
+        intents = ", ".join(f"{name} {count}" for name, count in self.stats.items()
+                            if name not in ("queries", "routed", "seconds"))
+        print("\n>>> Query router stats")
+        print(f"    {routed} of {self.stats['queries']} queries answered from the aggregate tables"
+              f"{f' ({intents})' if intents else ''}, {mean_ms:.2f} ms each on average")
+
+
+def _category_name(category):
+    return CATEGORY_NAMES.get(category) or category.split(':', 1)[-1] + " dishes"
+
+
+def _where(restaurant, location):
+    if restaurant is None:
+        return ''
+    return f" at {restaurant}" + (f" in {location}" if location else '')
+
+
+def _amount(value):
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def _plural(count, name):
+    """`name` (a plural phrase) in the singular for a count of 1."""
+    if count != 1:
+        return name
+    for plural, singular in (("dishes", "dish"), ("options", "option"), ("courses", "course"), ("s", "")):
+        if name.endswith(plural):
+            return name[:len(name) - len(plural)] + singular
+    return name
+
+
+def _join(names):
+    names = [str(name) for name in names]
+    return names[0] if len(names) == 1 else ", ".join(names[:-1]) + " and " + names[-1]
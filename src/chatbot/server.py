@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.chatbot.chatbot import ChatbotEngine
+from src.utils.constants import (
+    SERVER_BATCH_WINDOW_SECONDS,
+    SERVER_HOST,
+    SERVER_LLM_CONCURRENCY,
+    SERVER_MAX_BATCH,
+    SERVER_PORT,
+)
+
+# Async serving layer around ChatbotEngine, for many concurrent users:
+#
+#   python -m src.chatbot.server [--port 8080] [--llm-backend offline]
+#
+# ChatbotService is the async Python API. respond() queues the query for
+# the micro-batcher, which takes every query that arrives within
+# SERVER_BATCH_WINDOW_SECONDS of the first (up to SERVER_MAX_BATCH) and
+# runs them through ChatbotEngine.prepare_many in a worker thread: one
+# embedding batch, one FAISS search per distinct filters. The LLM call then
+# runs in a worker thread too, at most SERVER_LLM_CONCURRENCY at a time.
+#
+# The HTTP/JSON endpoint (stdlib asyncio, HTTP/1.1 keep-alive):
+#
+#   POST /respond        {"query": "...", "filters": {...}, "sort": "price_asc"}
+#                        -> {"answer": "...", "seconds": 0.42}
+#   POST /respond_batch  {"queries": ["...", {"query": "...", "filters": {...}}, ...]}
+#                        -> {"answers": ["...", ...], "seconds": 1.3}
+#   GET  /health         -> resource status of the engine
+#   GET  /stats          -> batching, LLM and cache counters
+
+
+class ChatbotService:
+    """Async front end of a ChatbotEngine: micro-batched retrieval, bounded LLM concurrency."""
+
+    def __init__(self, engine=None, batch_window=SERVER_BATCH_WINDOW_SECONDS, max_batch=SERVER_MAX_BATCH,
+                 llm_concurrency=SERVER_LLM_CONCURRENCY):
+        self.engine = engine or ChatbotEngine()
+        self.engine.verbose = False
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.llm_concurrency = llm_concurrency
+        self.stats = {"requests": 0, "batches": 0, "batched_queries": 0, "largest_batch": 0, "llm_calls": 0}
+        self._queue = None
+        self._llm_slots = None
+        self._batcher = None
+        # Retrieval batches run one at a time; LLM calls each hold a thread while they stream
+        self._retrieval_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chatbot-retrieval")
+        self._llm_executor = ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="chatbot-llm")
+
+    async def start(self):
+        """Starts the micro-batcher (respond() also does so on first use) and waits for the engine to load."""
+        if self._batcher is None:
+            self._queue = asyncio.Queue()
+            self._llm_slots = asyncio.Semaphore(self.llm_concurrency)
+            self._batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._retrieval_executor, self.engine.load)
+        return self
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        self._retrieval_executor.shutdown(wait=False)
+        self._llm_executor.shutdown(wait=False)
+
+    async def respond(self, query, filters=None, sort=None):
+        """The chatbot's answer to `query` (see ChatbotEngine.respond)."""
+        if self._batcher is None:
+            await self.start()
+        self.stats["requests"] += 1
+        prepared = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, filters, sort, prepared))
+        prepared = await prepared
+        if "answer" in prepared:
+            return prepared["answer"]
+        async with self._llm_slots:
+            self.stats["llm_calls"] += 1
+            return await asyncio.get_running_loop().run_in_executor(
+                self._llm_executor, lambda: "".join(self.engine.answer_stream(prepared)))
+
+    async def respond_many(self, requests):
+        """Answers for a list of queries, each a string or a {"query", "filters", "sort"} dict, concurrently."""
+        requests = [request if isinstance(request, dict) else {"query": request} for request in requests]
+        return await asyncio.gather(*(self.respond(request["query"], request.get("filters"), request.get("sort"))
+                                      for request in requests))
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self.stats["batches"] += 1
+            self.stats["batched_queries"] += len(batch)
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            queries, filters, sorts, futures = (list(column) for column in zip(*batch))
+            try:
+                prepared = await loop.run_in_executor(self._retrieval_executor, self.engine.prepare_many,
+                                                      queries, filters, sorts)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for future, entry in zip(futures, prepared):
+                if not future.done():  # The caller may have gone away
+                    future.set_result(entry)
+
+    def report(self):
+        stats = dict(self.stats)
+        stats["mean_batch"] = stats["batched_queries"] / stats["batches"] if stats["batches"] else 0.0
+        llm = self.engine.resource('llm') if self.engine.ready(('llm',)) else None
+        caches = self.engine.caches.stats()
+        return {"service": stats, "llm": None if llm is None else dict(llm.stats, circuit=llm.breaker.state),
+                "caches": caches}
+
+
+# --- HTTP/JSON endpoint ---
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+async def _read_request(reader):
+    """(method, path, headers, body) of the next request on the connection, or None at its end."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+    return method, path, headers, body
+
+
+def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                 .encode('latin-1') + body)
+
+
+def _request_error(request):
+    """Why a /respond request (or /respond_batch entry) is malformed, or None."""
+    if not isinstance(request, dict) or not isinstance(request.get("query"), str):
+        return "Expected {\"query\": \"...\"}"
+    if not isinstance(request.get("filters"), (dict, type(None))):
+        return "\"filters\" must be an object"
+    if not isinstance(request.get("sort"), (str, type(None))):
+        return "\"sort\" must be a string"
+    return None
+
+
+async def _route(service, method, path, body):
+    """(status, JSON payload) for one request."""
+    if path == '/health' and method == 'GET':
+        return 200, service.engine.status()
+    if path == '/stats' and method == 'GET':
+        return 200, service.report()
+    if path not in ('/respond', '/respond_batch'):
+        return 404, {"error": f"No route {path}"}
+    if method != 'POST':
+        return 405, {"error": f"{path} only accepts POST"}
+    try:
+        request = json.loads(body or b'{}')
+    except ValueError as e:
+        return 400, {"error": f"Invalid JSON: {e}"}
+    started = time.perf_counter()
+    if path == '/respond':
+        error = _request_error(request)
+        if error:
+            return 400, {"error": error}
+        answer = await service.respond(request["query"], request.get("filters"), request.get("sort"))
+        return 200, {"answer": answer, "seconds": time.perf_counter() - started}
+    if not isinstance(request, dict) or not isinstance(request.get("queries"), list):
+        return 400, {"error": "Expected {\"queries\": [...]}"}
+    for position, entry in enumerate(request["queries"]):
+        error = None if isinstance(entry, str) else _request_error(entry)
+        if error:
+            return 400, {"error": f"queries[{position}]: {error}"}
+    answers = await service.respond_many(request["queries"])
+    return 200, {"answers": answers, "seconds": time.perf_counter() - started}
+
+
+async def handle_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                _write_response(writer, 400, {"error": "Malformed HTTP request"}, keep_alive=False)
+                break
+            if request is None:
+                break
+            method, path, headers, body = request
+            keep_alive = headers.get('connection', '').lower() != 'close'
+            try:
+                status, payload = await _route(service, method, path.split('?', 1)[0], body)
+            except Exception as e:
+                print(f"Error handling {method} {path}: {e}")
+                status, payload = 500, {"error": str(e)}
+            _write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host=SERVER_HOST, port=SERVER_PORT):
+    """Starts the HTTP endpoint for `service`; returns the asyncio server (port 0 picks a free port)."""
+    await service.start()
+    return await asyncio.start_server(lambda reader, writer: handle_connection(service, reader, writer), host, port)
+
+
+async def main(args):
+    service = ChatbotService(ChatbotEngine(llm_backend=args.llm_backend), args.batch_window_ms / 1000,
+                             args.max_batch, args.llm_concurrency)
+    server = await serve(service, args.host, args.port)
+    print(f"Chatbot API listening on http://{args.host}:{server.sockets[0].getsockname()[1]} "
+          f"(POST /respond, POST /respond_batch, GET /health, GET /stats)")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the chatbot over HTTP/JSON with micro-batched retrieval.")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--llm-backend', choices=('gemini', 'offline'), default=None,
+                        help="Answer model (default: CHATBOT_LLM_BACKEND, else gemini).")
+    parser.add_argument('--batch-window-ms', type=float, default=SERVER_BATCH_WINDOW_SECONDS * 1000)
+    parser.add_argument('--max-batch', type=int, default=SERVER_MAX_BATCH)
+    parser.add_argument('--llm-concurrency', type=int, default=SERVER_LLM_CONCURRENCY)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,15 @@
-from src.chatbot.chatbot import chatbot_respond
+from src.chatbot.chatbot import get_engine
 
 if __name__ == "__main__":
+    # Load the index, metadata and models in the background while the prompt is shown
+    engine = get_engine().start(warm_up=True)
     print("Welcome to Restaurant Chatbot!")
     while True:
         query = input("\nAsk your question (or type 'exit' to quit): ")
         if query.lower() == 'exit':
             break
-        response = chatbot_respond(query)
-        print(f"\n🤖 Bot: {response}")
+        # Print the answer as it is generated instead of waiting for all of it
+        for i, chunk in enumerate(engine.respond_stream(query)):
+            print("\n🤖 Bot: " + chunk if i == 0 else chunk, end="", flush=True)
+        print()
+    engine.report()
@@ -0,0 +1,146 @@
+import json
+import os
+import re
+
+import numpy as np
+
+# Aggregate tables over the menu, written next to the index by
+# preprocess_and_index and read by the chatbot's query router
+# (src/chatbot/router.py), which answers counting and price questions from
+# them without retrieval or an LLM call.
+#
+# One table for the whole menu ("*"), one per restaurant (brand) and one per
+# outlet ("<restaurant>|<location>"). A table maps each category to the
+# number of distinct dishes in it and their price statistics:
+#
+#   all                    every dish
+#   type:veg, ...          by the item's veg / non-veg type
+#   dish_tags:dessert, ... by dish tag
+#   dietary_tags:vegan, ...
+#
+# A dish sold at several outlets (or listed twice on one page) is counted
+# once per restaurant; its distinct prices all go into the price statistics.
+# JSON, since the tables are small (one entry per category and outlet).
+
+AGGREGATE_FIELDS = (('type', 'dish_type'), ('dish_tags', 'dish_tags'), ('dietary_tags', 'dietary_tags'))
+PERCENTILES = (25, 50, 75)
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def dish_key(name):
+    """Names of the same dish up to case, punctuation and '&' / 'and' share a key."""
+    return ' '.join(WORD_PATTERN.findall(str(name).casefold().replace('&', ' and ')))
+
+
+def price_stats(priced_items):
+    """min/max (with the item names), percentiles and mean of [(price, item name)]."""
+    if not priced_items:
+        return None
+    priced_items = sorted(priced_items, key=lambda priced: priced[0])
+    prices = np.array([price for price, _ in priced_items], dtype=np.float64)
+    stats = {"min": priced_items[0][0], "min_item": priced_items[0][1],
+             "max": priced_items[-1][0], "max_item": priced_items[-1][1], "mean": round(float(prices.mean()), 2)}
+    for percentile in PERCENTILES:
+        stats[f"p{percentile}"] = round(float(np.percentile(prices, percentile)), 2)
+    return stats
+
+
+def _categories(row):
+    categories = ['all']
+    for name, field in AGGREGATE_FIELDS:
+        values = row.get(field)
+        values = values if isinstance(values, list) else [values]
+        categories.extend(f"{name}:{value}" for value in values if value)
+    return categories
+
+
+def _build_table(rows):
+    dishes = {}  # (restaurant, dish key) -> {"categories", "prices"}
+    for row in rows:
+        dish = dishes.setdefault((str(row.get('restaurant_name', '')).casefold(), dish_key(row.get('item_name', ''))),
+                                 {"categories": set(), "priced": set()})
+        dish["categories"].update(_categories(row))
+        if isinstance(row.get('price'), (int, float)):
+            dish["priced"].add((row['price'], row.get('item_name', 'Unknown')))
+    categories = {}
+    for dish in dishes.values():
+        for category in dish["categories"]:
+            entry = categories.setdefault(category, {"count": 0, "priced": set()})
+            entry["count"] += 1
+            entry["priced"].update(dish["priced"])
+    return {"items": len(dishes),
+            "categories": {category: {"count": entry["count"], "price": price_stats(list(entry["priced"]))}
+                           for category, entry in sorted(categories.items())}}
+
+
+def build_aggregates(metadata):
+    """The aggregate tables of `metadata` ({FAISS ID: item metadata}, as written to the metadata store)."""
+    by_restaurant, by_outlet = {}, {}
+    for row in metadata.values():
+        restaurant = row.get('restaurant_name', 'Unknown')
+        by_restaurant.setdefault(restaurant, []).append(row)
+        by_outlet.setdefault((restaurant, row.get('location', 'Unknown')), []).append(row)
+    tables = {"*": _build_table(list(metadata.values()))}
+    for restaurant, rows in sorted(by_restaurant.items()):
+        tables[restaurant] = _build_table(rows)
+    for (restaurant, location), rows in sorted(by_outlet.items()):
+        tables[f"{restaurant}|{location}"] = _build_table(rows)
+    return {"restaurants": {restaurant: sorted({location for name, location in by_outlet if name == restaurant})
+                            for restaurant in sorted(by_restaurant)},
+            "tables": tables}
+
+
+def write_aggregates(path, metadata):
+    """Writes the aggregate tables of `metadata` to `path`, replacing it atomically; returns the table count."""
+    aggregates = build_aggregates(metadata)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(aggregates, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return len(aggregates["tables"])
+
+
+class AggregateTables:
+    """Lookups over a file written by write_aggregates."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            aggregates = json.load(f)
+        self.restaurants = aggregates["restaurants"]  # name -> outlet locations
+        self.tables = aggregates["tables"]
+        self.locations = sorted({location for locations in self.restaurants.values() for location in locations})
+
+    @classmethod
+    def open(cls, path):
+        """Opens the tables at `path`, or returns None (with a message) when they are missing or unreadable."""
+        if not os.path.exists(path):
+            print(f"Error: Aggregate tables not found at {path}")
+            return None
+        try:
+            return cls(path)
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Error loading aggregate tables: {e}")
+            return None
+
+    def table(self, restaurant=None, location=None):
+        """The table of a restaurant, one of its outlets, or the whole menu (restaurant None); None if unknown."""
+        if restaurant is None:
+            return self.tables["*"]
+        return self.tables.get(restaurant if location is None else f"{restaurant}|{location}")
+
+    def category(self, category, restaurant=None, location=None):
+        """{"count", "price"} of `category` in a table; a count of 0 where the table has none of it."""
+        table = self.table(restaurant, location)
+        if table is None:
+            return None
+        return table["categories"].get(category, {"count": 0, "price": None})
+
+    def rank(self, category, location=None):
+        """[(restaurant, count)] of `category`, most first; per outlet in `location` when given."""
+        ranking = []
+        for restaurant, locations in self.restaurants.items():
+            if location is not None and location not in locations:
+                continue
+            ranking.append((restaurant, self.category(category, restaurant, location)["count"]))
+        return sorted(ranking, key=lambda entry: (-entry[1], entry[0]))
@@ -0,0 +1,182 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+# Persistent embedding cache keyed by (model name, normalized text hash).
+#
+# Each model gets its own directory holding three files:
+#   vectors.bin  row-major float32/float16 matrix, opened as a memory map
+#   keys.bin     the 20-byte SHA-1 of each row's normalized text, in row order
+#   meta.json    model name, dimension, dtype and committed row count
+# New rows are appended to vectors.bin and keys.bin before meta.json is
+# updated. Rows past the committed count (left by a crash mid-append) are
+# ignored on load and truncated away before the next append, so a crash only
+# loses the rows that were being added.
+#
+#   python -m src.preprocessing.embedding_cache stats
+#   python -m src.preprocessing.embedding_cache compact
+
+KEY_BYTES = 20
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+default_cache_dir = os.path.join(os.path.dirname(script_dir), 'output', 'embedding_cache')
+default_chunks_path = os.path.join(os.path.dirname(script_dir), 'output', 'processed_chunks.json')
+
+
+def normalize_text(text):
+    """Canonical form used for cache keys: NFC, whitespace collapsed and trimmed."""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def text_key(text):
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).digest()
+
+
+def model_dir_name(model_name):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '__', model_name)
+
+
+class EmbeddingCache:
+    """Maps texts to their embeddings for one model, backed by a memory-mapped matrix."""
+
+    def __init__(self, cache_dir, model_name, dtype='float32'):
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, model_dir_name(model_name))
+        self.vectors_path = os.path.join(self.dir, 'vectors.bin')
+        self.keys_path = os.path.join(self.dir, 'keys.bin')
+        self.meta_path = os.path.join(self.dir, 'meta.json')
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.rows = 0
+        self.row_for_key = {}
+        self._matrix = None
+        self.stats = {"requested": 0, "unique": 0, "hits": 0, "encoded": 0}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])  # The stored dtype wins over the requested one
+        row_bytes = self.dim * self.dtype.itemsize
+        # Only trust rows that are fully present in both files
+        self.rows = min(meta["rows"],
+                        os.path.getsize(self.vectors_path) // row_bytes,
+                        os.path.getsize(self.keys_path) // KEY_BYTES)
+        with open(self.keys_path, 'rb') as f:
+            keys = f.read(self.rows * KEY_BYTES)
+        self.row_for_key = {keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(self.rows)}
+
+    def matrix(self):
+        """The cached vectors as a read-only memory map (rows x dim)."""
+        if self._matrix is None and self.rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode='r', shape=(self.rows, self.dim))
+        return self._matrix
+
+    def encode(self, texts, encode_fn):
+        """Returns float32 embeddings for `texts`, calling encode_fn only for unseen texts.
+
+        Texts that normalize to the same string are encoded once. encode_fn takes
+        a list of texts and returns a (len(texts), dim) array.
+        """
+        keys = [text_key(text) for text in texts]
+        self.stats["requested"] += len(texts)
+        first_text_for_key = {}
+        for key, text in zip(keys, texts):
+            first_text_for_key.setdefault(key, text)
+        self.stats["unique"] += len(first_text_for_key)
+
+        missing = [key for key in first_text_for_key if key not in self.row_for_key]
+        self.stats["hits"] += len(first_text_for_key) - len(missing)
+        if missing:
+            vectors = np.asarray(encode_fn([first_text_for_key[key] for key in missing]), dtype=np.float32)
+            self.stats["encoded"] += len(missing)
+            self._append(missing, vectors)
+
+        matrix = self.matrix()
+        rows = np.fromiter((self.row_for_key[key] for key in keys), dtype=np.int64, count=len(keys))
+        return np.asarray(matrix[rows], dtype=np.float32)
+
+    def _append(self, keys, vectors):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        os.makedirs(self.dir, exist_ok=True)
+        # Drop uncommitted rows so the appended keys line up with their vectors
+        for path, committed_bytes in ((self.vectors_path, self.rows * self.dim * self.dtype.itemsize),
+                                      (self.keys_path, self.rows * KEY_BYTES)):
+            if os.path.exists(path) and os.path.getsize(path) > committed_bytes:
+                os.truncate(path, committed_bytes)
+        with open(self.vectors_path, 'ab') as f:
+            f.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+        with open(self.keys_path, 'ab') as f:
+            f.write(b''.join(keys))
+        for key in keys:
+            self.row_for_key[key] = self.rows
+            self.rows += 1
+        self._write_meta()
+        self._matrix = None  # Remap to include the new rows
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"model": self.model_name, "dim": self.dim, "dtype": self.dtype.name, "rows": self.rows}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def compact(self, live_texts):
+        """Drops every row whose text is not in `live_texts`. Returns the number removed."""
+        live_keys = {text_key(text) for text in live_texts}
+        keep = [(key, row) for key, row in self.row_for_key.items() if key in live_keys]
+        keep.sort(key=lambda pair: pair[1])
+        removed = self.rows - len(keep)
+        if not removed:
+            return 0
+        matrix = self.matrix()
+        kept_vectors = np.array(matrix[[row for _, row in keep]]) if keep else np.zeros((0, self.dim), self.dtype)
+        self._matrix = None
+        for path, payload in ((self.vectors_path, kept_vectors.tobytes()),
+                              (self.keys_path, b''.join(key for key, _ in keep))):
+            with open(path + '.tmp', 'wb') as f:
+                f.write(payload)
+            os.replace(path + '.tmp', path)
+        self.row_for_key = {key: new_row for new_row, (key, _) in enumerate(keep)}
+        self.rows = len(keep)
+        self._write_meta()
+        return removed
+
+    def size_bytes(self):
+        return sum(os.path.getsize(path) for path in (self.vectors_path, self.keys_path) if os.path.exists(path))
+
+    def report(self):
+        stats = self.stats
+        saved = stats["requested"] - stats["encoded"]
+        print("\n>>> Embedding cache stats")
+        print(f"    texts: {stats['requested']} requested, {stats['unique']} unique, "
+              f"{stats['hits']} cache hits, {stats['encoded']} encoded ({saved} encodes saved)")
+        print(f"    cache: {self.rows} vectors ({self.dtype.name}), {self.size_bytes() / 1024 / 1024:.1f} MB in {self.dir}")
+
+
+if __name__ == "__main__":
+    from src.preprocessing.preprocess_and_index import EMBEDDING_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Inspect or compact the embedding cache.")
+    parser.add_argument('command', choices=['stats', 'compact'])
+    parser.add_argument('--cache-dir', default=default_cache_dir)
+    parser.add_argument('--model', default=EMBEDDING_MODEL_NAME)
+    parser.add_argument('--chunks', default=default_chunks_path,
+                        help="processed_chunks.json listing the texts still in use (for compact).")
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(args.cache_dir, args.model)
+    if args.command == 'compact':
+        with open(args.chunks, 'r', encoding='utf-8') as f:
+            live_texts = json.load(f)
+        removed = cache.compact(live_texts)
+        print(f"Removed {removed} stale embeddings; {cache.rows} remain.")
+    cache.report()
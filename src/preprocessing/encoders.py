@@ -0,0 +1,222 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from src.utils.constants import (
+    ENCODER_BATCH_SIZE,
+    ENCODER_CHECK_K,
+    ENCODER_CHECK_SAMPLE,
+    ENCODER_MIN_TOPK_OVERLAP,
+    ENCODER_ONNX_FILE,
+)
+
+# Pluggable document encoders for indexing.
+#
+#   sentence-transformers  the reference fp32 model, in-process
+#   pool                   the same model in N worker processes, one per core group
+#   onnx-int8              a dynamically quantized ONNX export run by onnxruntime
+#
+# Every backend sorts texts by length before batching, so each batch pads to
+# similar lengths, and returns L2-normalized float32 vectors in input order.
+# `vector_space` names the space the vectors live in: fp32 backends share the
+# model name (their vectors are interchangeable), a quantized backend gets its
+# own so cached and indexed vectors are never mixed across the two.
+
+BACKENDS = ('sentence-transformers', 'pool', 'onnx-int8')
+
+
+def length_sorted_batches(texts, batch_size):
+    """Yields lists of input positions, longest texts first, batch_size at a time."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class Encoder:
+    """Base class: subclasses implement _encode_batch(list of texts) -> array."""
+
+    quantized = False
+
+    def __init__(self, model_name, batch_size=ENCODER_BATCH_SIZE, sort_by_length=True):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.sort_by_length = sort_by_length
+        self.docs = 0
+        self.seconds = 0.0
+
+    @property
+    def vector_space(self):
+        return self.model_name
+
+    def encode(self, texts):
+        texts = list(texts)
+        started = time.perf_counter()
+        if self.sort_by_length:
+            batches = list(length_sorted_batches(texts, self.batch_size))
+        else:
+            batches = [list(range(start, min(start + self.batch_size, len(texts))))
+                       for start in range(0, len(texts), self.batch_size)]
+        vectors = None
+        for positions, batch_vectors in zip(batches, self._encode_batches([[texts[i] for i in positions]
+                                                                          for positions in batches])):
+            batch_vectors = normalize_rows(batch_vectors)
+            if vectors is None:
+                vectors = np.empty((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[positions] = batch_vectors
+        self.docs += len(texts)
+        self.seconds += time.perf_counter() - started
+        return vectors if vectors is not None else np.zeros((0, 0), dtype=np.float32)
+
+    def _encode_batches(self, batches):
+        for batch in batches:
+            yield self._encode_batch(batch)
+
+    def _encode_batch(self, texts):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def report(self):
+        rate = self.docs / self.seconds if self.seconds else 0.0
+        print(f"    encoder {self.name}: {self.docs} docs in {self.seconds:.2f}s ({rate:.1f} docs/sec)")
+
+
+class SentenceTransformerEncoder(Encoder):
+    name = 'sentence-transformers'
+
+    def __init__(self, model_name, batch_size=ENCODER_BATCH_SIZE, sort_by_length=True, device='cpu'):
+        super().__init__(model_name, batch_size, sort_by_length)
+        self.device = device
+        self._model = None
+
+    def model(self):
+        if self._model is None:  # Loaded on first use, so a fully cached run never loads it
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    def _encode_batch(self, texts):
+        return self.model().encode(texts, batch_size=len(texts), convert_to_numpy=True, normalize_embeddings=True)
+
+
+_worker_model = None
+
+
+def _init_pool_worker(model_name, threads):
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)  # Workers split the cores instead of all fighting over every one
+    _worker_model = SentenceTransformer(model_name, device='cpu')
+
+
+def _encode_in_worker(texts):
+    return _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True, normalize_embeddings=True)
+
+
+class PoolEncoder(Encoder):
+    """Spreads length-sorted batches over worker processes that each hold a copy of the model."""
+
+    name = 'pool'
+
+    def __init__(self, model_name, batch_size=ENCODER_BATCH_SIZE, sort_by_length=True, workers=None):
+        super().__init__(model_name, batch_size, sort_by_length)
+        cores = os.cpu_count() or 1
+        self.workers = workers or max(1, cores // 2)
+        self.threads_per_worker = max(1, cores // self.workers)
+        self._pool = None
+
+    def _encode_batches(self, batches):
+        if self._pool is None:
+            # spawn: torch does not survive fork once its thread pool has started
+            self._pool = multiprocessing.get_context('spawn').Pool(
+                self.workers, initializer=_init_pool_worker, initargs=(self.model_name, self.threads_per_worker))
+        return self._pool.imap(_encode_in_worker, batches)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class OnnxInt8Encoder(Encoder):
+    """Runs a dynamically int8-quantized ONNX export of the model through onnxruntime.
+
+    Needs `optimum[onnxruntime]`. The all-MiniLM-L6-v2 repository ships quantized
+    exports (onnx/model_qint8_avx512.onnx, onnx/model_quint8_avx2.onnx,
+    onnx/model_qint8_arm64.onnx); pick the one matching the CPU.
+    """
+
+    name = 'onnx-int8'
+    quantized = True
+
+    def __init__(self, model_name, batch_size=ENCODER_BATCH_SIZE, sort_by_length=True, onnx_file=ENCODER_ONNX_FILE):
+        super().__init__(model_name, batch_size, sort_by_length)
+        self.onnx_file = onnx_file
+        self._model = None
+
+    @property
+    def vector_space(self):
+        return f"{self.model_name}@{self.onnx_file}"
+
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name, device='cpu', backend='onnx',
+                                              model_kwargs={"file_name": self.onnx_file})
+        return self._model
+
+    def _encode_batch(self, texts):
+        return self.model().encode(texts, batch_size=len(texts), convert_to_numpy=True, normalize_embeddings=True)
+
+
+def make_encoder(backend, model_name, batch_size=ENCODER_BATCH_SIZE, sort_by_length=True, workers=None,
+                 onnx_file=ENCODER_ONNX_FILE):
+    if backend == 'sentence-transformers':
+        return SentenceTransformerEncoder(model_name, batch_size, sort_by_length)
+    if backend == 'pool':
+        return PoolEncoder(model_name, batch_size, sort_by_length, workers)
+    if backend == 'onnx-int8':
+        return OnnxInt8Encoder(model_name, batch_size, sort_by_length, onnx_file)
+    raise ValueError(f"Unknown encoder backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def topk_overlap(reference, candidate, k=ENCODER_CHECK_K):
+    """Mean fraction of each document's k nearest neighbours that two embeddings of the same texts agree on."""
+    k = min(k, len(reference) - 1)
+    if k < 1:
+        return 1.0
+    overlaps = []
+    for vectors in (reference, candidate):
+        scores = vectors @ vectors.T
+        np.fill_diagonal(scores, -np.inf)  # A document is not its own neighbour
+        overlaps.append(np.argpartition(-scores, k, axis=1)[:, :k])
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(*overlaps)]))
+
+
+def check_encoder(encoder, texts, reference=None, k=ENCODER_CHECK_K, min_overlap=ENCODER_MIN_TOPK_OVERLAP,
+                  sample=ENCODER_CHECK_SAMPLE):
+    """Compares `encoder` with the fp32 model on a sample of texts.
+
+    Returns (passed, overlap). Used before indexing with a quantized backend,
+    so an export that drifts from the reference model is caught up front.
+    """
+    if len(texts) > sample:
+        step = len(texts) / sample
+        texts = [texts[int(i * step)] for i in range(sample)]
+    reference = reference or SentenceTransformerEncoder(encoder.model_name, encoder.batch_size)
+    overlap = topk_overlap(reference.encode(texts), encoder.encode(texts), k)
+    passed = overlap >= min_overlap
+    print(f"Top-{k} overlap of {encoder.name} with fp32 on {len(texts)} texts: {overlap:.3f} "
+          f"({'ok' if passed else 'below'} threshold {min_overlap})")
+    return passed, overlap
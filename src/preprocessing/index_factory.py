@@ -0,0 +1,345 @@
+import json
+import math
+import os
+
+import faiss
+import numpy as np
+
+from src.utils.constants import (
+    FILTER_EXACT_MAX_IDS,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    HNSW_M,
+    INDEX_FLAT_MAX_VECTORS,
+    INDEX_HNSW_MAX_VECTORS,
+    INDEX_IVF_FLAT_MAX_VECTORS,
+    INDEX_RETRAIN_GROWTH,
+    INDEX_TRAIN_SAMPLE,
+    RESCORE_SHORTLIST_FACTOR,
+)
+
+# Builds the FAISS index used for retrieval.
+#
+#   flat      exact inner-product scan; best up to tens of thousands of items
+#   hnsw      graph search, fast and accurate but keeps full vectors plus the graph
+#   ivf-flat  inverted lists over k-means cells; probes `nprobe` of `nlist` cells
+#   ivf-pq    IVF with product-quantized codes, for catalogs too large for float vectors
+#
+# Items keep their stable FAISS IDs: IVF indexes store them in their
+# inverted lists, and the other types are wrapped in an ID map. (An ID map
+# around an IVF index would leave the lists holding positions, which go
+# stale once remove_ids compacts the map.)
+# The chosen type and its parameters are saved next to the index file
+# (faiss_index.params.json) and re-applied by the chatbot at load time.
+#
+# Vectors in flat/hnsw/ivf-flat indexes can additionally be compressed:
+#
+#   int8    scalar-quantized to one byte per dimension (4x smaller)
+#   binary  the sign bit of each dimension, searched by Hamming distance (32x smaller)
+#
+# Lossy indexes (any compression, and ivf-pq) search a shortlist of
+# RESCORE_SHORTLIST_FACTOR * k candidates and rescore it exactly against the
+# float vectors in a memory-mapped side file (see vector_store.py).
+#
+# Searches can be restricted to a subset of vectors (metadata filters). The
+# subset is passed to FAISS as an ID selector (a bitmap over positions in
+# the wrapped index, or the matching FAISS IDs for IVF indexes), so exactly
+# k matching results come back without over-fetching. Because
+# fewer vectors qualify, nprobe and efSearch are scaled up by the inverse of
+# the filter's selectivity. Small subsets are instead scored exactly, with
+# vectors read from the side file or, for float flat/HNSW indexes, the index.
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivf-flat', 'ivf-pq')
+COMPRESSIONS = ('none', 'int8', 'binary')
+
+
+def choose_index_type(num_vectors):
+    if num_vectors <= INDEX_FLAT_MAX_VECTORS:
+        return 'flat'
+    if num_vectors <= INDEX_HNSW_MAX_VECTORS:
+        return 'hnsw'
+    if num_vectors <= INDEX_IVF_FLAT_MAX_VECTORS:
+        return 'ivf-flat'
+    return 'ivf-pq'
+
+
+def default_params(index_type, num_vectors, dim, compression='none'):
+    """Parameters for `index_type` sized to the corpus ('auto' picks the type too)."""
+    if index_type == 'auto':
+        index_type = choose_index_type(num_vectors)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected auto or one of {', '.join(INDEX_TYPES)}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}; expected one of {', '.join(COMPRESSIONS)}")
+    if index_type == 'ivf-pq' and compression != 'none':
+        raise ValueError("ivf-pq vectors are already product-quantized; use compression 'none'")
+    params = {"type": index_type, "dim": dim, "trained_on": num_vectors, "compression": compression}
+    if compression != 'none' or index_type == 'ivf-pq':
+        params["rescore_factor"] = RESCORE_SHORTLIST_FACTOR
+    if index_type == 'hnsw':
+        params.update(hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH)
+    elif index_type.startswith('ivf'):
+        # ~4*sqrt(N) cells, but at least 39 training points per cell as k-means wants
+        nlist = max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+        params.update(nlist=nlist, nprobe=min(nlist, max(8, nlist // 32)), ids_in_lists=True)
+        if index_type == 'ivf-pq':
+            # ~8 dimensions per sub-quantizer, 256 centroids each when there is data to train them
+            pq_m = max(m for m in range(1, max(1, dim // 8) + 1) if dim % m == 0)
+            pq_nbits = max(4, min(8, int(math.log2(max(16, num_vectors // 39)))))
+            params.update(pq_m=pq_m, pq_nbits=pq_nbits)
+    return params
+
+
+def is_binary(params):
+    return params.get("compression") == 'binary'
+
+
+def needs_rescore(params):
+    return bool(params.get("rescore_factor"))
+
+
+def to_index_input(params, vectors):
+    """Vectors in the form the index takes: float32, or packed sign bits for binary indexes."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if is_binary(params):
+        return np.packbits(vectors > 0, axis=1)
+    return vectors
+
+
+def _float_index(params):
+    dim, index_type = params["dim"], params["type"]
+    int8 = params.get("compression") == 'int8'
+    if index_type == 'flat':
+        if int8:
+            return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexFlatIP(dim)
+    if index_type == 'hnsw':
+        if int8:
+            inner = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.IndexHNSWFlat(dim, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = params["ef_construction"]
+        return inner
+    quantizer = faiss.IndexFlatIP(dim)
+    if index_type == 'ivf-flat' and int8:
+        return faiss.IndexIVFScalarQuantizer(quantizer, dim, params["nlist"], faiss.ScalarQuantizer.QT_8bit,
+                                             faiss.METRIC_INNER_PRODUCT)
+    if index_type == 'ivf-flat':
+        return faiss.IndexIVFFlat(quantizer, dim, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+    return faiss.IndexIVFPQ(quantizer, dim, params["nlist"], params["pq_m"], params["pq_nbits"],
+                            faiss.METRIC_INNER_PRODUCT)
+
+
+def _binary_index(params):
+    dim, index_type = params["dim"], params["type"]
+    if index_type == 'flat':
+        return faiss.IndexBinaryFlat(dim)
+    if index_type == 'hnsw':
+        return faiss.IndexBinaryHNSW(dim, params["hnsw_m"])
+    return faiss.IndexBinaryIVF(faiss.IndexBinaryFlat(dim), dim, params["nlist"])
+
+
+def new_index(params, training_vectors=None):
+    """Creates an empty index that takes FAISS IDs, training it on `training_vectors` when the type needs it."""
+    inner = _binary_index(params) if is_binary(params) else _float_index(params)
+    if not inner.is_trained:
+        sample = training_vectors
+        if len(sample) > INDEX_TRAIN_SAMPLE:
+            rows = np.random.default_rng(0).choice(len(sample), INDEX_TRAIN_SAMPLE, replace=False)
+            sample = sample[np.sort(rows)]
+        inner.train(to_index_input(params, sample))
+    if params["type"].startswith('ivf'):
+        index = inner
+    else:
+        index = faiss.IndexBinaryIDMap2(inner) if is_binary(params) else faiss.IndexIDMap2(inner)
+    apply_search_params(index, params)
+    return index
+
+
+def add_vectors(index, params, vectors, ids):
+    index.add_with_ids(to_index_input(params, vectors), np.asarray(ids, dtype=np.int64))
+
+
+def is_id_mapped(index):
+    return hasattr(index, 'id_map')
+
+
+def internal_ids(index):
+    """The FAISS ID of each vector: by position in the wrapped index, or inverted list by list for IVF."""
+    if is_id_mapped(index):
+        return faiss.vector_to_array(index.id_map)
+    invlists = index.invlists
+    lists = [faiss.rev_swig_ptr(invlists.get_ids(cell), invlists.list_size(cell)).copy()
+             for cell in range(index.nlist) if invlists.list_size(cell)]
+    return np.concatenate(lists) if lists else np.zeros(0, dtype=np.int64)
+
+
+def _selector_params(params, selector, selectivity, shortlist, ntotal):
+    """Search parameters restricting a search of the wrapped index to `selector`."""
+    index_type = params.get("type", 'flat')
+    if index_type == 'hnsw':
+        ef_search = params.get("ef_search") or HNSW_EF_SEARCH
+        ef_search = max(shortlist, min(ntotal, math.ceil(ef_search / selectivity)))
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=int(ef_search))
+    if index_type.startswith('ivf'):
+        nprobe = min(params["nlist"], math.ceil(params["nprobe"] / selectivity))
+        return faiss.SearchParametersIVF(sel=selector, nprobe=int(nprobe))
+    return faiss.SearchParameters(sel=selector)
+
+
+def _exact_search(vectors, queries, k, candidate_ids):
+    """Exact inner-product top-k over `candidate_ids`, whose float vectors are the rows of `vectors`."""
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    for row, query in enumerate(np.asarray(queries, dtype=np.float32)):
+        exact = vectors @ query
+        top = np.argsort(-exact, kind='stable')[:k]
+        scores[row, :len(top)] = exact[top]
+        ids[row, :len(top)] = candidate_ids[top]
+    return scores, ids
+
+
+def search(index, params, queries, k, vector_store=None, allowed=None):
+    """Searches the index; returns (scores, ids) like Index.search, padded with -1.
+
+    For lossy indexes with a vector_store, a shortlist of rescore_factor * k
+    candidates is rescored by exact inner product with the stored float
+    vectors. Without one, binary scores are Hamming distances mapped to [-1, 1].
+
+    `allowed` optionally restricts results: a boolean mask over the vectors
+    in internal_ids(index) order.
+    """
+    rescore = vector_store is not None and needs_rescore(params)
+    shortlist = k * params["rescore_factor"] if rescore else k
+    if allowed is None:
+        D, I = index.search(to_index_input(params, queries), shortlist)
+    else:
+        count = int(np.count_nonzero(allowed))
+        if count == 0:
+            return np.full((len(queries), k), -np.inf, dtype=np.float32), np.full((len(queries), k), -1, dtype=np.int64)
+        # Binary IVF indexes do not take an ID selector
+        selectable = not (is_binary(params) and params["type"].startswith('ivf'))
+        if vector_store is not None and (count <= FILTER_EXACT_MAX_IDS or not selectable):
+            candidate_ids = np.sort(internal_ids(index)[allowed])
+            return _exact_search(vector_store.get(candidate_ids), queries, k, candidate_ids)
+        if count <= FILTER_EXACT_MAX_IDS and not is_binary(params) and params.get("type", 'flat') in ('flat', 'hnsw'):
+            positions = np.flatnonzero(allowed)
+            return _exact_search(index.index.reconstruct_batch(positions), queries, k, internal_ids(index)[positions])
+        if not selectable:
+            raise ValueError("Filtered search of a binary IVF index needs its full-precision side file")
+        if is_id_mapped(index):
+            bitmap = np.packbits(allowed, bitorder='little')  # Referenced by the selector until the search returns
+            selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+            searched = index.index
+        else:
+            # IVF lists hold the FAISS IDs themselves, which is what the selector sees
+            selector = faiss.IDSelectorBatch(internal_ids(index)[allowed])
+            searched = index
+        search_params = _selector_params(params, selector, count / len(allowed), shortlist, len(allowed))
+        D, I = searched.search(to_index_input(params, queries), shortlist, params=search_params)
+        if is_id_mapped(index):
+            I = np.where(I >= 0, internal_ids(index)[np.maximum(I, 0)], -1)
+    if not rescore:
+        if is_binary(params):
+            D = 1.0 - 2.0 * D.astype(np.float32) / params["dim"]
+        return D, I
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    for row, query in enumerate(np.asarray(queries, dtype=np.float32)):
+        candidates = I[row][I[row] != -1]
+        if not len(candidates):
+            continue
+        exact = vector_store.get(candidates) @ query
+        top = np.argsort(-exact, kind='stable')[:k]
+        scores[row, :len(top)] = exact[top]
+        ids[row, :len(top)] = candidates[top]
+    return scores, ids
+
+
+def needs_rebuild(saved_params, index_type, num_vectors, compression='none'):
+    """True when an existing index cannot simply be updated in place to an `index_type` index."""
+    if saved_params is None:
+        # Indexes from before this file existed are uncompressed flat
+        return index_type != 'flat' or compression != 'none'
+    if saved_params.get("type") != index_type or saved_params.get("compression", 'none') != compression:
+        return True
+    # IVF indexes saved inside an ID map mis-number their vectors after a removal
+    if index_type.startswith('ivf') and not saved_params.get("ids_in_lists"):
+        return True
+    # Trained cells stop fitting a corpus that has grown well past the training set
+    return index_type.startswith('ivf') and num_vectors > saved_params["trained_on"] * INDEX_RETRAIN_GROWTH
+
+
+def remove_ids(index, params, ids):
+    """Removes `ids` from the index and returns it.
+
+    HNSW graphs do not support deletion, so that type is rebuilt from the
+    remaining vectors, read back out of the index itself. IVF indexes remove
+    by the FAISS IDs stored in their lists.
+    """
+    if not len(ids):
+        return index
+    if params["type"] != 'hnsw':
+        index.remove_ids(np.asarray(ids, dtype=np.int64))
+        return index
+    doomed = set(int(vector_id) for vector_id in ids)
+    keep = np.array([vector_id for vector_id in faiss.vector_to_array(index.id_map) if vector_id not in doomed],
+                    dtype=np.int64)
+    if is_binary(params):
+        rebuilt = new_index(params)
+    else:
+        # An emptied copy keeps the trained scalar quantizer of int8 graphs
+        rebuilt = faiss.clone_index(index)
+        rebuilt.reset()
+    if len(keep):
+        # Stored codes go back in as they are (packed bits for binary indexes)
+        rebuilt.add_with_ids(np.vstack([index.reconstruct(int(vector_id)) for vector_id in keep]), keep)
+    return rebuilt
+
+
+def apply_search_params(index, params):
+    """Sets the query-time knobs (nprobe / efSearch) stored in `params` on a loaded index."""
+    if not params:
+        return
+    space = faiss.ParameterSpace()
+    if params.get("nprobe"):
+        space.set_index_parameter(index, 'nprobe', params["nprobe"])
+    if params.get("ef_search"):
+        space.set_index_parameter(index, 'efSearch', params["ef_search"])
+
+
+def params_path(idx_path):
+    return os.path.splitext(idx_path)[0] + '.params.json'
+
+
+def save_index_params(idx_path, params):
+    with open(params_path(idx_path), 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=4)
+
+
+def load_index_params(idx_path):
+    path = params_path(idx_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_index(index, idx_path, params):
+    if is_binary(params):
+        faiss.write_index_binary(index, idx_path)
+    else:
+        faiss.write_index(index, idx_path)
+
+
+def read_index(idx_path, params):
+    if params and is_binary(params):
+        return faiss.read_index_binary(idx_path)
+    return faiss.read_index(idx_path)
+
+
+def index_size_bytes(index):
+    """Serialized size of the index: a close proxy for its resident memory."""
+    if isinstance(index, faiss.IndexBinary):
+        return faiss.serialize_index_binary(index).nbytes
+    return faiss.serialize_index(index).nbytes
@@ -0,0 +1,471 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from src.preprocessing.section_file import SectionFile, write_section_file
+
+# Compact, memory-mapped knowledge base: what preprocess_data writes to
+# knowledge_base.json, in one file of the section_file.py layout, so a stage
+# can read one restaurant or one menu item without parsing the rest.
+#
+# Restaurants and menu items are two column groups. Items are stored
+# restaurant by restaurant; the `menus` index holds uint32 offsets
+# (restaurants + 1) into the item rows. The kind of each column follows the
+# values written to it:
+#
+#   int     int64
+#   float   float64; an int8 `is_int` section marks the ints of a column that
+#           mixes both (prices), so every value decodes to what was written
+#   bool    int8
+#   text    uint32 codes into the string table
+#   labels  uint32 offsets (rows + 1) into codes into the tag vocabulary,
+#           uint16 while it has fewer than 65536 tags
+#   json    uint32 codes into the string table of each value's JSON (a
+#           column whose values have no common type)
+#
+# The string table is uint64 offsets into a UTF-8 blob holding each distinct
+# string once: an item's identical short and long descriptions, and a
+# brand's menu repeated at every outlet, are stored once. A column with a
+# row lacking the field also gets an int8 `present` section; decoded rows
+# leave that field out, as the JSON entry did. Items are found by item_id
+# (16 hex digits) through the IDs' integer values, sorted next to their rows.
+
+MAGIC = b'NUGGETKB1\n'
+NULL_CODE = 0xFFFFFFFF
+RESTAURANT_BLOCK = 256  # Restaurants decoded together when reading them all
+
+
+class _Missing:
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()  # What a column reader returns for a row without the field
+
+
+def _id_value(item_id):
+    """The integer an item_id is sorted and looked up by, or None for an ID that is not hex."""
+    try:
+        return int(item_id, 16) if len(item_id) <= 16 else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _column_kind(values):
+    """The column kind of a field's values (None where a row lacks it)."""
+    present = [value for value in values if value is not None]
+    if all(isinstance(value, bool) for value in present):
+        return 'bool'
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return 'int'
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return 'float'
+    if all(isinstance(value, str) for value in present):
+        return 'text'
+    if all(isinstance(value, list) and all(isinstance(label, str) for label in value) for value in present):
+        return 'labels'
+    return 'json'
+
+
+def _encode_column(kind, values, strings, tags):
+    """Returns {section name: array} for one column, adding its strings to `strings` and `tags`."""
+    sections = {}
+    if any(value is None for value in values):
+        sections["present"] = np.array([value is not None for value in values], dtype=np.int8)
+    if kind == 'bool':
+        sections["values"] = np.array([bool(value) for value in values], dtype=np.int8)
+    elif kind == 'int':
+        sections["values"] = np.array([value or 0 for value in values], dtype=np.int64)
+    elif kind == 'float':
+        sections["values"] = np.array([0.0 if value is None else value for value in values], dtype=np.float64)
+        is_int = np.array([isinstance(value, int) for value in values], dtype=np.int8)
+        if is_int.any():
+            sections["is_int"] = is_int
+    elif kind in ('text', 'json'):
+        if kind == 'json':
+            values = [None if value is None else json.dumps(value, ensure_ascii=False) for value in values]
+        sections["codes"] = np.array([NULL_CODE if value is None else strings.setdefault(value, len(strings))
+                                      for value in values], dtype=np.uint32)
+    elif kind == 'labels':
+        lists = [value or [] for value in values]
+        offsets = np.zeros(len(lists) + 1, dtype=np.uint32)
+        np.cumsum([len(value) for value in lists], out=offsets[1:])
+        sections["offsets"] = offsets
+        sections["codes"] = [tags.setdefault(label, len(tags)) for value in lists for label in value]
+    else:
+        raise ValueError(f"Unknown column kind {kind!r}")
+    return sections
+
+
+def _encode_strings(vocab):
+    encoded = [value.encode('utf-8') for value in vocab]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {"offsets": offsets, "blob": np.frombuffer(b''.join(encoded), dtype=np.uint8)}
+
+
+def _intern(value, seen):
+    """`value` with its strings replaced by an equal one already held, so repeated text is held once."""
+    if isinstance(value, str):
+        return seen.setdefault(value, value)
+    if isinstance(value, list):
+        return [seen.setdefault(label, label) if isinstance(label, str) else label for label in value]
+    return value
+
+
+def _add_row(columns, order, rows, row, seen, skip=()):
+    """Appends `row` to `columns` ({field: values} of `rows` rows so far), None where it lacks a field."""
+    order.update(dict.fromkeys(row))
+    for field, value in row.items():
+        if field in skip:
+            continue
+        column = columns.get(field)
+        if column is None:
+            column = columns[field] = [None] * rows
+        column.append(_intern(value, seen))
+    for column in columns.values():
+        if len(column) == rows:
+            column.append(None)
+    return rows + 1
+
+
+def write_kb_store(path, knowledge_base):
+    """Writes `knowledge_base` (restaurant entries as written by preprocess_data, or any iterable of them)
+    to `path`, replacing it atomically. Returns (restaurants, items).
+
+    Entries are consumed one at a time into columns, so a stream (iter_json_array)
+    is never held whole as dicts.
+    """
+    columns = {"restaurants": {}, "items": {}}
+    order = {"restaurants": {}, "items": {}}
+    menu_offsets = [0]
+    seen = {}
+    restaurants, items = 0, 0
+    for restaurant in knowledge_base:
+        restaurants = _add_row(columns["restaurants"], order["restaurants"], restaurants, restaurant, seen,
+                               skip=('menu',))
+        for item in restaurant.get("menu", []):
+            items = _add_row(columns["items"], order["items"], items, item, seen)
+        menu_offsets.append(items)
+    del seen
+    item_id_column = []
+    strings, tags = {}, {}
+    groups = {}
+    for group, group_columns in columns.items():
+        groups[group] = {}
+        for field in list(group_columns):
+            values = group_columns.pop(field)
+            if group == 'items' and field == 'item_id':
+                item_id_column = values
+            kind = _column_kind(values)
+            groups[group][field] = {"kind": kind, "sections": _encode_column(kind, values, strings, tags)}
+    # Tag codes are narrowed once the vocabulary size is known
+    code_dtype = np.uint16 if len(tags) < 0x10000 else np.uint32
+    for group_columns in groups.values():
+        for column in group_columns.values():
+            if column["kind"] == 'labels':
+                column["sections"]["codes"] = np.array(column["sections"]["codes"], dtype=code_dtype)
+
+    item_ids = sorted((_id_value(item_id), row) for row, item_id in enumerate(item_id_column)
+                      if _id_value(item_id) is not None)
+    groups["index"] = {
+        "menus": {"sections": {"offsets": np.array(menu_offsets, dtype=np.uint32)}},
+        "item_ids": {"sections": {"ids": np.array([value for value, _ in item_ids], dtype=np.uint64),
+                                  "rows": np.array([row for _, row in item_ids], dtype=np.uint32)}},
+    }
+    groups["strings"] = {"strings": {"sections": _encode_strings(strings)},
+                         "tags": {"sections": _encode_strings(tags)}}
+    write_section_file(path, MAGIC, {"restaurant_count": restaurants, "item_count": items,
+                                     "field_order": {group: list(fields) for group, fields in order.items()}},
+                       groups)
+    return restaurants, items
+
+
+class KnowledgeBaseStore(SectionFile):
+    """Read-only view of a knowledge base file: restaurant(i), item(row) and item_by_id() decode only what they return."""
+
+    MAGIC = MAGIC
+    KIND = 'knowledge base store'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.restaurant_count = self._header["restaurant_count"]
+        self.item_count = self._header["item_count"]
+        self._field_order = self._header["field_order"]
+        self._readers = {}
+        self._menu_offsets = self._view("index", 'menus', 'offsets')
+
+    @classmethod
+    def open(cls, path):
+        """Opens the store at `path`, or returns None (with a message) when it is missing or unreadable."""
+        if not os.path.exists(path):
+            print(f"Error: Knowledge base store not found at {path}")
+            return None
+        try:
+            return cls(path)
+        except (ValueError, OSError) as e:
+            print(f"Error loading knowledge base store: {e}")
+            return None
+
+    def _decoder(self, table):
+        """Returns a function decoding a code of the string table or tag vocabulary (`table`)."""
+        decoder = self._readers.get(('strings', table))
+        if decoder is not None:
+            return decoder
+        offsets = self._view("strings", table, 'offsets')
+        blob_start = self._data_start + self._header["strings"][table]["sections"]["blob"][0]
+        mapping = self._mmap
+
+        def decode(code):
+            return mapping[blob_start + offsets[code]:blob_start + offsets[code + 1]].decode('utf-8')
+        if table == 'tags':
+            # Few distinct tags, each on many items: keep them decoded
+            decoded = {}
+
+            def decode(code, decode_tag=decode):
+                tag = decoded.get(code)
+                if tag is None:
+                    tag = decoded[code] = decode_tag(code)
+                return tag
+        self._readers[('strings', table)] = decode
+        return decode
+
+    def _make_reader(self, group, field):
+        """Returns a function decoding one cell of a column from a row number (MISSING where the row lacks it)."""
+        column = self._header[group][field]
+        kind, sections = column["kind"], column["sections"]
+        if kind == 'labels':
+            offsets = self._view(group, field, 'offsets')
+            codes = self._view(group, field, 'codes')
+            decode = self._decoder('tags')
+
+            def read(row):
+                return [decode(code) for code in codes[offsets[row]:offsets[row + 1]]]
+        elif kind in ('text', 'json'):
+            codes = self._view(group, field, 'codes')
+            decode = self._decoder('strings')
+            if kind == 'text':
+                def read(row):
+                    return decode(codes[row])
+            else:
+                def read(row):
+                    return json.loads(decode(codes[row]))
+        elif kind in ('int', 'bool'):
+            values = self._view(group, field, 'values')
+            convert = bool if kind == 'bool' else int
+
+            def read(row):
+                return convert(values[row])
+        elif kind == 'float':
+            values = self._view(group, field, 'values')
+            if "is_int" in sections:
+                is_int = self._view(group, field, 'is_int')
+
+                def read(row):
+                    return int(values[row]) if is_int[row] else values[row]
+            else:
+                def read(row):
+                    return values[row]
+        else:
+            raise ValueError(f"Unknown column kind {kind!r}")
+        if "present" not in sections:
+            return read
+        present = self._view(group, field, 'present')
+        return lambda row: read(row) if present[row] else MISSING
+
+    def _row(self, group, row):
+        readers = self._readers.get(group)
+        if readers is None:
+            columns = self._header[group]
+            readers = self._readers[group] = (
+                [(field, self._make_reader(group, field)) for field in self._field_order[group] if field in columns],
+                any("present" in column["sections"] for column in columns.values()))
+        readers, optional = readers
+        if not optional:
+            return {field: read(row) for field, read in readers}
+        entry = {}
+        for field, read in readers:
+            value = read(row)
+            if value is not MISSING:
+                entry[field] = value
+        return entry
+
+    def _column_values(self, group, field, start, stop, decoded):
+        """The decoded cells of rows start..stop of a column, in bulk (MISSING where a row lacks the field).
+
+        `decoded` maps string codes to the strings already decoded, shared by
+        the columns of a block: a description is often both the short and the
+        long one, and a brand's outlets list the same menu.
+        """
+        column = self._header[group][field]
+        kind, sections = column["kind"], column["sections"]
+        if kind == 'labels':
+            offsets = self._section(group, field, 'offsets')[start:stop + 1].tolist()
+            decode = self._decoder('tags')
+            labels = [decode(code) for code in self._section(group, field, 'codes')[offsets[0]:offsets[-1]].tolist()]
+            base = offsets[0]
+            values = [labels[offsets[i] - base:offsets[i + 1] - base] for i in range(stop - start)]
+        elif kind in ('text', 'json'):
+            decode = self._decoder('strings')
+            values = []
+            for code in self._section(group, field, 'codes')[start:stop].tolist():
+                value = decoded.get(code)
+                if value is None and code != NULL_CODE:
+                    value = decoded[code] = decode(code)
+                values.append(value)
+            if kind == 'json':
+                values = [None if value is None else json.loads(value) for value in values]
+        elif kind == 'bool':
+            values = (self._section(group, field, 'values')[start:stop] != 0).tolist()
+        elif kind == 'int':
+            values = self._section(group, field, 'values')[start:stop].tolist()
+        elif kind == 'float':
+            values = self._section(group, field, 'values')[start:stop].tolist()
+            if "is_int" in sections:
+                is_int = self._section(group, field, 'is_int')[start:stop].tolist()
+                values = [int(value) if integral else value for value, integral in zip(values, is_int)]
+        else:
+            raise ValueError(f"Unknown column kind {kind!r}")
+        if "present" in sections:
+            present = self._section(group, field, 'present')[start:stop].tolist()
+            values = [value if flag else MISSING for value, flag in zip(values, present)]
+        return values
+
+    def _rows(self, group, start, stop):
+        """Rows start..stop of a group, decoded column by column: far faster than _row() one row at a time."""
+        columns = self._header[group]
+        fields = [field for field in self._field_order[group] if field in columns]
+        decoded = {}
+        rows = [dict(zip(fields, values))
+                for values in zip(*(self._column_values(group, field, start, stop, decoded) for field in fields))]
+        if not fields:
+            rows = [{} for _ in range(stop - start)]
+        for field in fields:
+            if "present" in columns[field]["sections"]:
+                for row in rows:
+                    if row[field] is MISSING:
+                        del row[field]
+        return rows
+
+    def _with_menu(self, entry, items):
+        """A restaurant's entry with its menu put back where the entry had it."""
+        ordered = {}
+        for field in self._field_order["restaurants"]:
+            if field == 'menu':
+                ordered["menu"] = items
+            elif field in entry:
+                ordered[field] = entry[field]
+        return ordered
+
+    def menu_rows(self, index):
+        """The item rows of restaurant `index`."""
+        return range(self._menu_offsets[index], self._menu_offsets[index + 1])
+
+    def item(self, row):
+        """The menu item in `row`, as in the knowledge base."""
+        if not 0 <= row < self.item_count:
+            raise IndexError(row)
+        return self._row("items", row)
+
+    def item_row(self, item_id):
+        """The row of the item with `item_id`, or None."""
+        value = _id_value(item_id)
+        if value is None:
+            return None
+        ids = self._section("index", 'item_ids', 'ids')
+        position = int(np.searchsorted(ids, np.uint64(value)))
+        if position < len(ids) and ids[position] == value:
+            return int(self._section("index", 'item_ids', 'rows')[position])
+        return None
+
+    def item_by_id(self, item_id):
+        """The menu item with `item_id`, or None."""
+        row = self.item_row(item_id)
+        return None if row is None else self.item(row)
+
+    def restaurant(self, index, menu=True):
+        """Restaurant `index` as its knowledge-base entry; menu=False leaves the items out."""
+        if not 0 <= index < self.restaurant_count:
+            raise IndexError(index)
+        entry = self._row("restaurants", index)
+        if not menu:
+            return entry
+        return self._with_menu(entry, [self._row("items", row) for row in self.menu_rows(index)])
+
+    def find_restaurants(self, restaurant_name, location=None):
+        """Indexes of the restaurants with this name (and location), compared case-insensitively."""
+        names = self._make_reader("restaurants", 'restaurant_name')
+        locations = self._make_reader("restaurants", 'location') if location is not None else None
+        matches = []
+        for index in range(self.restaurant_count):
+            name = names(index)
+            if name is MISSING or name.casefold() != restaurant_name.casefold():
+                continue
+            if locations is not None:
+                value = locations(index)
+                if value is MISSING or value.casefold() != location.casefold():
+                    continue
+            matches.append(index)
+        return matches
+
+    def export_json(self, path):
+        """Writes the knowledge base as JSON in preprocess_data's layout, one restaurant per line."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("[")
+            for index in range(self.restaurant_count):
+                f.write(("\n" if index == 0 else ",\n")
+                        + json.dumps(self.restaurant(index), ensure_ascii=False, separators=(',', ':')))
+            f.write("\n]\n")
+        os.replace(tmp_path, path)
+
+    def restaurants(self, menu=True, block=RESTAURANT_BLOCK):
+        """Yields every restaurant entry in order; menu=False leaves the items out.
+
+        Entries are decoded column by column, `block` restaurants at a time.
+        """
+        for start in range(0, self.restaurant_count, block):
+            stop = min(start + block, self.restaurant_count)
+            entries = self._rows("restaurants", start, stop)
+            if not menu:
+                yield from entries
+                continue
+            first_row = self._menu_offsets[start]
+            items = self._rows("items", first_row, self._menu_offsets[stop])
+            for index, entry in enumerate(entries, start):
+                yield self._with_menu(entry, items[self._menu_offsets[index] - first_row:
+                                                   self._menu_offsets[index + 1] - first_row])
+
+    def __iter__(self):
+        return self.restaurants()
+
+    def __len__(self):
+        return self.restaurant_count
+
+    def close(self):
+        self._readers.clear()
+        self._menu_offsets = None
+        super().close()
+
+
+if __name__ == "__main__":
+    from src.utils.jsonl import iter_json_array
+
+    parser = argparse.ArgumentParser(description="Convert between knowledge_base.json and the knowledge base store.")
+    parser.add_argument('command', choices=('build', 'export'),
+                        help="build: JSON -> store; export: store -> JSON, for debugging.")
+    parser.add_argument('source')
+    parser.add_argument('destination')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        restaurants, items = write_kb_store(args.destination, iter_json_array(args.source))
+        print(f"Wrote {restaurants} restaurants and {items} items to {args.destination}")
+    else:
+        store = KnowledgeBaseStore.open(args.source)
+        if store is None:
+            raise SystemExit(1)
+        store.export_json(args.destination)
+        print(f"Exported {len(store)} restaurants to {args.destination}")
@@ -0,0 +1,136 @@
+import os
+import re
+import unicodedata
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from src.preprocessing.section_file import SectionFile, write_section_file
+from src.utils.constants import BM25_B, BM25_K1, RRF_K
+
+# BM25 inverted index over the item documents embedded for FAISS
+# (preprocess_and_index.item_document), so exact dish and brand names
+# ("Chimichurri Paneer", "Behrouz") are found even when the dense model
+# ranks them low. Results are merged with FAISS results by reciprocal rank
+# fusion (rrf_fuse).
+#
+# One file in the section_file.py layout. The header lists the vocabulary
+# (a term's ID is its position). Array-backed postings, per term:
+#
+#   offsets  uint64 (terms + 1) into rows/tfs
+#   rows     uint32 ascending document rows holding the term
+#   tfs      uint16 the term's frequency in each of them
+#
+# plus the token count of each document and the FAISS ID of each row
+# (ascending, the same order as the metadata store).
+
+MAGIC = b'NUGGETBM25\n'
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Case-folded word tokens with accents removed, so 'Sautéed' matches 'sauteed'."""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return TOKEN_PATTERN.findall(''.join(char for char in text if not unicodedata.combining(char)))
+
+
+def write_lexical_index(path, documents):
+    """Writes a BM25 index of `documents` ({FAISS ID: text}) at `path`, replacing it atomically."""
+    ids = np.array(sorted(documents), dtype=np.int64)
+    vocab = {}
+    term_ids, rows, tfs = array('I'), array('I'), array('H')
+    lengths = np.zeros(len(ids), dtype=np.uint32)
+    for row, vector_id in enumerate(ids):
+        tokens = tokenize(documents[int(vector_id)])
+        lengths[row] = len(tokens)
+        for term, count in Counter(tokens).items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            rows.append(row)
+            tfs.append(min(count, 0xFFFF))
+    term_ids = np.frombuffer(term_ids, dtype=np.uint32)
+    order = np.argsort(term_ids, kind='stable')  # Groups postings by term, rows stay ascending
+    offsets = np.zeros(len(vocab) + 1, dtype=np.uint64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+    postings = {"offsets": offsets, "rows": np.frombuffer(rows, dtype=np.uint32)[order],
+                "tfs": np.frombuffer(tfs, dtype=np.uint16)[order]}
+    header = {"documents": len(ids), "avg_length": float(lengths.mean()) if len(ids) else 0.0, "terms": list(vocab)}
+    write_section_file(path, MAGIC, header, {"index": {"ids": {"sections": {"values": ids}},
+                                                       "lengths": {"sections": {"values": lengths}},
+                                                       "postings": {"sections": postings}}})
+    return len(vocab)
+
+
+class LexicalIndex(SectionFile):
+    """BM25 search over a file written by write_lexical_index."""
+
+    MAGIC = MAGIC
+    KIND = 'BM25 index'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.documents = self._header["documents"]
+        self.avg_length = self._header["avg_length"]
+        self.ids = self._section("index", 'ids', 'values')
+        self._term_ids = None
+        self._length_norms = None
+
+    @classmethod
+    def open(cls, path):
+        """Opens the index at `path`, or returns None (with a message) when it is missing or unreadable."""
+        if not os.path.exists(path):
+            print(f"Error: BM25 index not found at {path}")
+            return None
+        try:
+            return cls(path)
+        except (ValueError, OSError) as e:
+            print(f"Error loading BM25 index: {e}")
+            return None
+
+    def term_id(self, term):
+        if self._term_ids is None:
+            self._term_ids = {term: term_id for term_id, term in enumerate(self._header["terms"])}
+        return self._term_ids.get(term)
+
+    def scores(self, query, allowed=None):
+        """BM25 score of every document row for `query`; rows outside the `allowed` mask score 0."""
+        if self._length_norms is None:
+            # k1 * (1 - b + b * length / average length), the per-document part of the BM25 denominator
+            lengths = self._section("index", 'lengths', 'values').astype(np.float32)
+            self._length_norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(self.avg_length, 1e-9))
+        offsets = self._section("index", 'postings', 'offsets')
+        rows = self._section("index", 'postings', 'rows')
+        tfs = self._section("index", 'postings', 'tfs')
+        scores = np.zeros(self.documents, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_id(term)
+            if term_id is None:
+                continue
+            start, end = int(offsets[term_id]), int(offsets[term_id + 1])
+            term_rows, term_tfs = rows[start:end], tfs[start:end].astype(np.float32)
+            idf = np.log(1 + (self.documents - (end - start) + 0.5) / ((end - start) + 0.5))
+            scores[term_rows] += idf * term_tfs * (BM25_K1 + 1) / (term_tfs + self._length_norms[term_rows])
+        if allowed is not None:
+            scores[~allowed] = 0
+        return scores
+
+    def search(self, query, k, allowed=None):
+        """(scores, FAISS IDs) of the top k documents matching any query term, best first."""
+        scores = self.scores(query, allowed)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return scores[candidates], self.ids[candidates]
+
+
+def rrf_fuse(rankings, limit, rrf_k=RRF_K):
+    """Reciprocal rank fusion: [(ID, fused score)] best first, from ranked lists of IDs.
+
+    Each list adds 1 / (rrf_k + rank) to the IDs it holds (rank from 1).
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, vector_id in enumerate(ranking, start=1):
+            fused[vector_id] = fused.get(vector_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda entry: -entry[1])[:limit]
@@ -0,0 +1,330 @@
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+from src.preprocessing.section_file import SectionFile, write_section_file
+
+# Columnar, memory-mapped store for the per-item metadata returned by retrieval.
+#
+# One file in the section_file.py layout. The header lists every column's
+# kind and where its sections live. Opening the store only parses the header,
+# so nothing is read until a row is looked at.
+#
+#   number  float64, NaN for None (integral values come back as int)
+#   bool    int8: 1, 0, or -1 for None
+#   text    uint32 codes into a string dictionary; 0xFFFFFFFF for None
+#   labels  uint32 offsets (rows + 1) into uint32 codes into a string dictionary,
+#           for lists of tags
+#
+# A string dictionary is uint64 offsets into a UTF-8 blob holding each
+# distinct string once. Columns can share one (short and long descriptions
+# are often identical), and a brand's outlets repeat the same menu text.
+#
+# Rows are ordered by FAISS ID, which is stored as the `ids` column.
+#
+# The store also holds filter indexes over the fields in FILTER_FIELDS, so
+# retrieval can be restricted to matching rows inside the FAISS search:
+#
+#   keyword  a posting list (ascending row numbers) per distinct value; list
+#            fields index each label. Matches are combined as a row bitmap.
+#   range    the rows holding a value, sorted by it, next to the sorted values;
+#            a range is two binary searches.
+
+MAGIC = b'NUGGETMETA1\n'
+NULL_CODE = 0xFFFFFFFF
+CACHED_DICTIONARY_SIZE = 4096  # Dictionaries up to this size keep their decoded strings
+
+# Column kind and string dictionary of the fields written by preprocess_and_index.item_metadata
+METADATA_SCHEMA = {
+    "item_id": ('text', 'item_ids'),
+    "restaurant_name": ('text', 'restaurants'),
+    "item_name": ('text', 'item_names'),
+    "location": ('text', 'locations'),
+    "price": ('number', None),
+    "tags": ('labels', 'tags'),
+    "spice_level": ('number', None),
+    "gluten_free": ('bool', None),
+    "dish_type": ('text', 'tags'),
+    "short_description": ('text', 'descriptions'),
+    "long_description": ('text', 'descriptions'),
+    "preparation_tags": ('labels', 'tags'),
+    "dish_tags": ('labels', 'tags'),
+    "cuisine_tags": ('labels', 'tags'),
+    "popularity_score": ('number', None),
+    "affordability_tag": ('text', 'tags'),
+    "feedback_tags": ('labels', 'tags'),
+    "dietary_tags": ('labels', 'tags'),
+    "contact": ('text', 'restaurants'),
+    "available_time": ('text', 'restaurants'),
+}
+
+# Filter index kind of each filterable field
+FILTER_FIELDS = {
+    "dish_type": 'keyword',
+    "gluten_free": 'keyword',
+    "dish_tags": 'keyword',
+    "dietary_tags": 'keyword',
+    "affordability_tag": 'keyword',
+    "location": 'keyword',
+    "restaurant_name": 'keyword',
+    "price": 'range',
+}
+
+
+def _encode_column(kind, values, vocab):
+    """Returns {section name: array} for one column, adding its strings to `vocab`."""
+    if kind == 'number':
+        return {"values": np.array([np.nan if value is None else value for value in values], dtype=np.float64)}
+    if kind == 'bool':
+        return {"values": np.array([-1 if value is None else int(bool(value)) for value in values], dtype=np.int8)}
+    if kind == 'text':
+        return {"codes": np.array([NULL_CODE if value is None else vocab.setdefault(value, len(vocab))
+                                   for value in values], dtype=np.uint32)}
+    if kind == 'labels':
+        lists = [value or [] for value in values]
+        offsets = np.zeros(len(lists) + 1, dtype=np.uint32)
+        np.cumsum([len(value) for value in lists], out=offsets[1:])
+        codes = np.array([vocab.setdefault(label, len(vocab)) for value in lists for label in value], dtype=np.uint32)
+        return {"offsets": offsets, "codes": codes}
+    raise ValueError(f"Unknown column kind {kind!r}")
+
+
+def _encode_dictionary(vocab):
+    encoded = [value.encode('utf-8') for value in vocab]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {"offsets": offsets, "blob": np.frombuffer(b''.join(encoded), dtype=np.uint8)}
+
+
+def _encode_filter(kind, values):
+    """Returns ({section name: array}, distinct values) for the filter index of one field."""
+    if kind == 'range':
+        rows = np.array([row for row, value in enumerate(values) if value is not None], dtype=np.uint32)
+        keys = np.array([values[row] for row in rows], dtype=np.float64)
+        order = np.argsort(keys, kind='stable')
+        return {"rows": rows[order], "values": keys[order]}, None
+    if kind != 'keyword':
+        raise ValueError(f"Unknown filter kind {kind!r}")
+    postings = {}
+    for row, value in enumerate(values):
+        for label in (value if isinstance(value, list) else [value]):
+            if label is not None:
+                postings.setdefault(label, []).append(row)
+    distinct = list(postings)
+    offsets = np.zeros(len(distinct) + 1, dtype=np.uint32)
+    np.cumsum([len(postings[value]) for value in distinct], out=offsets[1:])
+    rows = np.array([row for value in distinct for row in postings[value]], dtype=np.uint32)
+    return {"offsets": offsets, "rows": rows}, distinct
+
+
+def write_metadata_store(path, metadata, schema=METADATA_SCHEMA, filter_fields=FILTER_FIELDS):
+    """Writes `metadata` ({FAISS ID: dict}) as a columnar store at `path`, replacing it atomically."""
+    ids = np.array(sorted(metadata), dtype=np.int64)
+    rows = [metadata[int(vector_id)] for vector_id in ids]
+    vocabs = {}
+    columns = {"ids": {"kind": 'ids', "sections": {"values": ids}}}
+    for name, (kind, dictionary) in schema.items():
+        vocab = vocabs.setdefault(dictionary, {}) if dictionary else None
+        columns[name] = {"kind": kind, "dictionary": dictionary,
+                         "sections": _encode_column(kind, [row.get(name) for row in rows], vocab)}
+    dictionaries = {name: {"sections": _encode_dictionary(vocab)} for name, vocab in vocabs.items()}
+    filters = {}
+    for name, kind in filter_fields.items():
+        sections, distinct = _encode_filter(kind, [row.get(name) for row in rows])
+        filters[name] = {"kind": kind, "values": distinct, "sections": sections}
+
+    write_section_file(path, MAGIC, {"rows": len(ids)},
+                       {"columns": columns, "dictionaries": dictionaries, "filters": filters})
+    return len(ids)
+
+
+class MetadataStore(SectionFile):
+    """Read-only view of a metadata store file; look rows up by FAISS ID with get()."""
+
+    MAGIC = MAGIC
+    KIND = 'metadata store'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.rows = self._header["rows"]
+        self.columns = [name for name in self._header["columns"] if name != 'ids']
+        self._kinds = {name: column["kind"] for name, column in self._header["columns"].items()}
+        self._decoded = {}
+        self._readers = {}
+        self.ids = self._section("columns", 'ids', 'values')
+
+    @classmethod
+    def open(cls, path):
+        """Opens the store at `path`, or returns None (with a message) when it is missing or unreadable."""
+        if not os.path.exists(path):
+            print(f"Error: Metadata store not found at {path}")
+            return None
+        try:
+            return cls(path)
+        except (ValueError, OSError) as e:
+            print(f"Error loading metadata store: {e}")
+            return None
+
+    def _string(self, dictionary, code):
+        cache = self._decoded.get(dictionary)
+        if cache is not None and code in cache:
+            return cache[code]
+        offsets = self._view("dictionaries", dictionary, 'offsets')
+        blob_start = self._data_start + self._header["dictionaries"][dictionary]["sections"]["blob"][0]
+        value = self._mmap[blob_start + offsets[code]:blob_start + offsets[code + 1]].decode('utf-8')
+        if cache is None and len(offsets) - 1 <= CACHED_DICTIONARY_SIZE:
+            cache = self._decoded[dictionary] = {}
+        if cache is not None:
+            cache[code] = value
+        return value
+
+    def _make_reader(self, column):
+        """Returns a function decoding one cell of `column` from a row number."""
+        kind = self._kinds[column]
+        if kind == 'number':
+            values = self._view("columns", column, 'values')
+
+            def read(row):
+                value = values[row]
+                if value != value:  # NaN
+                    return None
+                return int(value) if value.is_integer() else value
+        elif kind == 'bool':
+            values = self._view("columns", column, 'values')
+
+            def read(row):
+                value = values[row]
+                return None if value < 0 else bool(value)
+        elif kind == 'text':
+            codes = self._view("columns", column, 'codes')
+            dictionary = self._header["columns"][column]["dictionary"]
+
+            def read(row):
+                code = codes[row]
+                return None if code == NULL_CODE else self._string(dictionary, code)
+        elif kind == 'labels':
+            offsets = self._view("columns", column, 'offsets')
+            codes = self._view("columns", column, 'codes')
+            dictionary = self._header["columns"][column]["dictionary"]
+
+            def read(row):
+                return [self._string(dictionary, code) for code in codes[offsets[row]:offsets[row + 1]]]
+        else:
+            raise ValueError(f"Unknown column kind {kind!r}")
+        return read
+
+    def value(self, column, row):
+        """Decodes one cell."""
+        reader = self._readers.get(column)
+        if reader is None:
+            reader = self._readers[column] = self._make_reader(column)
+        return reader(row)
+
+    def row_for_id(self, vector_id):
+        row = int(np.searchsorted(self.ids, vector_id))
+        if row < self.rows and self.ids[row] == vector_id:
+            return row
+        return None
+
+    def get(self, vector_id, **extra):
+        """A MetadataRow for a FAISS ID, or None. `extra` fields (e.g. a score) are layered on top."""
+        row = self.row_for_id(int(vector_id))
+        return None if row is None else MetadataRow(self, row, extra)
+
+    # --- Filters ---
+
+    def filter_fields(self):
+        """The fields this store has a filter index for (stores written before filters have none)."""
+        return list(self._header.get("filters", {}))
+
+    def _keyword_codes(self, field, wanted):
+        """Positions in the field's value list matching `wanted` (strings match case-insensitively)."""
+        values = self._header["filters"][field]["values"]
+        wanted = [value.casefold() if isinstance(value, str) else value for value in wanted]
+        return [code for code, value in enumerate(values)
+                if (value.casefold() if isinstance(value, str) else value) in wanted]
+
+    def rows_for_ids(self, vector_ids):
+        """Row number of each FAISS ID in `vector_ids`, or -1 where the store has no such row."""
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, vector_ids), max(self.rows - 1, 0))
+        found = self.ids[rows] == vector_ids if self.rows else np.zeros(len(vector_ids), dtype=bool)
+        return np.where(found, rows, -1)
+
+    def filter_mask(self, filters, rows=None):
+        """Boolean mask over rows of the rows matching every filter.
+
+        `filters` maps a field to a value or a list of accepted values (keyword
+        fields), or to a (low, high) pair with None for an open end (range
+        fields, bounds inclusive). With `rows` (from rows_for_ids), the mask is
+        returned in that order instead, False where a row is -1.
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        for field, wanted in filters.items():
+            entry = self._header.get("filters", {}).get(field)
+            if entry is None:
+                raise ValueError(f"No filter index for {field!r}; rerun preprocess_and_index "
+                                 f"(filterable: {', '.join(self.filter_fields()) or 'none'})")
+            postings = self._section("filters", field, 'rows')
+            if entry["kind"] == 'range':
+                low, high = wanted
+                values = self._section("filters", field, 'values')
+                start = 0 if low is None else np.searchsorted(values, low, side='left')
+                end = len(values) if high is None else np.searchsorted(values, high, side='right')
+                matched = postings[start:end]
+            else:
+                offsets = self._section("filters", field, 'offsets')
+                wanted = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+                matched = [postings[offsets[code]:offsets[code + 1]] for code in self._keyword_codes(field, wanted)]
+                matched = np.concatenate(matched) if matched else np.zeros(0, dtype=np.uint32)
+            field_mask = np.zeros(self.rows, dtype=bool)
+            field_mask[matched] = True
+            mask &= field_mask
+        if rows is None:
+            return mask
+        return (rows >= 0) & mask[np.maximum(rows, 0)] if self.rows else np.zeros(len(rows), dtype=bool)
+
+    def __len__(self):
+        return self.rows
+
+    def close(self):
+        self._readers.clear()
+        self.ids = None
+        super().close()
+
+
+class MetadataRow(Mapping):
+    """A read-only, dict-like view of one row; fields are decoded when accessed."""
+
+    __slots__ = ('_store', '_row', '_extra')
+
+    def __init__(self, store, row, extra=None):
+        self._store = store
+        self._row = row
+        self._extra = extra or {}
+
+    def __getitem__(self, key):
+        if key in self._extra:
+            return self._extra[key]
+        if key == 'ids' or key not in self._store._kinds:
+            raise KeyError(key)
+        return self._store.value(key, self._row)
+
+    def get(self, key, default=None):
+        # Same as Mapping.get, without the exception round trip on every call
+        if key in self._extra:
+            return self._extra[key]
+        if key == 'ids' or key not in self._store._kinds:
+            return default
+        return self._store.value(key, self._row)
+
+    def __iter__(self):
+        yield from self._store.columns
+        yield from (key for key in self._extra if key not in self._store._kinds)
+
+    def __len__(self):
+        return len(self._store.columns) + sum(1 for key in self._extra if key not in self._store._kinds)
+
+    def __repr__(self):
+        return f"MetadataRow({dict(self)!r})"
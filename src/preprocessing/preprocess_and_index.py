@@ -1,62 +1,158 @@
+import argparse
+import hashlib
 import json
 import os
-from sentence_transformers import SentenceTransformer
-import faiss
+import re
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import pickle
+from src.preprocessing.aggregates import write_aggregates
+from src.preprocessing.embedding_cache import EmbeddingCache, default_cache_dir
+from src.preprocessing.encoders import BACKENDS, SentenceTransformerEncoder, check_encoder, make_encoder
+from src.preprocessing.index_factory import (
+    COMPRESSIONS,
+    INDEX_TYPES,
+    add_vectors,
+    choose_index_type,
+    default_params,
+    load_index_params,
+    needs_rebuild,
+    needs_rescore,
+    new_index,
+    read_index,
+    remove_ids,
+    save_index_params,
+    write_index,
+)
+from src.preprocessing.kb_store import KnowledgeBaseStore, write_kb_store
+from src.preprocessing.lexical_index import write_lexical_index
+from src.preprocessing.metadata_store import write_metadata_store
+from src.preprocessing.vector_store import VectorStore, write_vector_store
+from src.utils.jsonl import iter_json_array
+from src.utils.constants import (
+    EMBEDDING_CACHE_DTYPE,
+    ENCODER_BATCH_SIZE,
+    ENCODER_MIN_TOPK_OVERLAP,
+    ENCODER_ONNX_FILE,
+    PREPROCESS_TASKS_PER_WORKER,
+    PREPROCESS_WORKERS,
+)
+
+EMBEDDING_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+# Bump when structure_restaurant's output changes so preprocess_data does not
+# copy entries from a knowledge base written by the previous version.
+# 2: raw tags are no longer doubled for repeated restaurant keys
+PREPROCESS_VERSION = 2
 
 # Feature Extraction
-def extract_features(description, tags):
-    """Extract features like spice counter, sweet counter, gluten-free, dietary tags, allergens, etc."""
-    description = description.lower()
-
-    keywords = {
-        "spicy": {"spicy": 1, "hot": 1, "chili": 1, "masala": 1, "pepper": 1, "jalapeno": 2, "curry": 1, "szechuan": 2, "peri-peri": 2, "wasabi": 3, "fiery": 2, "zesty": 1, "pungent": 2},
-        "sweet": {"sweet": 1, "dessert": 2, "sugar": 1, "honey": 1, "chocolate": 2, "caramel": 2, "vanilla": 1, "candy": 1, "pudding": 1, "cake": 2, "brownie": 2, "syrupy": 2, "custard": 1},
-        "gluten_free": ["gluten-free", "gluten free", "gf", "celiac-friendly", "no gluten", "without gluten", "wheat-free"],
-        "preparation": ["grilled", "fried", "baked", "steamed", "raw", "smoked", "poached", "sautéed", "seared"],
-        "dish_characteristics": ["savory", "dessert", "appetizer", "main course", "beverage", "snack", "healthy", "organic", "comfort food", "street food", "brunch"],
-        "cuisine": ["indian", "chinese", "italian", "mexican", "thai", "japanese", "continental", "mediterranean", "american", "fast food", "korean", "french", "vietnamese", "greek"],
-        "dietary": ["vegan", "vegetarian", "keto", "paleo", "low-carb", "low fat", "high protein"],
-        "allergens": ["peanut", "nut", "soy", "dairy", "milk", "egg", "shellfish", "wheat", "sesame"]
-    }
-
-    # Weighted counters
-    spice_counter = sum(description.count(word) * weight for word, weight in keywords["spicy"].items())
-    sweet_counter = sum(description.count(word) * weight for word, weight in keywords["sweet"].items())
-
-    # Match preparation, dish characteristics, cuisine, dietary, allergens
-    preparation_tags = [prep for prep in keywords["preparation"] if prep in description]
-    dish_tags = [char for char in keywords["dish_characteristics"] if char in description]
-    cuisine_tags = [cuisine for cuisine in keywords["cuisine"] if cuisine in description]
-    dietary_tags = [diet for diet in keywords["dietary"] if diet in description]
-    allergens = [allergen for allergen in keywords["allergens"] if allergen in description]
-
-    # Gluten-free detection
-    gluten_free = any(phrase in description for phrase in keywords["gluten_free"])
-
-    features = {
-        "spice_counter": spice_counter,
-        "sweet_counter": sweet_counter,
-        "gluten_free": gluten_free,
-        "preparation_tags": preparation_tags,
-        "dish_tags": dish_tags,
-        "cuisine_tags": cuisine_tags,
-        "dietary_tags": dietary_tags,
-        "allergens": allergens
-    }
+FEATURE_KEYWORDS = {
+    "spicy": {"spicy": 1, "hot": 1, "chili": 1, "masala": 1, "pepper": 1, "jalapeno": 2, "curry": 1, "szechuan": 2, "peri-peri": 2, "wasabi": 3, "fiery": 2, "zesty": 1, "pungent": 2},
+    "sweet": {"sweet": 1, "dessert": 2, "sugar": 1, "honey": 1, "chocolate": 2, "caramel": 2, "vanilla": 1, "candy": 1, "pudding": 1, "cake": 2, "brownie": 2, "syrupy": 2, "custard": 1},
+    "gluten_free": ["gluten-free", "gluten free", "gf", "celiac-friendly", "no gluten", "without gluten", "wheat-free"],
+    "preparation": ["grilled", "fried", "baked", "steamed", "raw", "smoked", "poached", "sautéed", "seared"],
+    "dish_characteristics": ["savory", "dessert", "appetizer", "main course", "beverage", "snack", "healthy", "organic", "comfort food", "street food", "brunch"],
+    "cuisine": ["indian", "chinese", "italian", "mexican", "thai", "japanese", "continental", "mediterranean", "american", "fast food", "korean", "french", "vietnamese", "greek"],
+    "dietary": ["vegan", "vegetarian", "keto", "paleo", "low-carb", "low fat", "high protein"],
+    "allergens": ["peanut", "nut", "soy", "dairy", "milk", "egg", "shellfish", "wheat", "sesame"]
+}
+# Feature list of each keyword category (gluten_free is a flag)
+TAG_CATEGORIES = {"preparation": "preparation_tags", "dish_characteristics": "dish_tags", "cuisine": "cuisine_tags",
+                  "dietary": "dietary_tags", "allergens": "allergens"}
+
+def _trie_pattern(words):
+    """A regex alternation of `words` factored by common prefix ("c(?:a(?:ke|ndy)|urry)"), so a failing position fails fast."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{pattern})?' if '' in node else pattern
+
+    return build(trie)
+
+def _keyword_matcher(keywords):
+    """One regex matching every keyword as a whole word (plural 's' / 'es' allowed), and what a match counts as.
+
+    A match is looked up by its keyword in the returned {keyword: [(category,
+    keyword)]}: the keyword's own categories plus those of keywords inside it
+    ("wheat-free" is also "wheat"), so each keyword is counted as if searched
+    for on its own.
+    """
+    words = {word for category in keywords.values() for word in category}
+    hits = {}
+    for phrase in words:
+        hits[phrase] = [(category, word) for category, category_words in keywords.items() for word in category_words
+                        if re.search(r'(?<!\w)' + re.escape(word) + r'(?!\w)', phrase)]
+    return re.compile(r'(?<!\w)(' + _trie_pattern(words) + r')(?:e?s)?(?!\w)'), hits
+
+KEYWORD_PATTERN, KEYWORD_HITS = _keyword_matcher(FEATURE_KEYWORDS)
+# Position of each keyword in its category's list, which orders the tags
+KEYWORD_RANKS = {(category, word): rank for category, words in FEATURE_KEYWORDS.items()
+                 for rank, word in enumerate(words)}
+
+def _features_from_hits(counts, tags):
+    """The features of one item from its {(category, keyword): matches}, adding the derived tags to `tags`."""
+    features = {"spice_counter": 0, "sweet_counter": 0, "gluten_free": False, "preparation_tags": [],
+                "dish_tags": [], "cuisine_tags": [], "dietary_tags": [], "allergens": []}
+    if not counts:
+        return features
+    for (category, word), count in counts.items():
+        if category == "spicy":
+            features["spice_counter"] += count * FEATURE_KEYWORDS["spicy"][word]
+        elif category == "sweet":
+            features["sweet_counter"] += count * FEATURE_KEYWORDS["sweet"][word]
+        elif category == "gluten_free":
+            features["gluten_free"] = True
+        else:
+            features[TAG_CATEGORIES[category]].append(word)
+    for category, feature in TAG_CATEGORIES.items():
+        if len(features[feature]) > 1:  # Tags are listed in keyword order
+            features[feature].sort(key=lambda word: KEYWORD_RANKS[(category, word)])
 
     # Dynamic tag updates
-    if spice_counter > 0 and "spicy" not in tags:
+    if features["spice_counter"] > 0 and "spicy" not in tags:
         tags.append("spicy")
-    if sweet_counter > 0 and "sweet" not in tags:
+    if features["sweet_counter"] > 0 and "sweet" not in tags:
         tags.append("sweet")
-    if gluten_free and "gluten-free" not in tags:
+    if features["gluten_free"] and "gluten-free" not in tags:
         tags.append("gluten-free")
-    tags.extend(preparation_tags + dish_tags + cuisine_tags + dietary_tags)
-
+    tags.extend(features["preparation_tags"] + features["dish_tags"] + features["cuisine_tags"] + features["dietary_tags"])
     return features
 
+def extract_menu_features(descriptions, tags_lists):
+    """extract_features for a whole menu: one lowercase and one regex pass over all of its descriptions.
+
+    `tags_lists` holds each item's tag list, which gets the derived tags.
+    """
+    descriptions = [description.lower() for description in descriptions]
+    text = "\n".join(descriptions)
+    starts, position = [], 0
+    for description in descriptions:
+        starts.append(position)
+        position += len(description) + 1
+    counts = [{} for _ in descriptions]
+    for match in KEYWORD_PATTERN.finditer(text):
+        item_counts = counts[bisect_right(starts, match.start()) - 1]
+        for hit in KEYWORD_HITS[match.group(1)]:
+            item_counts[hit] = item_counts.get(hit, 0) + 1
+    return [_features_from_hits(item_counts, tags) for item_counts, tags in zip(counts, tags_lists)]
+
+def extract_features(description, tags):
+    """Extract features like spice counter, sweet counter, gluten-free, dietary tags, allergens, etc.
+
+    Keywords match whole words only ("nut" is not found in "donut", nor "gf"
+    in "gfx"), through one compiled regex (see extract_menu_features).
+    """
+    return extract_menu_features([description], [tags])[0]
+
 # Feedback Tags
 def determine_customer_feedback_tags(rating, count_of_rating):
     if rating is None or count_of_rating is None:
@@ -123,85 +219,369 @@ def determine_restaurant_features(menu):
         features.append("highly rated")
     return features
 
+# Stable identity
+def restaurant_key(restaurant):
+    """Identifies a restaurant across runs: its source URL, else its name and location."""
+    return restaurant.get('url') or f"{restaurant.get('restaurant_name', 'Unknown')}|{restaurant.get('location', 'Unknown')}"
+
+def unique_restaurant_keys(restaurants):
+    """restaurant_key() for each restaurant, suffixed where two would collide.
+
+    Raw files written before records carried their URL can hold two outlets of
+    a brand with the same name and location; they are told apart by order.
+    """
+    keys, counts = [], {}
+    for restaurant in restaurants:
+        key = restaurant_key(restaurant)
+        counts[key] = counts.get(key, 0) + 1
+        keys.append(key if counts[key] == 1 else f"{key}#{counts[key]}")
+    return keys
+
+def make_item_id(key, item, seen):
+    """Stable 16-hex-digit ID for a menu item, derived from its restaurant and product.
+
+    `seen` holds the IDs already handed out for this restaurant, so a product
+    listed twice on a page still gets two distinct IDs.
+    """
+    product = item.get('product_id') or item.get('product_name', 'Unknown')
+    base = f"{key}|{product}"
+    item_id = hashlib.sha1(base.encode('utf-8')).hexdigest()[:16]
+    occurrence = 1
+    while item_id in seen:
+        occurrence += 1
+        item_id = hashlib.sha1(f"{base}#{occurrence}".encode('utf-8')).hexdigest()[:16]
+    seen.add(item_id)
+    return item_id
+
+def faiss_id(item_id):
+    """The int64 FAISS ID for an item ID (63 bits, always positive)."""
+    return int(item_id, 16) & 0x7FFFFFFFFFFFFFFF
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
 # Main Preprocessing
-def preprocess_data(raw_data_path, output_path):
-    with open(raw_data_path, 'r', encoding='utf-8') as f:
-        raw_data = json.load(f)
-
-    knowledge_base = []
-    for restaurant in raw_data:
-        structured_restaurant = {
-            "restaurant_name": restaurant.get('restaurant_name', 'Unknown'),
-            "location": restaurant.get('location', 'Unknown'),
-            "available_time": restaurant.get('available_time', 'Unknown'),
-            "contact": restaurant.get('contact', 'Unknown'),
-            "menu": []
+def structure_restaurant(restaurant, key=None):
+    """Turns one raw restaurant into its knowledge-base entry, or None if it has no menu.
+
+    `key` identifies the restaurant for item IDs (default: restaurant_key()).
+    `restaurant` itself is not modified.
+    """
+    structured_restaurant = {
+        "restaurant_name": restaurant.get('restaurant_name', 'Unknown'),
+        "location": restaurant.get('location', 'Unknown'),
+        "available_time": restaurant.get('available_time', 'Unknown'),
+        "contact": restaurant.get('contact', 'Unknown'),
+        "url": restaurant.get('url'),
+        "menu": []
+    }
+    key = key or restaurant_key(restaurant)
+    seen_item_ids = set()
+    menu_items = restaurant.get('menu_items', [])
+    descriptions = [(item.get('small_description') or '') + " " + (item.get('big_description') or '')
+                    for item in menu_items]
+    tags_lists = [list(item.get('tags', [])) for item in menu_items]
+    menu_features = extract_menu_features(descriptions, tags_lists)
+    for item, tags, features in zip(menu_items, tags_lists, menu_features):
+
+        feedback_tags = determine_customer_feedback_tags(item.get("rating"), item.get("count_of_rating"))
+        affordability_tag = determine_affordability_tag(item.get("price"))
+        if affordability_tag and affordability_tag not in tags:
+            tags.append(affordability_tag)
+
+        is_veg = item.get('is_veg', None)
+        dish_type = "veg" if is_veg == 1 else "non-veg"
+
+        if dish_type == "veg" and "veg" not in tags:
+            tags.append("veg")
+        if dish_type == "non-veg" and "non-veg" not in tags:
+            tags.append("non-veg")
+
+        popularity_score = None
+        if item.get("rating") and item.get("count_of_rating"):
+            popularity_score = round(item["rating"] * item["count_of_rating"], 2)
+
+        structured_item = {
+            "item_id": make_item_id(key, item, seen_item_ids),
+            "item_name": item.get('product_name', 'Unknown'),
+            "price": item.get('price', 'Unknown'),
+            "tags": tags,
+            "spice_level": item.get('spice_level', 'Unknown'),
+            "spice_counter": features["spice_counter"],
+            "sweet_counter": features["sweet_counter"],
+            "gluten_free": features["gluten_free"],
+            "type": dish_type,
+            "short_description": item.get('small_description', 'Unknown'),
+            "long_description": item.get('big_description', 'Unknown'),
+            "preparation_tags": features["preparation_tags"],
+            "dish_tags": features["dish_tags"],
+            "cuisine_tags": features["cuisine_tags"],
+            "dietary_tags": features["dietary_tags"],
+            "allergens": features["allergens"],
+            "feedback_tags": feedback_tags,
+            "affordability_tag": affordability_tag,
+            "is_customizable": item.get("is_customizable", False),
+            "popularity_score": popularity_score
         }
-        for item in restaurant.get('menu_items', []):
-            description = (item.get('small_description') or '') + " " + (item.get('big_description') or '')
-            tags = item.get('tags', [])
-
-            features = extract_features(description, tags)
-
-            feedback_tags = determine_customer_feedback_tags(item.get("rating"), item.get("count_of_rating"))
-            affordability_tag = determine_affordability_tag(item.get("price"))
-            if affordability_tag and affordability_tag not in tags:
-                tags.append(affordability_tag)
-
-            is_veg = item.get('is_veg', None)
-            dish_type = "veg" if is_veg == 1 else "non-veg"
-
-            if dish_type == "veg" and "veg" not in tags:
-                tags.append("veg")
-            if dish_type == "non-veg" and "non-veg" not in tags:
-                tags.append("non-veg")
-
-            popularity_score = None
-            if item.get("rating") and item.get("count_of_rating"):
-                popularity_score = round(item["rating"] * item["count_of_rating"], 2)
-
-            structured_item = {
-                "item_name": item.get('product_name', 'Unknown'),
-                "price": item.get('price', 'Unknown'),
-                "tags": tags,
-                "spice_level": item.get('spice_level', 'Unknown'),
-                "spice_counter": features["spice_counter"],
-                "sweet_counter": features["sweet_counter"],
-                "gluten_free": features["gluten_free"],
-                "type": dish_type,
-                "short_description": item.get('small_description', 'Unknown'),
-                "long_description": item.get('big_description', 'Unknown'),
-                "preparation_tags": features["preparation_tags"],
-                "dish_tags": features["dish_tags"],
-                "cuisine_tags": features["cuisine_tags"],
-                "dietary_tags": features["dietary_tags"],
-                "allergens": features["allergens"],
-                "feedback_tags": feedback_tags,
-                "affordability_tag": affordability_tag,
-                "is_customizable": item.get("is_customizable", False),
-                "popularity_score": popularity_score
-            }
-
-            structured_item = drop_null_columns(structured_item)
-            structured_restaurant["menu"].append(structured_item)
-
-        if not structured_restaurant["menu"]:
-            continue
-
-        structured_restaurant["type"] = determine_restaurant_type(structured_restaurant["menu"])
-        structured_restaurant["features"] = determine_restaurant_features(structured_restaurant["menu"])
-        structured_restaurant = drop_null_columns(structured_restaurant)
-        knowledge_base.append(structured_restaurant)
-
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(knowledge_base, f, indent=4, ensure_ascii=False)
-    print(f" Knowledge base saved to {output_path}")
-
-def preprocess_and_index(kb_path, idx_path, meta_path, chunks_path):
+
+        structured_item = drop_null_columns(structured_item)
+        structured_restaurant["menu"].append(structured_item)
+
+    if not structured_restaurant["menu"]:
+        return None
+
+    structured_restaurant["type"] = determine_restaurant_type(structured_restaurant["menu"])
+    structured_restaurant["features"] = determine_restaurant_features(structured_restaurant["menu"])
+    structured_restaurant = drop_null_columns(structured_restaurant)
+    return structured_restaurant
+
+# Parallel preprocessing
+_previous_hashes = {}  # Raw hashes of the previous run, in each worker process
+
+def _init_preprocess_worker(previous_hashes):
+    global _previous_hashes
+    _previous_hashes = previous_hashes
+
+def _structure_record(record, key=None):
+    """(key, raw hash, compact JSON of the knowledge-base entry) for one raw restaurant.
+
+    `record` is a parsed restaurant or a JSONL line. The entry is None when the
+    restaurant has no menu, or is unchanged since the previous run and so is
+    not processed; (None, None, None) is returned for an undecodable line.
+    """
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except json.JSONDecodeError:
+            return None, None, None
+    key = key or restaurant_key(record)
+    raw_hash = content_hash(json.dumps(record, sort_keys=True, ensure_ascii=False))
+    if _previous_hashes.get(key) == raw_hash:
+        return key, raw_hash, None
+    structured_restaurant = structure_restaurant(record, key)
+    if not structured_restaurant:
+        return key, raw_hash, None
+    return key, raw_hash, json.dumps(structured_restaurant, ensure_ascii=False, separators=(',', ':'))
+
+def _raw_records(raw_data_path):
+    """Streams a raw file: the lines of JSONL (decoded by the workers), else the elements of a JSON array."""
+    if raw_data_path.endswith('.jsonl'):
+        with open(raw_data_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield line
+    else:
+        yield from iter_json_array(raw_data_path)
+
+def _structure_records(records, executor, window):
+    """Yields (record, _structure_record(record)) in input order, with at most `window` records in flight."""
+    if executor is None:
+        for record in records:
+            yield record, _structure_record(record)
+        return
+    in_flight = deque()
+    for record in records:
+        in_flight.append((record, executor.submit(_structure_record, record)))
+        if len(in_flight) >= window:
+            record, future = in_flight.popleft()
+            yield record, future.result()
+    while in_flight:
+        record, future = in_flight.popleft()
+        yield record, future.result()
+
+def _entry_lines(kb_path, kb_keys):
+    """{key: (offset, length)} of each entry in a knowledge base written by preprocess_data, or None.
+
+    Entries are one per line, in the order of `kb_keys`; None means the file is
+    laid out otherwise (an older, pretty-printed knowledge base).
+    """
+    lines, offset = [], 0
+    with open(kb_path, 'rb') as f:
+        for line in f:
+            if line.startswith(b'{'):
+                lines.append((offset, len(line.rstrip(b',\r\n'))))
+            offset += len(line)
+    return dict(zip(kb_keys, lines)) if len(lines) == len(kb_keys) else None
+
+def preprocess_data(raw_data_path, output_path, incremental=True, workers=PREPROCESS_WORKERS, store_path=None):
+    """Builds knowledge_base.json from the raw scrape, a JSON array or JSONL with one restaurant per line.
+
+    Restaurants are streamed from the raw file and structured on a pool of
+    `workers` processes (default: one per core; 1 runs in-process), with at
+    most PREPROCESS_TASKS_PER_WORKER of them per worker in flight, so memory
+    does not grow with the catalog. Entries are written in input order as they
+    complete, one compact JSON object per line of the output array. JSONL
+    input scales best, since the workers also decode it.
+
+    With incremental=True, restaurants whose raw record is unchanged since the
+    previous run (tracked by hash in knowledge_base.state.json) are copied from
+    the previous knowledge base instead of being processed again, unless it was
+    written by another PREPROCESS_VERSION.
+
+    With `store_path`, the knowledge base is also written there in the compact,
+    memory-mapped format of kb_store.py.
+    """
+    state_path = os.path.splitext(output_path)[0] + '.state.json'
+    previous_lines, previous_hashes = {}, {}
+    if incremental and os.path.exists(output_path) and os.path.exists(state_path):
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("version", 1) != PREPROCESS_VERSION:
+                raise ValueError("written by an older version of preprocessing")
+            previous_lines = _entry_lines(output_path, state["kb_keys"])
+            if previous_lines is None:
+                raise ValueError("not written one entry per line")
+            previous_hashes = state["raw_hashes"]
+        except (ValueError, OSError, KeyError) as e:
+            print(f"Warning: Could not load the previous knowledge base ({e}); rebuilding from scratch.")
+            previous_lines, previous_hashes = {}, {}
+
+    workers = workers or os.cpu_count() or 1
+    _init_preprocess_worker(previous_hashes)
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers, initializer=_init_preprocess_worker, initargs=(previous_hashes,))
+    previous_file = open(output_path, 'rb') if previous_lines else None
+    kb_keys, raw_hashes, counts = [], {}, {}
+    total, reused = 0, 0
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            out.write("[")
+            for record, (key, raw_hash, entry) in _structure_records(_raw_records(raw_data_path), executor,
+                                                                     workers * PREPROCESS_TASKS_PER_WORKER):
+                if key is None:
+                    print(f"Warning: Skipping undecodable line in {raw_data_path}")
+                    continue
+                total += 1
+                counts[key] = counts.get(key, 0) + 1
+                if counts[key] > 1:
+                    # Raw files written before records carried their URL can hold two
+                    # outlets with the same name and location (see unique_restaurant_keys).
+                    # Structuring leaves `record` untouched, so it is simply redone under
+                    # the suffixed key, the same whether or not a worker did the first pass.
+                    key, raw_hash, entry = _structure_record(record, f"{key}#{counts[key]}")
+                raw_hashes[key] = raw_hash
+                if previous_hashes.get(key) == raw_hash:
+                    reused += 1
+                    if key not in previous_lines:
+                        continue  # Unchanged, including restaurants that had no menu last time either
+                    offset, length = previous_lines[key]
+                    previous_file.seek(offset)
+                    entry = previous_file.read(length).decode('utf-8')
+                if entry is None:
+                    continue
+                out.write(("\n" if not kb_keys else ",\n") + entry)
+                kb_keys.append(key)
+            out.write("\n]\n")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if previous_file is not None:
+            previous_file.close()
+    os.replace(tmp_path, output_path)
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": PREPROCESS_VERSION, "raw_hashes": raw_hashes, "kb_keys": kb_keys}, f)
+    print(f" Knowledge base saved to {output_path} ({reused} of {total} restaurants unchanged)")
+    if store_path:
+        restaurants, items = write_kb_store(store_path, iter_json_array(output_path))
+        print(f" Knowledge base store saved to {store_path} ({restaurants} restaurants, {items} items, "
+              f"{os.path.getsize(store_path) / 1024 / 1024:.1f} MB)")
+
+def item_document(restaurant, item):
+    """The text embedded for a menu item."""
+    return f"{restaurant['restaurant_name']} | {restaurant['location']} | {item['item_name']} | {item.get('short_description', '')} | {item.get('long_description', '')} | Tags: {', '.join(item.get('tags', []))}"
+
+def item_metadata(restaurant, item):
+    """The metadata stored for a menu item alongside its vector."""
+    return {
+        "item_id": item.get('item_id'),
+        "restaurant_name": restaurant['restaurant_name'],
+        "item_name": item['item_name'],
+        "location": restaurant['location'],
+        "price": item.get('price'),
+        "tags": item.get('tags', []),
+        "spice_level": item.get('spice_level'),
+        "gluten_free": item.get('gluten_free'),
+        "dish_type": item.get('type'),
+        "short_description": item.get('short_description'),
+        "long_description": item.get('long_description'),
+        "preparation_tags": item.get('preparation_tags', []),
+        "dish_tags": item.get('dish_tags', []),
+        "cuisine_tags": item.get('cuisine_tags', []),
+        "popularity_score": item.get('popularity_score'),
+        "affordability_tag": item.get('affordability_tag'),
+        "feedback_tags": item.get('feedback_tags', []),
+        "dietary_tags": item.get('dietary_tags', []),
+        "contact": restaurant.get('contact', "Unknown"),
+        "available_time": restaurant.get('available_time', "Unknown"),
+    }
+
+def load_previous_index(idx_path, manifest_path, model_name, params=None):
+    """Loads the index and manifest of the last run, or None if either is unusable.
+
+    The manifest only exists for indexes keyed by item ID, so positional
+    indexes from before item IDs are rebuilt.
+    """
+    if not all(os.path.exists(path) for path in (idx_path, manifest_path)):
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("model") != model_name:
+            print("Embedding model changed; rebuilding the index from scratch.")
+            return None
+        index = read_index(idx_path, params)
+    except Exception as e:
+        print(f"Could not load the previous index ({e}); rebuilding from scratch.")
+        return None
+    return index, manifest
+
+def preprocess_and_index(kb_path, idx_path, meta_path, chunks_path, manifest_path=None, full_rebuild=False,
+                         embedding_cache_dir=default_cache_dir, encoder=None,
+                         min_overlap=ENCODER_MIN_TOPK_OVERLAP, index_type='auto', compression='none',
+                         lexical_path=None, aggregates_path=None):
+    """Embeds the knowledge base into a FAISS index, updating the previous index in place.
+
+    Every item has a stable item_id, and index_manifest.json records the hash
+    of the text embedded for it. On later runs only added or changed items are
+    embedded. Removed and changed items are dropped from the ID-mapped index
+    with remove_ids. The metadata store (metadata_store.py) is rewritten from
+    the knowledge base, with rows keyed by FAISS ID. Pass full_rebuild=True to
+    re-embed everything.
+
+    Embeddings are looked up in the on-disk embedding cache first, so a full
+    rebuild or a re-added item only runs the model on text it has never seen.
+    Pass embedding_cache_dir=None to always run the model.
+
+    `encoder` is one of the backends in encoders.py (default: the fp32
+    sentence-transformers model). A quantized encoder must first keep a top-k
+    neighbour overlap of at least `min_overlap` with the fp32 model.
+
+    `index_type` is one of index_factory.INDEX_TYPES, or 'auto' to pick one by
+    corpus size. Switching type rebuilds the index (from the embedding cache).
+    `compression` ('int8' or 'binary') stores compressed vectors in the index;
+    lossy indexes also get a full-precision side file used to rescore results.
+
+    A BM25 index of the same documents is rebuilt at `lexical_path` (default:
+    bm25_index.bin next to the FAISS index) for hybrid retrieval, and the
+    aggregate tables of the query router at `aggregates_path` (default:
+    aggregates.json next to it).
+    """
+    encoder = encoder or SentenceTransformerEncoder(EMBEDDING_MODEL_NAME)
+    manifest_path = manifest_path or os.path.join(os.path.dirname(idx_path), 'index_manifest.json')
+    lexical_path = lexical_path or os.path.join(os.path.dirname(idx_path), 'bm25_index.bin')
+    aggregates_path = aggregates_path or os.path.join(os.path.dirname(idx_path), 'aggregates.json')
     print(f"Attempting to load knowledge base from: {kb_path}")
     try:
-        with open(kb_path, 'r', encoding='utf-8') as f:
-            knowledge_base = json.load(f)
+        if kb_path.endswith('.bin'):
+            knowledge_base = KnowledgeBaseStore.open(kb_path)
+            if knowledge_base is None:
+                return
+        else:
+            with open(kb_path, 'r', encoding='utf-8') as f:
+                knowledge_base = json.load(f)
     except FileNotFoundError:
         print(f"Error: Knowledge base file not found at {kb_path}")
         return
@@ -212,55 +592,93 @@ def preprocess_and_index(kb_path, idx_path, meta_path, chunks_path):
         print(f"An unexpected error occurred loading {kb_path}: {e}")
         return
 
-    # Load SentenceTransformer model
-    embedder = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-
     # Flatten important fields
-    documents = []
-    metadata = []
+    documents = {}  # faiss id -> text
+    current_metadata = {}
     processed_chunks = []
-
-    for restaurant in knowledge_base:
+    # Keys only need names and locations, which the store reads without the menus
+    key_entries = knowledge_base.restaurants(menu=False) if isinstance(knowledge_base, KnowledgeBaseStore) \
+        else knowledge_base
+    for key, restaurant in zip(unique_restaurant_keys(key_entries), knowledge_base):
+        seen_item_ids = set()
         for item in restaurant["menu"]:
-            text = f"{restaurant['restaurant_name']} | {restaurant['location']} | {item['item_name']} | {item.get('short_description', '')} | {item.get('long_description', '')} | Tags: {', '.join(item.get('tags', []))}"
-            documents.append(text)
-            metadata.append({
-                "restaurant_name": restaurant['restaurant_name'],
-                "item_name": item['item_name'],
-                "location": restaurant['location'],
-                "price": item.get('price'),
-                "tags": item.get('tags', []),
-                "spice_level": item.get('spice_level'),
-                "gluten_free": item.get('gluten_free'),
-                "dish_type": item.get('type'),
-                "short_description": item.get('short_description'),
-                "long_description": item.get('long_description'),
-                "preparation_tags": item.get('preparation_tags', []),
-                "dish_tags": item.get('dish_tags', []),
-                "cuisine_tags": item.get('cuisine_tags', []),
-                "popularity_score": item.get('popularity_score'),
-                "affordability_tag": item.get('affordability_tag'),
-                "feedback_tags": item.get('feedback_tags', []),
-                "contact": restaurant.get('contact', "Unknown"),
-                "available_time": restaurant.get('available_time', "Unknown"),
-            })
+            if not item.get('item_id'):  # Knowledge base written before item IDs existed
+                item['item_id'] = make_item_id(key, item, seen_item_ids)
+            text = item_document(restaurant, item)
+            documents[faiss_id(item['item_id'])] = text
+            current_metadata[faiss_id(item['item_id'])] = item_metadata(restaurant, item)
             processed_chunks.append(text)
+    hashes = {vector_id: content_hash(text) for vector_id, text in documents.items()}
+
+    wanted_type = choose_index_type(len(documents)) if index_type == 'auto' else index_type
+    saved_params = load_index_params(idx_path)
+    previous = None if full_rebuild else load_previous_index(idx_path, manifest_path, encoder.vector_space,
+                                                             saved_params)
+    if previous is not None and needs_rebuild(saved_params, wanted_type, len(documents), compression):
+        was = saved_params or {}
+        print(f"Rebuilding the index as {wanted_type}/{compression} "
+              f"(was {was.get('type', 'flat')}/{was.get('compression', 'none')}).")
+        previous = None
+    vector_store = None
+    if previous is not None and needs_rescore(saved_params or {}):
+        vector_store = VectorStore.open(idx_path, saved_params["dim"])
+        if vector_store is None:
+            print("Full-precision side file is missing; rebuilding the index.")
+            previous = None
+    if previous is None:
+        index, params, previous_hashes, vector_store = None, None, {}, None
+    else:
+        index, manifest = previous
+        params = saved_params or default_params('flat', len(documents), index.d)
+        previous_hashes = {int(vector_id): text_hash for vector_id, text_hash in manifest["items"].items()}
+
+    added = [vector_id for vector_id in documents if vector_id not in previous_hashes]
+    changed = [vector_id for vector_id in documents
+               if vector_id in previous_hashes and previous_hashes[vector_id] != hashes[vector_id]]
+    removed = [vector_id for vector_id in previous_hashes if vector_id not in documents]
+    to_embed = added + changed
+    print(f"Items: {len(documents)} total, {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+
+    embedding_cache = EmbeddingCache(embedding_cache_dir, encoder.vector_space, EMBEDDING_CACHE_DTYPE) \
+        if embedding_cache_dir else None
+    if to_embed:
+        texts = [documents[vector_id] for vector_id in to_embed]
+        # Checked on a sample of the whole corpus: a few changed items make a meaningless top-k
+        if encoder.quantized and not check_encoder(encoder, list(documents.values()), min_overlap=min_overlap)[0]:
+            print("Error: The quantized encoder drifted too far from the fp32 model; index left unchanged.")
+            encoder.close()
+            return
+        embeddings = embedding_cache.encode(texts, encoder.encode) if embedding_cache else encoder.encode(texts)
+        encoder.close()
+        if index is None:
+            # Create FAISS index, training it on this run's vectors (the whole corpus) if needed
+            params = default_params(wanted_type, len(documents), embeddings.shape[1], compression)
+            index = new_index(params, embeddings)
+    elif index is None:
+        print("Error: Nothing to index.")
+        return
 
-    # Embed all documents
-    embeddings = embedder.encode(documents, convert_to_numpy=True, normalize_embeddings=True)
-
-    # Create FAISS index
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)
-    index.add(embeddings)
+    index = remove_ids(index, params, np.array(changed + removed, dtype=np.int64))
+    if to_embed:
+        add_vectors(index, params, embeddings, to_embed)
 
     # Ensure saving paths are also correct (using idx_path, meta_path, chunks_path)
-    print(f"Saving FAISS index to: {idx_path}")
-    faiss.write_index(index, idx_path)
+    print(f"Saving FAISS index to: {idx_path} ({index.ntotal} vectors, {len(to_embed)} embedded this run)")
+    write_index(index, idx_path, params)
+    save_index_params(idx_path, params)
+    if needs_rescore(params):
+        stored = write_vector_store(idx_path, to_embed, embeddings if to_embed else [], vector_store, removed)
+        print(f"Saved {stored} full-precision vectors for rescoring next to the index.")
 
     print(f"Saving metadata to: {meta_path}")
-    with open(meta_path, 'wb') as f:
-        pickle.dump(metadata, f)
+    write_metadata_store(meta_path, current_metadata)
+    print(f"Saving BM25 index to: {lexical_path} ({write_lexical_index(lexical_path, documents)} terms)")
+    print(f"Saving aggregate tables to: {aggregates_path} "
+          f"({write_aggregates(aggregates_path, current_metadata)} tables)")
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({"model": encoder.vector_space,
+                   "items": {str(vector_id): text_hash for vector_id, text_hash in hashes.items()}}, f)
 
     # Save processed chunks if needed
     print(f"Saving processed chunks to: {chunks_path}")
@@ -270,6 +688,10 @@ def preprocess_and_index(kb_path, idx_path, meta_path, chunks_path):
     except Exception as e:
         print(f"Error writing processed chunks to {chunks_path}: {e}")
 
+    if embedding_cache:
+        embedding_cache.report()
+    if encoder.docs:
+        encoder.report()
     print("Preprocessing and indexing complete.")
 
 
@@ -284,9 +706,51 @@ if __name__ == "__main__":
 
     # Correctly define paths relative to the 'src/output/' directory
     knowledge_base_path = os.path.join(output_dir, 'knowledge_base.json')
+    kb_store_path = os.path.join(output_dir, 'knowledge_base.bin')
     index_path = os.path.join(output_dir, 'faiss_index.bin')
-    metadata_path = os.path.join(output_dir, 'metadata.pkl')
+    metadata_path = os.path.join(output_dir, 'metadata.cols')
     processed_chunks_path = os.path.join(output_dir, 'processed_chunks.json')  # Added for consistency if used
+    raw_data_path = os.path.join(output_dir, 'raw_extracted_data.json')
+
+    parser = argparse.ArgumentParser(description="Build the knowledge base and FAISS index.")
+    parser.add_argument('--from-raw', action='store_true',
+                        help="Rebuild knowledge_base.json and knowledge_base.bin from raw_extracted_data.json first.")
+    parser.add_argument('--raw', default=raw_data_path,
+                        help="Raw data for --from-raw: a JSON array, or JSONL with one restaurant per line.")
+    parser.add_argument('--workers', type=int, default=PREPROCESS_WORKERS,
+                        help="Processes structuring restaurants for --from-raw (default: one per core).")
+    parser.add_argument('--full', action='store_true',
+                        help="Reprocess and re-embed everything instead of only what changed.")
+    parser.add_argument('--no-embedding-cache', action='store_true',
+                        help="Run the model on every text instead of reusing cached embeddings.")
+    parser.add_argument('--encoder', choices=BACKENDS, default='sentence-transformers',
+                        help="Embedding backend: in-process fp32, a multi-process pool, or int8 ONNX.")
+    parser.add_argument('--batch-size', type=int, default=ENCODER_BATCH_SIZE)
+    parser.add_argument('--no-length-sort', action='store_true', help="Batch texts in input order.")
+    parser.add_argument('--encoder-workers', type=int, default=None,
+                        help="Processes for the pool backend (default: half the cores).")
+    parser.add_argument('--onnx-file', default=ENCODER_ONNX_FILE, help="Quantized export for onnx-int8.")
+    parser.add_argument('--min-overlap', type=float, default=ENCODER_MIN_TOPK_OVERLAP,
+                        help="Minimum top-k overlap with fp32 required of the onnx-int8 backend.")
+    parser.add_argument('--index-type', choices=('auto',) + INDEX_TYPES, default='auto',
+                        help="FAISS index type (auto: chosen by corpus size).")
+    parser.add_argument('--compression', choices=COMPRESSIONS, default='none',
+                        help="Store int8 or binary vectors in the index, rescored from a float side file.")
+    args = parser.parse_args()
+
+    if args.from_raw:
+        preprocess_data(args.raw, knowledge_base_path, incremental=not args.full, workers=args.workers,
+                        store_path=kb_store_path)
+    # Index from the store unless knowledge_base.json was changed after it was written
+    if os.path.exists(kb_store_path) and (not os.path.exists(knowledge_base_path)
+                                          or os.path.getmtime(kb_store_path) >= os.path.getmtime(knowledge_base_path)):
+        knowledge_base_path = kb_store_path
 
     # Call the function with the correctly defined paths
-    preprocess_and_index(knowledge_base_path, index_path, metadata_path, processed_chunks_path)
+    preprocess_and_index(knowledge_base_path, index_path, metadata_path, processed_chunks_path,
+                         full_rebuild=args.full,
+                         embedding_cache_dir=None if args.no_embedding_cache else default_cache_dir,
+                         encoder=make_encoder(args.encoder, EMBEDDING_MODEL_NAME, args.batch_size,
+                                              not args.no_length_sort, args.encoder_workers, args.onnx_file),
+                         min_overlap=args.min_overlap, index_type=args.index_type,
+                         compression=args.compression)
@@ -0,0 +1,101 @@
+import json
+import mmap
+import os
+
+import numpy as np
+
+# File layout shared by the memory-mapped stores (metadata_store.py,
+# lexical_index.py): a magic line, the length of a JSON header, the header,
+# then 8-byte aligned sections. The header maps group -> name -> entry, and
+# each entry's "sections" maps a section name to [offset, dtype, count].
+# Opening a file only parses the header; sections are numpy views over the
+# mmap, so nothing is read until it is used, and every process on the
+# machine shares the same pages through the page cache.
+
+_VIEW_FORMATS = {'<f8': 'd', '<f4': 'f', '|i1': 'b', '<u2': 'H', '<u4': 'I', '<u8': 'Q', '<i8': 'q'}
+
+
+def write_section_file(path, magic, header, groups):
+    """Writes `header` plus `groups` ({group: {name: entry}}, each entry with a "sections" dict of arrays).
+
+    Entry fields other than the arrays go into the header. The file is
+    replaced atomically.
+    """
+    header = dict(header)
+    arrays = []
+    position = 0
+    for group, entries in groups.items():
+        header[group] = {}
+        for name, entry in entries.items():
+            header[group][name] = dict(entry, sections={})
+            for section, array in entry["sections"].items():
+                position += -position % 8
+                header[group][name]["sections"][section] = [position, array.dtype.str, len(array)]
+                arrays.append((position, array))
+                position += array.nbytes
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = len(magic) + 8 + len(header_bytes)
+    data_start += -data_start % 8
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(magic)
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        for offset, array in arrays:
+            f.seek(data_start + offset)
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + position)  # Empty trailing sections still lie inside the file
+    os.replace(tmp_path, path)
+
+
+class SectionFile:
+    """Read-only, memory-mapped access to a file written by write_section_file."""
+
+    MAGIC = None
+    KIND = 'section file'
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self.MAGIC
+        if self._mmap[:len(magic)] != magic:
+            raise ValueError(f"{path} is not a {self.KIND}")
+        header_length = int.from_bytes(self._mmap[len(magic):len(magic) + 8], 'little')
+        header_end = len(magic) + 8 + header_length
+        self._header = json.loads(self._mmap[len(magic) + 8:header_end])
+        self._data_start = header_end + (-header_end % 8)
+        self._sections = {}
+
+    def _section(self, group, name, section):
+        """A section as a numpy array over the mmap."""
+        key = (group, name, section)
+        if key not in self._sections:
+            offset, dtype, count = self._header[group][name]["sections"][section]
+            self._sections[key] = np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count,
+                                                offset=self._data_start + offset)
+        return self._sections[key]
+
+    def _view(self, group, name, section):
+        """A section as a typed memoryview over the mmap: single elements index far faster than numpy."""
+        key = (group, name, section, 'view')
+        if key not in self._sections:
+            offset, dtype, count = self._header[group][name]["sections"][section]
+            start = self._data_start + offset
+            self._sections[key] = memoryview(self._mmap)[start:start + count * np.dtype(dtype).itemsize] \
+                .cast(_VIEW_FORMATS[dtype])
+        return self._sections[key]
+
+    def size_bytes(self):
+        return len(self._mmap)
+
+    def close(self):
+        for section in self._sections.values():
+            if isinstance(section, memoryview):
+                section.release()
+        self._sections.clear()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Arrays still referenced elsewhere keep the mapping alive until they are dropped
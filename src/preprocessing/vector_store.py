@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+
+# Full-precision side file for indexes that store compressed vectors.
+#
+#   <index>.vectors.bin     float32 rows, ordered by FAISS ID
+#   <index>.vector_ids.bin  the int64 FAISS ID of each row, ascending
+#
+# Both are opened as memory maps, so a query only pages in the rows of its
+# shortlist, and every process on the machine shares them via the page cache.
+
+
+def store_paths(idx_path):
+    base = os.path.splitext(idx_path)[0]
+    return base + '.vectors.bin', base + '.vector_ids.bin'
+
+
+class VectorStore:
+    """Read access to the float vectors of an index by FAISS ID."""
+
+    def __init__(self, idx_path, dim):
+        self.vectors_path, self.ids_path = store_paths(idx_path)
+        self.ids = np.memmap(self.ids_path, dtype=np.int64, mode='r') \
+            if os.path.getsize(self.ids_path) else np.zeros(0, dtype=np.int64)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(len(self.ids), dim)) \
+            if len(self.ids) else np.zeros((0, dim), dtype=np.float32)
+
+    @classmethod
+    def open(cls, idx_path, dim):
+        """Opens the side file of `idx_path`, or returns None when there is none."""
+        if not all(os.path.exists(path) for path in store_paths(idx_path)):
+            return None
+        return cls(idx_path, dim)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, ids):
+        """Float32 rows for `ids` (all of which must be stored), in the given order."""
+        rows = np.searchsorted(self.ids, ids)
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def size_bytes(self):
+        return os.path.getsize(self.vectors_path) + os.path.getsize(self.ids_path)
+
+
+def write_vector_store(idx_path, ids, vectors, previous=None, drop_ids=()):
+    """Writes the side file for `idx_path`.
+
+    With a `previous` store, its rows are carried over except those in
+    `drop_ids`, and `ids`/`vectors` are merged in. The files are replaced
+    atomically, so readers of the old store are never handed a partial file.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if previous is not None and len(previous):
+        keep = ~np.isin(previous.ids, np.concatenate([np.asarray(list(drop_ids), dtype=np.int64), ids]))
+        ids = np.concatenate([previous.ids[keep], ids])
+        vectors = np.concatenate([previous.vectors[keep], vectors]) if len(vectors) else \
+            np.asarray(previous.vectors[keep], dtype=np.float32)
+    order = np.argsort(ids, kind='stable')
+    for path, array in zip(store_paths(idx_path), (vectors[order], ids[order])):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(np.ascontiguousarray(array).tobytes())
+    for path in store_paths(idx_path):
+        os.replace(path + '.tmp', path)
+    return len(ids)
@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import time
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class CrawlState:
+    """Tracks which site URLs are pending, done or failed.
+
+    Every change is appended to a JSONL log and flushed right away, so an
+    interrupted crawl loses at most the site that was in flight. Loading replays
+    the log; compact() rewrites it with one line per URL.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.urls = {}
+        self._lock = threading.Lock()
+        self._log = None
+
+    @classmethod
+    def load(cls, path):
+        """Replays a saved crawl log, or returns an empty state if none exists."""
+        state = cls(path)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A torn last line from a crash; the site will be retried
+                    url = event.pop("url")
+                    state.urls[url] = event
+        return state
+
+    def reset(self, urls):
+        """Marks every URL as pending, discarding any previous progress."""
+        with self._lock:
+            self.urls = {url: self._new_entry() for url in urls}
+            self._rewrite()
+
+    def add_pending(self, urls):
+        """Registers URLs that are not tracked yet (e.g. new entries in sites.json)."""
+        with self._lock:
+            for url in urls:
+                if url not in self.urls:
+                    self.urls[url] = self._new_entry()
+                    self._append(url)
+
+    def status(self, url):
+        entry = self.urls.get(url)
+        return entry["status"] if entry else PENDING
+
+    def is_done(self, url):
+        return self.status(url) == DONE
+
+    def record_error(self, url, error):
+        """Counts a failed attempt; the URL stays retryable until mark_failed()."""
+        with self._lock:
+            entry = self.urls.setdefault(url, self._new_entry())
+            entry["attempts"] += 1
+            entry["last_error"] = error
+            self._append(url)
+
+    def mark_done(self, url):
+        self._set_status(url, DONE)
+
+    def mark_failed(self, url):
+        self._set_status(url, FAILED)
+
+    def counts(self):
+        counts = {PENDING: 0, DONE: 0, FAILED: 0}
+        for entry in self.urls.values():
+            counts[entry["status"]] += 1
+        return counts
+
+    def compact(self):
+        """Rewrites the log with only the latest entry for each URL."""
+        with self._lock:
+            self._rewrite()
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    @staticmethod
+    def _new_entry():
+        return {"status": PENDING, "attempts": 0, "last_error": None}
+
+    def _set_status(self, url, status):
+        with self._lock:
+            entry = self.urls.setdefault(url, self._new_entry())
+            entry["status"] = status
+            self._append(url)
+
+    def _append(self, url):
+        entry = self.urls[url]
+        entry["updated_at"] = time.time()
+        if self._log is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._log = open(self.path, 'a', encoding='utf-8')
+        self._log.write(json.dumps({"url": url, **entry}) + "\n")
+        self._log.flush()
+
+    def _rewrite(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for url, entry in self.urls.items():
+                f.write(json.dumps({"url": url, **entry}) + "\n")
+        os.replace(tmp_path, self.path)
@@ -1,13 +1,29 @@
+import argparse
 import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
 
 # Adjust path to import from sibling directory 'scraper'
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)  # Go up one level to the project root
 sys.path.insert(0, project_root)  # Add project root to sys.path
 
-from src.scraper.restaurant_scraper import RestaurantScraper
+from src.raw_data.crawl_state import DONE, FAILED, PENDING, CrawlState
+from src.scraper.restaurant_scraper import RestaurantScraper, build_site_lookup
+from src.utils.constants import (
+    HTTP_CACHE_TTL_SECONDS,
+    SCRAPE_HTML_PARSER,
+    SCRAPE_MAX_ATTEMPTS,
+    SCRAPE_MAX_WORKERS,
+    SCRAPE_PER_HOST_LIMIT,
+)
+from src.utils.http_cache import ResponseCache
+from src.utils.jsonl import JsonlWriter, jsonl_to_json_array
+from src.utils.utils import HostLimiter, create_session, retry_with_backoff
 
 # Corrected path construction
 script_dir = os.path.dirname(__file__)
@@ -34,50 +50,255 @@ def load_config(path):
         print(f"An unexpected error occurred loading {path}: {e}")
         return None
 
-def extract_and_save_raw_data():
-    """Extract raw data from restaurant URLs and save to raw_extracted_data.json."""
-    sites_config = load_config(config_path)  # Use the corrected config_path
+
+def rewrite_base_url(url, base_url):
+    """Points a site URL at another host (e.g. a local stand-in server), keeping the path."""
+    if not base_url:
+        return url
+    base = urlsplit(base_url)
+    parts = urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+
+class CrawlStats:
+    """Collects per-site latencies and outcomes for an end-of-run summary."""
+
+    def __init__(self):
+        self.latencies = []
+        self.succeeded = 0
+        self.failed = 0
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.latencies.append(latency)
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[rank]
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started_at
+        total = self.succeeded + self.failed
+        throughput = total / elapsed if elapsed > 0 else 0.0
+        print("\n>>> Crawl stats")
+        print(f"    sites: {total} (ok: {self.succeeded}, failed: {self.failed})")
+        print(f"    wall time: {elapsed:.2f}s, throughput: {throughput:.2f} sites/s")
+        print(f"    latency p50: {self.percentile(50):.3f}s, p95: {self.percentile(95):.3f}s, "
+              f"max: {max(self.latencies, default=0.0):.3f}s")
+
+
+def scrape_site(site, session=None, base_url=None, limiter=None, state=None,
+                max_attempts=SCRAPE_MAX_ATTEMPTS, cache=None, site_lookup=None,
+                parser=SCRAPE_HTML_PARSER):
+    """Scrapes one sites.json entry, retrying with backoff.
+
+    Returns (restaurant_data or None, latency in seconds).
+    """
+    url = site['url']
+    name = site.get('name', url)  # Use name if available, otherwise URL
+    fetch_url = rewrite_base_url(url, base_url)
+    started = time.perf_counter()
+
+    def attempt():
+        scraper = RestaurantScraper(url, session=session, fetch_url=fetch_url, cache=cache,
+                                    site_lookup=site_lookup, parser=parser)
+        if limiter is not None:
+            with limiter.for_url(fetch_url):
+                return scraper.scrape()
+        return scraper.scrape()
+
+    print(f"\n>>> Scraping: {name} ({url})")  # Added print statement
+    restaurant_data = retry_with_backoff(attempt, url=url, state=state, max_attempts=max_attempts)
+    if restaurant_data:
+        print(f"--- Successfully scraped data for {name} ---")
+    else:
+        print(f"--- No data returned from scraping {name} ---")  # Added else case
+    return restaurant_data, time.perf_counter() - started
+
+
+class CrawlRun:
+    """Wires one crawl to its stats, checkpoint state and JSONL sink."""
+
+    def __init__(self, stats, state, writer, session=None, base_url=None, limiter=None,
+                 max_attempts=SCRAPE_MAX_ATTEMPTS, cache=None, site_lookup=None,
+                 parser=SCRAPE_HTML_PARSER):
+        self.stats = stats
+        self.state = state
+        self.writer = writer
+        self.session = session
+        self.base_url = base_url
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        self.cache = cache
+        self.site_lookup = site_lookup
+        self.parser = parser
+
+    def run_site(self, site):
+        """Scrapes a site and checkpoints the outcome as soon as it is known."""
+        restaurant_data, latency = scrape_site(site, session=self.session, base_url=self.base_url,
+                                               limiter=self.limiter, state=self.state,
+                                               max_attempts=self.max_attempts, cache=self.cache,
+                                               site_lookup=self.site_lookup, parser=self.parser)
+        if restaurant_data:
+            self.writer.write(restaurant_data)
+            self.state.mark_done(site['url'])
+        else:
+            self.state.mark_failed(site['url'])
+        self.stats.record(latency, restaurant_data is not None)
+
+
+def scrape_sites_sequential(sites, run):
+    """Scrapes sites one at a time, in order."""
+    for site in sites:
+        run.run_site(site)
+
+
+def scrape_sites_concurrent(sites, run, max_workers=SCRAPE_MAX_WORKERS):
+    """Scrapes sites on a bounded thread pool sharing one pooled session."""
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for future in [executor.submit(run.run_site, site) for site in sites]:
+            future.result()
+    finally:
+        # On Ctrl-C, drop queued sites instead of waiting for the whole crawl
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_and_save_raw_data(concurrent=False, max_workers=SCRAPE_MAX_WORKERS,
+                              per_host_limit=SCRAPE_PER_HOST_LIMIT, base_url=None,
+                              sites_path=config_path, output_dir=None, resume=False,
+                              max_attempts=SCRAPE_MAX_ATTEMPTS, use_cache=False, cache_dir=None,
+                              cache_ttl=HTTP_CACHE_TTL_SECONDS, parser=SCRAPE_HTML_PARSER, export_json=True):
+    """Extract raw data from restaurant URLs and save to raw_extracted_data.json.
+
+    Each restaurant is appended to raw_extracted_data.jsonl as soon as it is
+    scraped, and crawl_state.jsonl records which URLs are done, failed or pending.
+    With resume=True, completed URLs are skipped and only pending or failed ones
+    are scraped again. The JSON array consumed by preprocessing is rebuilt from
+    the JSONL file at the end of the run, unless export_json=False (the sharded
+    crawl merges its shards' JSONL files itself).
+
+    With concurrent=True the sites are fetched on a thread pool of `max_workers`,
+    never running more than `per_host_limit` requests against the same host.
+    `base_url` redirects every fetch to another host, e.g. the local stand-in server.
+
+    With use_cache=True pages go through the on-disk ResponseCache in `cache_dir`
+    (default output/http_cache): pages younger than `cache_ttl` seconds are reused
+    as-is, older ones are revalidated, and unchanged pages are not parsed again.
+
+    `parser` picks how script tags are found ('fast' or 'soup'; see RestaurantScraper).
+    """
+    sites_config = load_config(sites_path)  # Use the corrected config_path
 
     if not sites_config:
         print('Error: Failed to load configuration. Exiting.')
         return
 
-    all_extracted_data = []  # List to store all extracted data
-
+    sites = []
     for site in sites_config['sites']:
-        url = site.get('url')
-        name = site.get('name', url)  # Use name if available, otherwise URL
-
-        if not url:
+        if not site.get('url'):
             print(f"Skipping site entry without a URL: {site}")
             continue
+        sites.append(site)
 
-        try:
-            print(f"\n>>> Scraping: {name} ({url})")  # Added print statement
-            scraper = RestaurantScraper(url)
-            restaurant_data = scraper.scrape()
-            if restaurant_data:
-                print(f"--- Successfully scraped data for {name} ---")
-                all_extracted_data.append(restaurant_data)  # Append to the list
-            else:
-                print(f"--- No data returned from scraping {name} ---")  # Added else case
-        except Exception as error:
-            print(f"Error scraping {url}: {error}")
-            import traceback
-            traceback.print_exc()  # Print full traceback for scraping errors
-
-    # Save all extracted data to raw_extracted_data.json (replacing existing data)
     # Use project_root to place the output directory correctly within src/output/
-    output_dir = os.path.join(project_root, 'output')
+    output_dir = output_dir or os.path.join(project_root, 'output')
     os.makedirs(output_dir, exist_ok=True)  # Ensure the output directory exists
+    jsonl_path = os.path.join(output_dir, 'raw_extracted_data.jsonl')
+    state_path = os.path.join(output_dir, 'crawl_state.jsonl')
     output_path = os.path.join(output_dir, 'raw_extracted_data.json')
+
+    if resume:
+        state = CrawlState.load(state_path)
+        state.add_pending(site['url'] for site in sites)
+        counts = state.counts()
+        print(f">>> Resuming crawl: {counts[DONE]} done, {counts[FAILED]} failed, {counts[PENDING]} pending")
+        sites = [site for site in sites if not state.is_done(site['url'])]
+    else:
+        state = CrawlState(state_path)
+        state.reset(site['url'] for site in sites)
+
+    stats = CrawlStats()
+    session = create_session(pool_size=max(max_workers, 1))
+    writer = JsonlWriter(jsonl_path, append=resume)
+    cache = None
+    if use_cache:
+        cache = ResponseCache(cache_dir or os.path.join(output_dir, 'http_cache'), ttl_seconds=cache_ttl)
+    limiter = HostLimiter(per_host_limit) if concurrent else None
+    run = CrawlRun(stats, state, writer, session=session, base_url=base_url, limiter=limiter,
+                   max_attempts=max_attempts, cache=cache, site_lookup=build_site_lookup(sites),
+                   parser=parser)
+    try:
+        if concurrent:
+            scrape_sites_concurrent(sites, run, max_workers=max_workers)
+        else:
+            scrape_sites_sequential(sites, run)
+    except KeyboardInterrupt:
+        print("\n>>> Interrupted. Progress is saved; rerun with --resume to continue.")
+        return
+    finally:
+        session.close()
+        writer.close()
+        state.compact()
+        state.close()
+        stats.report()
+        if cache is not None:
+            cache.report()
+
+    if not export_json:
+        return
+
+    # Rebuild raw_extracted_data.json (replacing existing data) from the streamed records
     try:  # Added try-except for file writing
-        with open(output_path, 'w', encoding='utf-8') as f:  # Open in write mode to replace content
-            json.dump(all_extracted_data, f, indent=4, ensure_ascii=False)
-        print(f"\n>>> Saved extracted data for {len(all_extracted_data)} sites to {output_path}")
+        # Outlets dropped from sites.json since an earlier run are left out
+        current_urls = {site['url'] for site in sites_config['sites'] if site.get('url')}
+        count = jsonl_to_json_array(jsonl_path, output_path, key='url', keep_keys=current_urls)
+        print(f"\n>>> Saved extracted data for {count} sites to {output_path}")
     except Exception as e:
         print(f"Error writing data to {output_path}: {e}")
 
+    failed = state.counts()[FAILED]
+    if failed:
+        print(f">>> {failed} sites failed; rerun with --resume to retry them.")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape the restaurants listed in config/sites.json.")
+    parser.add_argument('--concurrent', action='store_true', help="Scrape sites on a thread pool.")
+    parser.add_argument('--workers', type=int, default=SCRAPE_MAX_WORKERS, help="Worker threads in concurrent mode.")
+    parser.add_argument('--per-host', type=int, default=SCRAPE_PER_HOST_LIMIT,
+                        help="Maximum in-flight requests per host in concurrent mode.")
+    parser.add_argument('--base-url', default=None,
+                        help="Fetch pages from this host instead, e.g. http://127.0.0.1:8765 for the local stand-in.")
+    parser.add_argument('--sites', default=config_path, help="Path to the sites.json file.")
+    parser.add_argument('--output-dir', default=None, help="Directory for raw_extracted_data.json.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip sites finished by a previous run and retry the failed ones.")
+    parser.add_argument('--max-attempts', type=int, default=SCRAPE_MAX_ATTEMPTS,
+                        help="Attempts per site before it is marked failed.")
+    parser.add_argument('--cache', action='store_true',
+                        help="Reuse and revalidate pages from the on-disk HTTP cache.")
+    parser.add_argument('--cache-dir', default=None, help="HTTP cache directory (default: output/http_cache).")
+    parser.add_argument('--cache-ttl', type=int, default=HTTP_CACHE_TTL_SECONDS,
+                        help="Seconds a cached page is reused before it is revalidated.")
+    parser.add_argument('--parser', choices=['fast', 'soup'], default=SCRAPE_HTML_PARSER,
+                        help="'fast' slices out <script> bodies; 'soup' builds the full BeautifulSoup tree.")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    extract_and_save_raw_data()
+    args = parse_args()
+    extract_and_save_raw_data(concurrent=args.concurrent, max_workers=args.workers,
+                              per_host_limit=args.per_host, base_url=args.base_url,
+                              sites_path=args.sites, output_dir=args.output_dir, resume=args.resume,
+                              max_attempts=args.max_attempts, use_cache=args.cache,
+                              cache_dir=args.cache_dir, cache_ttl=args.cache_ttl, parser=args.parser)
@@ -0,0 +1,241 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
+# Adjust path so the module also runs as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+
+from src.raw_data.crawl_state import FAILED, PENDING, CrawlState
+from src.raw_data.extract_raw_data import config_path, extract_and_save_raw_data, load_config
+from src.utils.constants import (
+    CRAWL_IDLE_POLL_SECONDS,
+    CRAWL_NUM_SHARDS,
+    CRAWL_NUM_WORKERS,
+    SCRAPE_MAX_WORKERS,
+    SCRAPE_PER_HOST_LIMIT,
+)
+from src.utils.jsonl import JsonlWriter, iter_jsonl, jsonl_to_json_array
+
+# Sharded crawl for catalogs too large for one process.
+#
+# sites.json is split into shards (by hash of URL, or by city) under a work
+# directory. N local worker processes pull shards from that directory: a
+# worker owns a shard while it holds an exclusive flock on the shard's lease
+# file. The kernel drops the lock when a process exits, so a shard whose
+# worker dies becomes claimable again, and the next worker resumes it from
+# the shard's own crawl state. Finished shards are marked done; once all are
+# done, the per-shard JSONL outputs are merged into raw_extracted_data.json.
+#
+#   python -m src.raw_data.sharded_crawl --workers 4 --shards 32 --by url
+
+default_work_dir = os.path.join(project_root, 'output', 'crawl_shards')
+
+
+def shard_for_site(site, num_shards, by='url'):
+    """Returns the shard number for a site, hashing its URL or its city."""
+    value = site['url'] if by == 'url' else (site.get('location') or '').lower()
+    digest = hashlib.sha1(value.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % num_shards
+
+
+def shard_name(shard_id):
+    return f"shard-{shard_id:04d}"
+
+
+class ShardQueue:
+    """Local work queue of shards backed by files in `work_dir`.
+
+    shards/<name>.json   the shard's sites, in sites.json format
+    leases/<name>.lease  flock-held by the worker processing the shard
+    done/<name>.done     written once the shard has been crawled
+    output/<name>/       the shard's JSONL output and crawl state
+    """
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.shards_dir = os.path.join(work_dir, 'shards')
+        self.leases_dir = os.path.join(work_dir, 'leases')
+        self.done_dir = os.path.join(work_dir, 'done')
+        self.output_dir = os.path.join(work_dir, 'output')
+
+    def plan(self, sites, num_shards, by='url'):
+        """Partitions sites into shard files, replacing any previous plan."""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        for path in (self.shards_dir, self.leases_dir, self.done_dir, self.output_dir):
+            os.makedirs(path, exist_ok=True)
+        shards = {}
+        for site in sites:
+            shards.setdefault(shard_for_site(site, num_shards, by), []).append(site)
+        for shard_id, shard_sites in shards.items():
+            with open(self.shard_path(shard_name(shard_id)), 'w', encoding='utf-8') as f:
+                json.dump({"sites": shard_sites}, f, indent=4)
+        return {shard_name(shard_id): len(shard_sites) for shard_id, shard_sites in sorted(shards.items())}
+
+    def shard_names(self):
+        return sorted(name[:-len('.json')] for name in os.listdir(self.shards_dir) if name.endswith('.json'))
+
+    def shard_path(self, name):
+        return os.path.join(self.shards_dir, f"{name}.json")
+
+    def shard_output_dir(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def is_done(self, name):
+        return os.path.exists(os.path.join(self.done_dir, f"{name}.done"))
+
+    def pending(self):
+        return [name for name in self.shard_names() if not self.is_done(name)]
+
+    def try_lease(self, name, worker_id):
+        """Claims a shard. Returns the open lease file (keep it open while working) or None."""
+        lease_file = open(os.path.join(self.leases_dir, f"{name}.lease"), 'a+', encoding='utf-8')
+        try:
+            fcntl.flock(lease_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lease_file.close()
+            return None
+        if self.is_done(name):  # Finished by another worker between listing and locking
+            self.release(lease_file)
+            return None
+        lease_file.seek(0)
+        lease_file.truncate()
+        json.dump({"worker": worker_id, "pid": os.getpid(), "leased_at": time.time()}, lease_file)
+        lease_file.flush()
+        return lease_file
+
+    def mark_done(self, name, summary):
+        tmp_path = os.path.join(self.done_dir, f"{name}.done.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f)
+        os.replace(tmp_path, os.path.join(self.done_dir, f"{name}.done"))
+
+    @staticmethod
+    def release(lease_file):
+        fcntl.flock(lease_file, fcntl.LOCK_UN)
+        lease_file.close()
+
+
+def run_worker(work_dir, worker_id, crawl_options):
+    """Worker loop: lease a pending shard, crawl it, mark it done, repeat until none remain.
+
+    When every pending shard is leased by someone else, the worker waits and
+    polls again, so shards from workers that die mid-crawl are picked up.
+    """
+    queue = ShardQueue(work_dir)
+    while True:
+        pending = queue.pending()
+        if not pending:
+            return
+        lease = None
+        for name in pending:
+            lease = queue.try_lease(name, worker_id)
+            if lease is not None:
+                break
+        if lease is None:
+            time.sleep(CRAWL_IDLE_POLL_SECONDS)
+            continue
+        try:
+            print(f"[worker {worker_id}] crawling {name}")
+            output_dir = queue.shard_output_dir(name)
+            # resume=True: a shard taken over from a dead worker skips what it already finished
+            extract_and_save_raw_data(sites_path=queue.shard_path(name), output_dir=output_dir,
+                                      resume=True, export_json=False, **crawl_options)
+            counts = CrawlState.load(os.path.join(output_dir, 'crawl_state.jsonl')).counts()
+            if counts[PENDING]:
+                return  # Interrupted mid-shard; leave it for a resumed crawl
+            queue.mark_done(name, {"worker": worker_id, **counts})
+        finally:
+            queue.release(lease)
+
+
+def merge_shard_outputs(queue, output_dir):
+    """Concatenates every shard's JSONL output into raw_extracted_data.jsonl/.json."""
+    merged_jsonl = os.path.join(output_dir, 'raw_extracted_data.jsonl')
+    merged_json = os.path.join(output_dir, 'raw_extracted_data.json')
+    with JsonlWriter(merged_jsonl) as writer:
+        for name in queue.shard_names():
+            shard_jsonl = os.path.join(queue.shard_output_dir(name), 'raw_extracted_data.jsonl')
+            if os.path.exists(shard_jsonl):
+                for record in iter_jsonl(shard_jsonl):
+                    writer.write(record)
+    return jsonl_to_json_array(merged_jsonl, merged_json, key='url')
+
+
+def run_sharded_crawl(num_workers=CRAWL_NUM_WORKERS, num_shards=CRAWL_NUM_SHARDS, by='url',
+                      sites_path=config_path, work_dir=default_work_dir, output_dir=None,
+                      resume=False, **crawl_options):
+    """Plans shards, runs `num_workers` local worker processes and merges their output."""
+    output_dir = output_dir or os.path.join(project_root, 'output')
+    queue = ShardQueue(work_dir)
+    if resume and os.path.isdir(queue.shards_dir):
+        print(f">>> Resuming sharded crawl: {len(queue.pending())} of {len(queue.shard_names())} shards pending")
+    else:
+        sites_config = load_config(sites_path)
+        if not sites_config:
+            print('Error: Failed to load configuration. Exiting.')
+            return
+        sites = [site for site in sites_config['sites'] if site.get('url')]
+        plan = queue.plan(sites, num_shards, by)
+        print(f">>> Planned {len(sites)} sites into {len(plan)} shards by {by}")
+
+    started = time.perf_counter()
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(work_dir, f"w{i}", crawl_options), name=f"crawl-w{i}")
+        for i in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        print("\n>>> Interrupted. Rerun with --resume to continue the sharded crawl.")
+        return
+
+    pending = queue.pending()
+    if pending:
+        print(f">>> {len(pending)} shards did not finish (workers exited early); rerun with --resume.")
+        return
+
+    count = merge_shard_outputs(queue, output_dir)
+    failed = 0
+    for name in queue.shard_names():
+        with open(os.path.join(queue.done_dir, f"{name}.done"), 'r', encoding='utf-8') as f:
+            failed += json.load(f).get(FAILED, 0)
+    elapsed = time.perf_counter() - started
+    print(f"\n>>> Merged {count} restaurants from {len(queue.shard_names())} shards into {output_dir} "
+          f"in {elapsed:.1f}s with {num_workers} workers ({failed} sites failed)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl sites.json with several local worker processes.")
+    parser.add_argument('--workers', type=int, default=CRAWL_NUM_WORKERS, help="Worker processes.")
+    parser.add_argument('--shards', type=int, default=CRAWL_NUM_SHARDS, help="Number of shards to plan.")
+    parser.add_argument('--by', choices=['url', 'city'], default='url', help="Shard by hash of URL or by city.")
+    parser.add_argument('--threads', type=int, default=SCRAPE_MAX_WORKERS, help="Scraper threads per worker.")
+    parser.add_argument('--per-host', type=int, default=SCRAPE_PER_HOST_LIMIT,
+                        help="In-flight requests per host, per worker.")
+    parser.add_argument('--resume', action='store_true', help="Continue the previous sharded crawl.")
+    parser.add_argument('--work-dir', default=default_work_dir)
+    parser.add_argument('--sites', default=config_path)
+    parser.add_argument('--output-dir', default=None)
+    parser.add_argument('--base-url', default=None)
+    parser.add_argument('--cache', action='store_true', help="Use the on-disk HTTP cache.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_sharded_crawl(num_workers=args.workers, num_shards=args.shards, by=args.by, sites_path=args.sites,
+                      work_dir=args.work_dir, output_dir=args.output_dir, resume=args.resume,
+                      concurrent=args.threads > 1, max_workers=args.threads, per_host_limit=args.per_host,
+                      base_url=args.base_url, use_cache=args.cache,
+                      cache_dir=os.path.join(project_root, 'output', 'http_cache'))
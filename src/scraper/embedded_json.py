@@ -0,0 +1,97 @@
+import json
+import re
+
+# Pulls JSON page state out of <script> bodies without regex guessing.
+#
+# A script body is first tried as a whole (Next.js ships its page state as a
+# single JSON document in <script id="__NEXT_DATA__">). Otherwise every "{" or
+# "[" is handed to JSONDecoder.raw_decode: a successful decode consumes the
+# whole value, nested objects included, and scanning resumes after it, while
+# JavaScript that is not JSON is rejected at its first invalid token.
+
+_decoder = json.JSONDecoder()
+
+# Script contents are raw text in HTML: they end at the first "</script", so
+# the bodies can be sliced out without tokenizing or building the rest of the DOM.
+_script_open = re.compile(r'<script\b[^>]*>', re.IGNORECASE)
+_script_close = re.compile(r'</script\s*>', re.IGNORECASE)
+
+
+def iter_script_bodies(html):
+    """Yields the non-empty text of every <script> element, in document order."""
+    pos = 0
+    while True:
+        opening = _script_open.search(html, pos)
+        if opening is None:
+            return
+        closing = _script_close.search(html, opening.end())
+        if closing is None:
+            return  # Unterminated script: the page is truncated
+        body = html[opening.end():closing.start()]
+        if body.strip():
+            yield body
+        pos = closing.end()
+
+
+def iter_json_values(text):
+    """Yields the top-level JSON objects and arrays embedded in a script body."""
+    stripped = text.strip()
+    if stripped[:1] in ('{', '['):
+        try:
+            yield json.loads(stripped)
+            return
+        except ValueError:
+            pass
+
+    pos = 0
+    length = len(text)
+    while pos < length:
+        brace = text.find('{', pos)
+        bracket = text.find('[', pos)
+        if brace == -1 and bracket == -1:
+            return
+        if brace == -1 or (bracket != -1 and bracket < brace):
+            start = bracket
+        else:
+            start = brace
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except ValueError:
+            pos = start + 1
+            continue
+        if isinstance(value, (dict, list)):
+            yield value
+        pos = end
+
+
+def find_objects_with_key(value, key):
+    """Yields every dict under `value` that has `key`, in document order.
+
+    Matching dicts are not searched further, so a product's own nested
+    objects (details, tags, ...) stay part of that product.
+    """
+    stack = [value]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if key in node:
+                yield node
+                continue
+            children = list(node.values())
+        elif isinstance(node, list):
+            children = node
+        else:
+            continue
+        # Reverse so that popping preserves document order
+        stack.extend(child for child in reversed(children) if isinstance(child, (dict, list)))
+
+
+def extract_products(script_texts, key='product_name'):
+    """Returns every product-like dict found in the given script bodies."""
+    products = []
+    for text in script_texts:
+        if not text or ('"' + key + '"') not in text:
+            continue  # Cheap pre-filter: most scripts carry no menu data
+        for value in iter_json_values(text):
+            products.extend(find_objects_with_key(value, key))
+    return products
@@ -0,0 +1,151 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Local stand-in for eatsure.com: serves saved restaurant pages so the scraper
+# can be exercised (and load-tested) without touching the real site.
+#
+#   python -m src.scraper.local_eatsure_server --snapshot-from-raw
+#   python -m src.scraper.local_eatsure_server --port 8765 --latency-ms 150
+#   python -m src.raw_data.extract_raw_data --concurrent --base-url http://127.0.0.1:8765
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(script_dir)
+default_pages_dir = os.path.join(src_dir, 'output', 'saved_pages')
+default_raw_path = os.path.join(src_dir, 'output', 'raw_extracted_data.json')
+default_sites_path = os.path.join(src_dir, 'config', 'sites.json')
+
+
+def page_filename(url):
+    """Maps a restaurant URL (or request path) to its saved page file name."""
+    path = urlsplit(url).path.strip('/')
+    return (path.replace('/', '__') or 'index') + '.html'
+
+
+def save_page(url, page_html, pages_dir=default_pages_dir):
+    """Stores a page so the stand-in server can serve it for `url`."""
+    os.makedirs(pages_dir, exist_ok=True)
+    with open(os.path.join(pages_dir, page_filename(url)), 'w', encoding='utf-8') as f:
+        f.write(page_html)
+
+
+def render_page(restaurant):
+    """Renders a Next.js-style EatSure page embedding the restaurant's menu items."""
+    page_state = {
+        "props": {
+            "pageProps": {
+                "brand": {"name": restaurant.get('restaurant_name'), "city": restaurant.get('location')},
+                "menu": {"categories": [{"name": "Menu", "products": restaurant.get('menu_items', [])}]},
+            }
+        },
+        "page": "/[brand]/[city]",
+    }
+    title = html.escape(restaurant.get('restaurant_name') or 'EatSure')
+    # "</" inside a script body would end the tag early; JSON allows escaping the slash.
+    state_json = json.dumps(page_state, ensure_ascii=False).replace('</', '<\\/')
+    return (
+        "<!DOCTYPE html><html><head>"
+        f"<title>{title}</title>"
+        "<script>window.dataLayer = window.dataLayer || []; function gtag(){dataLayer.push(arguments);}</script>"
+        "</head><body><div id=\"__next\"></div>"
+        "<script id=\"__NEXT_DATA__\" type=\"application/json\">"
+        f"{state_json}"
+        "</script></body></html>"
+    )
+
+
+def snapshot_from_raw(raw_path=default_raw_path, sites_path=default_sites_path, pages_dir=default_pages_dir):
+    """Writes one saved page per restaurant in a previous raw_extracted_data.json.
+
+    Records carry their source `url`; older files without it were written in
+    sites.json order, so those entries are paired with sites.json by position.
+    """
+    with open(raw_path, 'r', encoding='utf-8') as f:
+        raw_data = json.load(f)
+    with open(sites_path, 'r', encoding='utf-8') as f:
+        sites = json.load(f).get('sites', [])
+    saved = 0
+    for position, restaurant in enumerate(raw_data):
+        url = restaurant.get('url')
+        if not url and position < len(sites):
+            url = sites[position]['url']
+        if url:
+            save_page(url, render_page(restaurant), pages_dir)
+            saved += 1
+    print(f"Saved {saved} pages to {pages_dir}")
+
+
+def make_handler(pages_dir, latency_ms=0):
+    class SavedPageHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, like the real site
+
+        def do_GET(self):
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            page_path = os.path.join(pages_dir, page_filename(self.path))
+            if not os.path.exists(page_path):
+                self.send_error(404, "No saved page for this path")
+                return
+            with open(page_path, 'rb') as f:
+                body = f.read()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            last_modified = formatdate(os.path.getmtime(page_path), usegmt=True)
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep crawl output readable
+
+    return SavedPageHandler
+
+
+def start_server(pages_dir=default_pages_dir, host='127.0.0.1', port=0, latency_ms=0):
+    """Starts the stand-in server on a background thread and returns it.
+
+    Use `server.server_address` to find the bound port and `server.shutdown()` to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(pages_dir, latency_ms))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve saved EatSure pages locally.")
+    parser.add_argument('--pages-dir', default=default_pages_dir)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=int, default=0, help="Artificial delay added to every response.")
+    parser.add_argument('--snapshot-from-raw', action='store_true',
+                        help="Render pages from raw_extracted_data.json before serving.")
+    args = parser.parse_args()
+
+    if args.snapshot_from_raw:
+        snapshot_from_raw(pages_dir=args.pages_dir)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.pages_dir, args.latency_ms))
+    print(f"Serving {args.pages_dir} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,99 +1,94 @@
-import re
 import json
 import os
 from bs4 import BeautifulSoup
+from src.scraper.embedded_json import extract_products, iter_script_bodies
+from src.utils.constants import SCRAPE_HTML_PARSER
 from src.utils.utils import fetch_data, handle_errors # Assuming utils.py is in src directory
 
+sites_config_path = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'config', 'sites.json'))
+
+# Fields kept from each product object embedded in the page.
+MENU_ITEM_FIELDS = (
+    "product_id", "product_name", "hsn_code", "benefits", "product_category_id",
+    "small_description", "big_description", "is_veg", "is_customizable",
+    "is_customizable_group", "customization_limit", "spice_level", "bought_count",
+    "rating", "count_of_rating", "is_available", "is_active", "is_back_calculate_tax",
+    "tax_category", "price", "details", "feature_tags", "preparation_time", "tags",
+    "promo_tags", "ml_tags", "offer_tags", "is_featured", "brand_name", "display_price",
+    "share", "product_feedback", "switch_off_msg", "brand_display_name",
+    "price_without_tax", "tax_amount",
+)
+
+# Bump when parsing changes so cached parse results are not reused.
+PARSER_VERSION = 2
+
+
+def build_menu_item(product):
+    """Keeps the known menu fields of a product object, in a stable order."""
+    return {field: product.get(field) for field in MENU_ITEM_FIELDS}
+
+
+def normalize_site_url(url):
+    return url.rstrip('/')
+
+
+def build_site_lookup(sites):
+    """Maps each normalized site URL to its sites.json entry."""
+    return {normalize_site_url(site['url']): site for site in sites if site.get('url')}
+
+
+def load_site_lookup(path=sites_config_path):
+    """Reads sites.json once and returns its URL-to-site lookup."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return build_site_lookup(json.load(f).get('sites', []))
+    except FileNotFoundError:
+        print(f"Warning: sites.json not found at {path}")
+    except json.JSONDecodeError:
+        print(f"Warning: Failed to decode JSON from {path}")
+    return {}
+
+
 class RestaurantScraper:
     """Scrapes data for a single restaurant URL."""
 
-    def __init__(self, url):
+    def __init__(self, url, session=None, fetch_url=None, cache=None, site_lookup=None,
+                 parser=SCRAPE_HTML_PARSER):
         self.url = url
+        self.session = session  # Optional pooled requests.Session shared across scrapers
+        self.fetch_url = fetch_url or url  # Where the page is actually downloaded from
+        self.cache = cache  # Optional ResponseCache; unchanged pages skip download and parse
+        # URL-to-site lookup built once per crawl; standalone scrapers read sites.json themselves
+        self.site_lookup = site_lookup
+        self.parser = parser  # 'fast' slices out <script> bodies, 'soup' builds the full DOM
 
     def scrape(self):
         """Fetches and parses restaurant data."""
         print(f"Scraping {self.url}")
         try:
-            html = fetch_data(self.url)
+            html = fetch_data(self.fetch_url, session=self.session, cache=self.cache)
             if not html:
-                print(f"Failed to fetch HTML for {self.url}")
+                print(f"Failed to fetch HTML for {self.fetch_url}")
                 return None
 
-            soup = BeautifulSoup(html, 'html.parser')
-            extracted_data = {}
-
-            # --- Attempt to find JSON in script tags ---
-            json_regex = re.compile(r'\{.*?\}', re.DOTALL) # Find potential JSON objects
-            scripts = soup.find_all('script')
-            menu_items = []
-            for script in scripts:
-                if script.string: # Check if script tag has content
-                    potential_matches = json_regex.findall(script.string)
-                    for match in potential_matches:
-                        try:
-                            parsed_json = json.loads(match)
-                            if isinstance(parsed_json, dict) and 'product_name' in parsed_json:
-                                menu_item = {
-                                    "product_id": parsed_json.get("product_id"),
-                                    "product_name": parsed_json.get("product_name"),
-                                    "hsn_code": parsed_json.get("hsn_code"),
-                                    "benefits": parsed_json.get("benefits"),
-                                    "product_category_id": parsed_json.get("product_category_id"),
-                                    "small_description": parsed_json.get("small_description"),
-                                    "big_description": parsed_json.get("big_description"),
-                                    "is_veg": parsed_json.get("is_veg"),
-                                    "is_customizable": parsed_json.get("is_customizable"),
-                                    "is_customizable_group": parsed_json.get("is_customizable_group"),
-                                    "customization_limit": parsed_json.get("customization_limit"),
-                                    "spice_level": parsed_json.get("spice_level"),
-                                    "bought_count": parsed_json.get("bought_count"),
-                                    "rating": parsed_json.get("rating"),
-                                    "count_of_rating": parsed_json.get("count_of_rating"),
-                                    "is_available": parsed_json.get("is_available"),
-                                    "is_active": parsed_json.get("is_active"),
-                                    "is_back_calculate_tax": parsed_json.get("is_back_calculate_tax"),
-                                    "tax_category": parsed_json.get("tax_category"),
-                                    "price": parsed_json.get("price"),
-                                    "details": parsed_json.get("details"),
-                                    "feature_tags": parsed_json.get("feature_tags"),
-                                    "preparation_time": parsed_json.get("preparation_time"),
-                                    "tags": parsed_json.get("tags"),
-                                    "promo_tags": parsed_json.get("promo_tags"),
-                                    "ml_tags": parsed_json.get("ml_tags"),
-                                    "offer_tags": parsed_json.get("offer_tags"),
-                                    "is_featured": parsed_json.get("is_featured"),
-                                    "brand_name": parsed_json.get("brand_name"),
-                                    "display_price": parsed_json.get("display_price"),
-                                    "share": parsed_json.get("share"),
-                                    "product_feedback": parsed_json.get("product_feedback"),
-                                    "switch_off_msg": parsed_json.get("switch_off_msg"),
-                                    "brand_display_name": parsed_json.get("brand_display_name"),
-                                    "price_without_tax": parsed_json.get("price_without_tax"),
-                                    "tax_amount": parsed_json.get("tax_amount"),
-                                }
-                                menu_items.append(menu_item)
-                        except json.JSONDecodeError:
-                            # Ignore strings that look like JSON but aren't valid
-                            pass
-
-            # --- Load additional data from sites.json ---
-            config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'sites.json')
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    sites_data = json.load(f)
-                    # print("Loaded sites.json data:", sites_data)  # Debugging: Print loaded data
-                    for site in sites_data.get('sites', []):
-                        # print(f"Matching {self.url} with {site['url']}")  # Debugging: Print URL comparison
-                        if site['url'].rstrip('/') == self.url.rstrip('/'):  # Normalize URLs
-                            extracted_data['restaurant_name'] = site.get('name', 'Unknown Name')
-                            extracted_data['location'] = site.get('location', 'Unknown Location')
-                            extracted_data['available_time'] = site.get('Time', 'Unknown Time')
-                            extracted_data['contact'] = site.get('contact', 'Unknown Contact')
-                            break
-            except FileNotFoundError:
-                print(f"Warning: sites.json not found at {config_path}")
-            except json.JSONDecodeError:
-                print(f"Warning: Failed to decode JSON from {config_path}")
+            extracted_data = {'url': self.url}
+
+            menu_items = None
+            if self.cache:
+                menu_items = self.cache.load_parsed(self.fetch_url, html, version=PARSER_VERSION)
+            if menu_items is None:
+                menu_items = self.parse_menu_items(html)
+                if self.cache:
+                    self.cache.store_parsed(self.fetch_url, html, menu_items, version=PARSER_VERSION)
+
+            # --- Add the restaurant details from sites.json ---
+            site_lookup = self.site_lookup if self.site_lookup is not None else load_site_lookup()
+            site = site_lookup.get(normalize_site_url(self.url))
+            if site:
+                extracted_data['restaurant_name'] = site.get('name', 'Unknown Name')
+                extracted_data['location'] = site.get('location', 'Unknown Location')
+                extracted_data['available_time'] = site.get('Time', 'Unknown Time')
+                extracted_data['contact'] = site.get('contact', 'Unknown Contact')
             extracted_data['menu_items'] = menu_items
 
             return extracted_data
@@ -101,3 +96,18 @@ class RestaurantScraper:
         except Exception as e:
             handle_errors(f"Error during scraping {self.url}: {e}")
             return None
+
+    def parse_menu_items(self, html):
+        """Extracts menu item dicts from the JSON embedded in the page's script tags.
+
+        The fast parser only slices out <script> bodies. If the page mentions
+        products but none were found that way, it is parsed again with
+        BeautifulSoup in case unusual markup confused the fast path.
+        """
+        if self.parser == 'fast':
+            products = extract_products(iter_script_bodies(html))
+            if products or '"product_name"' not in html:
+                return [build_menu_item(product) for product in products]
+        soup = BeautifulSoup(html, 'html.parser')
+        scripts = [script.string for script in soup.find_all('script') if script.string]
+        return [build_menu_item(product) for product in extract_products(scripts)]
@@ -1,22 +1,85 @@
+import argparse
+import gzip
 import json
 import os
 import requests
 from xml.etree import ElementTree
 from collections import defaultdict
-from .utils.constants import MAX_RESTAURANTS_TO_FETCH
+from .utils.constants import MAX_LOCATIONS_PER_BRAND, MAX_RESTAURANTS_TO_FETCH
 
-def parse_sitemap(sitemap_url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
-    }
-    response = requests.get(sitemap_url, headers=headers)
-    response.raise_for_status()
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+}
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _local_name(tag):
+    """Strips the XML namespace from a tag name."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def open_sitemap(source, session=None):
+    """Opens a sitemap URL or local file as a binary stream, un-gzipping `.xml.gz` files."""
+    if source.startswith(('http://', 'https://')):
+        getter = session.get if session is not None else requests.get
+        response = getter(source, headers=HEADERS, stream=True)
+        response.raise_for_status()
+        response.raw.decode_content = True  # Undo Content-Encoding: gzip transparently
+        content_type = response.headers.get('Content-Type', '')
+        gzipped = source.endswith('.gz') or 'gzip' in content_type
+        stream = response.raw
+    else:
+        stream = open(source, 'rb')
+        # A .xml.gz file is gzipped content, not a transfer encoding: sniff the magic bytes
+        gzipped = source.endswith('.gz') or stream.peek(2)[:2] == GZIP_MAGIC
+
+    if gzipped:
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def iter_sitemap_urls(source, session=None):
+    """Streams page URLs from a sitemap, following sitemap indexes recursively.
 
-    root = ElementTree.fromstring(response.content)
-    urls = [url.find('{*}loc').text.strip() for url in root.findall('{*}url')]
+    The document is read with iterparse and every finished <url>/<sitemap>
+    element is cleared, so memory stays flat however large the sitemap is.
+    """
+    child_sitemaps = []
+    stream = open_sitemap(source, session)
+    try:
+        root = None
+        for event, elem in ElementTree.iterparse(stream, events=('start', 'end')):
+            if root is None:
+                root = elem
+                continue
+            if event != 'end':
+                continue
+            name = _local_name(elem.tag)
+            if name not in ('url', 'sitemap'):
+                continue
+            loc = next((child.text for child in elem if _local_name(child.tag) == 'loc'), None)
+            if loc:
+                if name == 'url':
+                    yield loc.strip()
+                else:
+                    child_sitemaps.append(loc.strip())
+            root.clear()  # Drop finished entries so the tree never grows
+    finally:
+        stream.close()
+
+    for child in child_sitemaps:
+        print(f"Following child sitemap {child}")
+        yield from iter_sitemap_urls(child, session)
+
+
+def parse_sitemap(sitemap_url):
+    """Returns every page URL in a sitemap (and its child sitemaps) as a list."""
+    urls = list(iter_sitemap_urls(sitemap_url))
     print(f"Found {len(urls)} URLs in sitemap")
     return urls
 
+
 def extract_data_from_url(url):
     """Extract restaurant details from the URL."""
     parts = url.split('/')
@@ -30,20 +93,90 @@ def extract_data_from_url(url):
         "contact": "+91 9523029342"     # Default contact changes when scraping
     }
 
-def group_restaurants_by_name(urls):
-    """Group restaurant data by name and include up to 2 locations."""
-    grouped_data = defaultdict(list)
+
+class SiteFilter:
+    """Selects which sitemap outlets end up in sites.json.
+
+    Brand and city names are compared case-insensitively against the names
+    derived from the URL (e.g. "Behrouz Biryani", "Mumbai").
+    """
+
+    def __init__(self, cities=None, allow_brands=None, deny_brands=None,
+                 max_locations_per_brand=MAX_LOCATIONS_PER_BRAND, max_brands=MAX_RESTAURANTS_TO_FETCH):
+        self.cities = {city.lower() for city in cities} if cities else None
+        self.allow_brands = {brand.lower() for brand in allow_brands} if allow_brands else None
+        self.deny_brands = {brand.lower() for brand in deny_brands} if deny_brands else set()
+        self.max_locations_per_brand = max_locations_per_brand
+        self.max_brands = max_brands
+
+    def accepts(self, entry):
+        brand = entry["name"].lower()
+        if self.allow_brands is not None and brand not in self.allow_brands:
+            return False
+        if brand in self.deny_brands:
+            return False
+        if self.cities is not None and entry["location"].lower() not in self.cities:
+            return False
+        return True
+
+
+def group_restaurants_by_name(urls, site_filter=None):
+    """Group restaurant data by brand and city as URLs stream in.
+
+    Only entries that pass the filter are kept, up to `max_locations_per_brand`
+    per brand and `max_brands` brands, so memory is bounded by the selection
+    rather than by the size of the sitemap.
+    """
+    site_filter = site_filter or SiteFilter()
+    grouped_data = defaultdict(lambda: defaultdict(list))  # brand -> city -> entries
+    kept_per_brand = defaultdict(int)
     for url in urls:
         data = extract_data_from_url(url)
-        if data:
-            grouped_data[data["name"]].append(data)
-    
-    # Limit each restaurant to 2 locations
-    for name in grouped_data:
-        grouped_data[name] = grouped_data[name][:2]
-    
+        if not data or not site_filter.accepts(data):
+            continue
+        brand = data["name"]
+        if brand not in grouped_data and site_filter.max_brands is not None \
+                and len(grouped_data) >= site_filter.max_brands:
+            continue
+        if site_filter.max_locations_per_brand is not None \
+                and kept_per_brand[brand] >= site_filter.max_locations_per_brand:
+            continue
+        grouped_data[brand][data["location"]].append(data)
+        kept_per_brand[brand] += 1
     return grouped_data
 
+
+def select_sites(grouped_restaurants):
+    """Flattens the brand/city grouping into sites.json entries."""
+    selected = []
+    for cities in grouped_restaurants.values():
+        for entries in cities.values():
+            selected.extend(entries)
+    return selected
+
+
+def load_existing_sites(json_path):
+    if not os.path.exists(json_path):
+        return []
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("sites", [])
+    except json.JSONDecodeError:
+        print(f"Warning: Could not decode {json_path}; treating every outlet as new.")
+        return []
+
+
+def diff_sites(old_sites, new_sites):
+    """Compares two site lists by URL and returns the added and removed entries."""
+    old_urls = {site["url"] for site in old_sites}
+    new_urls = {site["url"] for site in new_sites}
+    return {
+        "added": [site for site in new_sites if site["url"] not in old_urls],
+        "removed": [site for site in old_sites if site["url"] not in new_urls],
+        "unchanged": len(old_urls & new_urls),
+    }
+
+
 def update_sites_json(data, json_path):
     """Replace the sites.json file with new data."""
     new_data = {"sites": data}
@@ -56,24 +189,46 @@ def update_sites_json(data, json_path):
     with open(json_path, 'w', encoding='utf-8') as f:
         json.dump(new_data, f, indent=4)
 
-def main():
-    sitemap_url = "https://www.eatsure.com/sitemaps/brands.xml"
-    json_path = os.path.join(os.path.dirname(__file__), 'config', 'sites.json')
-    
-    urls = parse_sitemap(sitemap_url)
-    
-    grouped_restaurants = group_restaurants_by_name(urls)
-
-    # Select unique restaurants with all their locations up to the limit
-    selected_restaurants = []
-    for i, (name, locations) in enumerate(grouped_restaurants.items()):
-        # Use the imported constant here
-        if i >= MAX_RESTAURANTS_TO_FETCH:
-            break
-        selected_restaurants.extend(locations)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh config/sites.json from the EatSure sitemap.")
+    parser.add_argument('--sitemap', default="https://www.eatsure.com/sitemaps/brands.xml",
+                        help="Sitemap or sitemap index URL (or local file); .xml.gz is supported.")
+    parser.add_argument('--city', action='append', dest='cities', help="Only keep outlets in this city (repeatable).")
+    parser.add_argument('--brand', action='append', dest='allow_brands', help="Only keep this brand (repeatable).")
+    parser.add_argument('--exclude-brand', action='append', dest='deny_brands', help="Skip this brand (repeatable).")
+    parser.add_argument('--max-locations-per-brand', type=int, default=MAX_LOCATIONS_PER_BRAND)
+    parser.add_argument('--max-brands', type=int, default=MAX_RESTAURANTS_TO_FETCH,
+                        help="Cap on the number of brands (default: no cap).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    src_dir = os.path.dirname(__file__)
+    json_path = os.path.join(src_dir, 'config', 'sites.json')
+    diff_path = os.path.join(src_dir, 'output', 'sites_diff.json')
+
+    site_filter = SiteFilter(cities=args.cities, allow_brands=args.allow_brands, deny_brands=args.deny_brands,
+                             max_locations_per_brand=args.max_locations_per_brand, max_brands=args.max_brands)
+    grouped_restaurants = group_restaurants_by_name(iter_sitemap_urls(args.sitemap), site_filter)
+    selected_restaurants = select_sites(grouped_restaurants)
+
+    diff = diff_sites(load_existing_sites(json_path), selected_restaurants)
+    os.makedirs(os.path.dirname(diff_path), exist_ok=True)
+    with open(diff_path, 'w', encoding='utf-8') as f:
+        json.dump(diff, f, indent=4)
+    print(f"Selected {len(selected_restaurants)} outlets from {len(grouped_restaurants)} brands: "
+          f"{len(diff['added'])} added, {len(diff['removed'])} removed, {diff['unchanged']} unchanged.")
+
+    if not diff["added"] and not diff["removed"]:
+        print(f"No outlet changes; {json_path} left as is.")
+        return diff
 
     update_sites_json(selected_restaurants, json_path)
-    print(f"Updated {json_path} with {len(selected_restaurants)} new entries.")
+    print(f"Updated {json_path} with {len(selected_restaurants)} entries (diff saved to {diff_path}).")
+    print("Run `python -m src.raw_data.extract_raw_data --resume` to scrape only the new outlets.")
+    return diff
 
 if __name__ == "__main__":
     main()
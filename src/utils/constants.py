@@ -1,5 +1,151 @@
 # Configuration constants
 
-# The maximum number of unique restaurant brands to fetch from the sitemap.
-# Each brand might have multiple locations (up to 2 are kept).
-MAX_RESTAURANTS_TO_FETCH = 10
\ No newline at end of file
+# Optional cap on the number of unique restaurant brands taken from the sitemap
+# (None keeps the whole catalog), and how many locations are kept per brand.
+MAX_RESTAURANTS_TO_FETCH = None
+MAX_LOCATIONS_PER_BRAND = 2
+
+# HTTP client settings shared by every scraper request.
+REQUEST_TIMEOUT_SECONDS = 20
+HTTP_POOL_SIZE = 16
+
+# Concurrent scraping: total worker threads and the number of in-flight
+# requests allowed against any single host.
+SCRAPE_MAX_WORKERS = 8
+SCRAPE_PER_HOST_LIMIT = 4
+
+# Retry policy for sites that fail to scrape: attempts per run and the
+# exponential backoff window between them.
+SCRAPE_MAX_ATTEMPTS = 3
+SCRAPE_BACKOFF_BASE_SECONDS = 1.0
+SCRAPE_BACKOFF_MAX_SECONDS = 30.0
+
+# On-disk HTTP response cache: pages are served without a request for
+# HTTP_CACHE_TTL_SECONDS, then revalidated with ETag/Last-Modified. Entries
+# unused for HTTP_CACHE_MAX_AGE_SECONDS are dropped, and the least recently
+# used ones go once the cache exceeds HTTP_CACHE_MAX_BYTES.
+HTTP_CACHE_TTL_SECONDS = 6 * 60 * 60
+HTTP_CACHE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# How the scraper finds <script> bodies: 'fast' slices them out of the raw
+# HTML, 'soup' builds a full BeautifulSoup tree (also the fallback for 'fast').
+SCRAPE_HTML_PARSER = 'fast'
+
+# Sharded crawl: local worker processes, how many shards sites.json is split
+# into, and how often an idle worker checks for shards freed by dead workers.
+CRAWL_NUM_WORKERS = 4
+CRAWL_NUM_SHARDS = 32
+CRAWL_IDLE_POLL_SECONDS = 2.0
+
+# preprocess_data: processes that structure raw restaurants (None: one per
+# core, 1: in-process), and how many restaurants each may have in flight.
+PREPROCESS_WORKERS = None
+PREPROCESS_TASKS_PER_WORKER = 4
+
+# Storage dtype of the on-disk embedding cache. 'float16' halves its size at a
+# small precision cost; an existing cache keeps the dtype it was created with.
+EMBEDDING_CACHE_DTYPE = 'float32'
+
+# Indexing encoder: texts per batch, the quantized ONNX export used by the
+# 'onnx-int8' backend, and the check that backend must pass before indexing:
+# mean top-K neighbour overlap with the fp32 model on a sample of documents.
+ENCODER_BATCH_SIZE = 64
+ENCODER_ONNX_FILE = 'onnx/model_quint8_avx2.onnx'
+ENCODER_CHECK_K = 10
+ENCODER_CHECK_SAMPLE = 512
+ENCODER_MIN_TOPK_OVERLAP = 0.9
+
+# FAISS index selection when the index type is 'auto', by corpus size: flat
+# (exact) up to INDEX_FLAT_MAX_VECTORS, then HNSW, then IVF-Flat, then IVF-PQ.
+# IVF cells are trained on at most INDEX_TRAIN_SAMPLE vectors and retrained
+# once the corpus grows INDEX_RETRAIN_GROWTH times past the training set.
+INDEX_FLAT_MAX_VECTORS = 20_000
+INDEX_HNSW_MAX_VECTORS = 200_000
+INDEX_IVF_FLAT_MAX_VECTORS = 2_000_000
+INDEX_TRAIN_SAMPLE = 100_000
+INDEX_RETRAIN_GROWTH = 4
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+# Lossy indexes (int8/binary compression, IVF-PQ) fetch this many times k
+# candidates and rescore them exactly against the full-precision side file.
+RESCORE_SHORTLIST_FACTOR = 4
+
+# Chatbot caches (see src/chatbot/caches.py): entries per cache and their
+# TTLs. Retrieval results are keyed by the query embedding rounded to a
+# 1/RETRIEVAL_CACHE_BUCKET_SCALE grid; a cached answer is reused for a query
+# whose embedding has at least ANSWER_CACHE_MIN_SIMILARITY cosine similarity
+# to the one it was generated for. The index files are checked for changes
+# (which clear all three caches) at most every INDEX_VERSION_CHECK_SECONDS.
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = 24 * 60 * 60
+RETRIEVAL_CACHE_SIZE = 2048
+RETRIEVAL_CACHE_TTL_SECONDS = 60 * 60
+RETRIEVAL_CACHE_BUCKET_SCALE = 100
+ANSWER_CACHE_SIZE = 512
+ANSWER_CACHE_TTL_SECONDS = 30 * 60
+ANSWER_CACHE_MIN_SIMILARITY = 0.95
+INDEX_VERSION_CHECK_SECONDS = 5.0
+
+# Filtered retrieval: when at most this many vectors pass the filters and the
+# index has a full-precision side file, they are scored exactly from it
+# instead of searching the index with an ID selector.
+FILTER_EXACT_MAX_IDS = 2048
+
+# Lexical retrieval: BM25 term-frequency saturation (k1) and length
+# normalization (b), and the rank offset of reciprocal rank fusion, which
+# merges BM25 and FAISS results. RETRIEVAL_MODE is the chatbot default:
+# 'dense' (FAISS only), 'lexical' (BM25 only) or 'hybrid' (both, fused).
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+RETRIEVAL_MODE = 'hybrid'
+
+# A chatbot resource (index, model, ...) that failed to load is retried on
+# the next request after this long.
+RESOURCE_RETRY_SECONDS = 30.0
+
+# Prompt context (see src/chatbot/context_builder.py): retrieved items are
+# merged across outlets and picked by maximal marginal relevance until the
+# context is about CONTEXT_TOKEN_BUDGET tokens. CONTEXT_MMR_LAMBDA weighs
+# relevance against diversity (1.0 ignores diversity).
+CONTEXT_TOKEN_BUDGET = 2000
+CONTEXT_MMR_LAMBDA = 0.7
+
+# Chatbot answer model (see src/chatbot/llm_backends.py). LLM_BACKEND is
+# 'gemini' or 'offline' (a local stand-in for tests and load tests); the
+# CHATBOT_LLM_BACKEND environment variable overrides it. Every call must
+# finish within LLM_TIMEOUT_SECONDS; failures are retried up to
+# LLM_MAX_RETRIES times after a random wait of up to
+# LLM_RETRY_BACKOFF_SECONDS x 2^(retry - 1). With LLM_HEDGE_REQUESTS, a
+# second request is raced against one that is slower than the p95 of the
+# last calls (once LLM_HEDGE_MIN_SAMPLES are known). After
+# LLM_BREAKER_FAILURES failed calls in a row the backend is left alone for
+# LLM_BREAKER_RESET_SECONDS and answers come from a template.
+LLM_BACKEND = 'gemini'
+LLM_TIMEOUT_SECONDS = 30.0
+LLM_MAX_RETRIES = 2
+LLM_RETRY_BACKOFF_SECONDS = 0.5
+LLM_HEDGE_REQUESTS = False
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_BREAKER_FAILURES = 5
+LLM_BREAKER_RESET_SECONDS = 30.0
+
+# Async serving (see src/chatbot/server.py): queries arriving within
+# SERVER_BATCH_WINDOW_SECONDS of each other are embedded and searched as one
+# batch (at most SERVER_MAX_BATCH), and at most SERVER_LLM_CONCURRENCY LLM
+# calls run at a time.
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8080
+SERVER_BATCH_WINDOW_SECONDS = 0.005
+SERVER_MAX_BATCH = 64
+SERVER_LLM_CONCURRENCY = 8
+
+# Query router (see src/chatbot/router.py): counting and price questions are
+# answered from aggregate tables built at index time, without retrieval or
+# the LLM. A price-filtered list ("meals under 150") shows at most
+# ROUTER_LIST_LIMIT dishes.
+ROUTER_ENABLED = True
+ROUTER_LIST_LIMIT = 8
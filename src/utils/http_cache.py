@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from src.utils.constants import (
+    HTTP_CACHE_MAX_AGE_SECONDS,
+    HTTP_CACHE_MAX_BYTES,
+    HTTP_CACHE_TTL_SECONDS,
+)
+
+
+def url_key(url):
+    """Cache key for a URL."""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Persistent on-disk cache of HTTP responses, keyed by URL.
+
+    Each entry keeps the body plus its ETag/Last-Modified validators. Within
+    `ttl_seconds` of being stored or revalidated an entry is served without any
+    request; after that fetch_data() revalidates it with a conditional GET, and
+    a 304 reuses the stored body. Entries unused for `max_age_seconds` are
+    dropped, and the least recently used ones are evicted whenever the cache
+    grows past `max_bytes`.
+
+    The cache can also keep a parse result next to a body (store_parsed), so
+    an unchanged page is not parsed again either.
+    """
+
+    def __init__(self, cache_dir, ttl_seconds=HTTP_CACHE_TTL_SECONDS, max_bytes=HTTP_CACHE_MAX_BYTES,
+                 max_age_seconds=HTTP_CACHE_MAX_AGE_SECONDS):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.stats = {"fresh_hits": 0, "revalidated": 0, "misses": 0, "parse_hits": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+        self.evict()
+
+    # --- Entry access -------------------------------------------------------
+
+    def lookup(self, url):
+        """Returns the metadata for a cached URL, or None."""
+        with self._lock:
+            entry = self._entries.get(url_key(url))
+            return dict(entry) if entry else None
+
+    def is_fresh(self, entry):
+        return time.time() - entry["validated_at"] < self.ttl_seconds
+
+    def conditional_headers(self, entry):
+        """Validators to send with a revalidation request."""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read_body(self, url):
+        """Returns the cached body for a URL and marks it as recently used."""
+        key = url_key(url)
+        try:
+            with open(self._path(key, 'body'), 'r', encoding='utf-8') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry["last_access"] = time.time()
+                self._write_meta(key, entry)
+        return body
+
+    def mark_revalidated(self, url):
+        """Restarts the freshness window of an entry after a 304."""
+        key = url_key(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry["validated_at"] = time.time()
+                self._write_meta(key, entry)
+
+    def store(self, url, body, etag=None, last_modified=None):
+        """Stores a freshly downloaded body with its validators."""
+        key = url_key(url)
+        now = time.time()
+        with open(self._path(key, 'body'), 'w', encoding='utf-8') as f:
+            f.write(body)
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": content_hash(body),
+            "size": os.path.getsize(self._path(key, 'body')),
+            "validated_at": now,
+            "last_access": now,
+        }
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous:
+                self._total_bytes -= previous["size"]
+            self._entries[key] = entry
+            self._total_bytes += entry["size"]
+            self._write_meta(key, entry)
+        self.evict()
+
+    # --- Parse results ------------------------------------------------------
+
+    def load_parsed(self, url, body, version=None):
+        """Returns the stored parse result for this exact body and parser version, or None."""
+        try:
+            with open(self._path(url_key(url), 'parsed'), 'r', encoding='utf-8') as f:
+                parsed = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if parsed.get("content_hash") != content_hash(body) or parsed.get("version") != version:
+            return None
+        self.count("parse_hits")
+        return parsed["data"]
+
+    def store_parsed(self, url, body, data, version=None):
+        key = url_key(url)
+        with open(self._path(key, 'parsed'), 'w', encoding='utf-8') as f:
+            json.dump({"content_hash": content_hash(body), "version": version, "data": data}, f,
+                      ensure_ascii=False)
+
+    # --- Housekeeping -------------------------------------------------------
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until under max_bytes."""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items()
+                       if now - entry["last_access"] > self.max_age_seconds]
+            for key in expired:
+                self._remove(key)
+            if self._total_bytes > self.max_bytes:
+                by_last_access = sorted(self._entries.items(), key=lambda kv: kv[1]["last_access"])
+                for key, _ in by_last_access:
+                    if self._total_bytes <= self.max_bytes:
+                        break
+                    self._remove(key)
+
+    def report(self):
+        stats = self.stats
+        lookups = stats["fresh_hits"] + stats["revalidated"] + stats["misses"]
+        hit_rate = (stats["fresh_hits"] + stats["revalidated"]) / lookups if lookups else 0.0
+        print("\n>>> HTTP cache stats")
+        print(f"    fresh hits: {stats['fresh_hits']}, revalidated (304): {stats['revalidated']}, "
+              f"misses: {stats['misses']}, hit rate: {hit_rate:.1%}")
+        print(f"    parses skipped: {stats['parse_hits']}, evictions: {stats['evictions']}, "
+              f"entries: {len(self._entries)}, size: {self._total_bytes / 1024 / 1024:.1f} MB")
+
+    def _path(self, key, kind):
+        return os.path.join(self.cache_dir, f"{key}.{kind}")
+
+    def _write_meta(self, key, entry):
+        tmp_path = self._path(key, 'meta.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(key, 'meta'))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry["size"]
+        self.stats["evictions"] += 1
+        for kind in ('meta', 'body', 'parsed'):
+            try:
+                os.remove(self._path(key, kind))
+            except FileNotFoundError:
+                pass
+
+    def _load_index(self):
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.meta'):
+                continue
+            key = name[:-len('.meta')]
+            try:
+                with open(os.path.join(self.cache_dir, name), 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if not os.path.exists(self._path(key, 'body')):
+                continue
+            self._entries[key] = entry
+            self._total_bytes += entry["size"]
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+
+
+class JsonlWriter:
+    """Appends one JSON record per line, flushing after each so records survive a crash."""
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if append:
+            _drop_partial_last_line(path)
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _drop_partial_last_line(path):
+    """Truncates a line left half-written by an interrupted run."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        data = f.read()
+        f.truncate(data.rfind(b"\n") + 1)
+
+
+def iter_jsonl(path):
+    """Yields the records of a JSONL file, skipping lines that fail to decode."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping undecodable line in {path}")
+
+
+def iter_json_array(path, chunk_size=1 << 20):
+    """Yields the elements of a JSON array file one at a time, reading `chunk_size` characters at a time.
+
+    Memory holds one element (plus a chunk) instead of the whole array.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, pos, started = '', 0, False
+        while True:
+            # Skip whitespace and the separators between elements
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,' + ('' if started else '['):
+                started = started or buffer[pos] == '['
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    if buffer[pos:].strip():
+                        raise
+                    return
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            if end == len(buffer):
+                # A number may continue in the next chunk
+                chunk = f.read(chunk_size)
+                if chunk:
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    continue
+            yield element
+            pos = end
+
+
+def jsonl_to_json_array(jsonl_path, json_path, key=None, keep_keys=None):
+    """Streams a JSONL file into a JSON array file without loading it all.
+
+    When `key` is given, only the last record for each key value is kept, so a
+    site re-scraped after an interrupted run is not written twice. `keep_keys`
+    further restricts the output to records whose key value is in that set.
+    """
+    last_line_for_key = None
+    if key is not None:
+        last_line_for_key = {}
+        for line_no, record in enumerate(iter_jsonl(jsonl_path)):
+            last_line_for_key[record.get(key)] = line_no
+        keep = set(last_line_for_key.values())
+
+    count = 0
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write("[\n")
+        for line_no, record in enumerate(iter_jsonl(jsonl_path)):
+            if last_line_for_key is not None and line_no not in keep:
+                continue
+            if keep_keys is not None and record.get(key) not in keep_keys:
+                continue
+            if count:
+                out.write(",\n")
+            out.write(json.dumps(record, indent=4, ensure_ascii=False))
+            count += 1
+        out.write("\n]\n")
+    os.replace(tmp_path, json_path)
+    return count
@@ -1,16 +1,124 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from src.utils.constants import (
+    HTTP_POOL_SIZE,
+    REQUEST_TIMEOUT_SECONDS,
+    SCRAPE_BACKOFF_BASE_SECONDS,
+    SCRAPE_BACKOFF_MAX_SECONDS,
+    SCRAPE_MAX_ATTEMPTS,
+)
+
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0'}  # Add a User-Agent
+
+
+def create_session(pool_size=HTTP_POOL_SIZE):
+    """Creates a requests session that keeps connections alive and pools them per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
 
-def fetch_data(url):
-    """Fetches HTML content from a given URL."""
+
+def fetch_data(url, session=None, timeout=REQUEST_TIMEOUT_SECONDS, cache=None):
+    """Fetches HTML content from a given URL.
+
+    Pass a session from create_session() to reuse pooled keep-alive connections,
+    and a ResponseCache to serve fresh pages from disk and revalidate stale ones
+    with a conditional request.
+    """
     try:
-        response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}) # Add a User-Agent
+        headers = {}
+        entry = cache.lookup(url) if cache is not None else None
+        if entry is not None:
+            if cache.is_fresh(entry):
+                body = cache.read_body(url)
+                if body is not None:
+                    cache.count("fresh_hits")
+                    return body
+            headers = cache.conditional_headers(entry)
+
+        if session is not None:
+            response = session.get(url, headers=headers, timeout=timeout)
+        else:
+            response = requests.get(url, headers={**DEFAULT_HEADERS, **headers}, timeout=timeout)
+
+        if response.status_code == 304 and entry is not None:
+            body = cache.read_body(url)
+            if body is not None:
+                cache.mark_revalidated(url)
+                cache.count("revalidated")
+                return body
+            # The body vanished under us; fetch it again unconditionally
+            return fetch_data(url, session=session, timeout=timeout)
+
         response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+        if cache is not None:
+            cache.count("misses")
+            cache.store(url, response.text, etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'))
         return response.text
     except requests.exceptions.RequestException as e:
         print(f"Error fetching {url}: {e}")
         return None
 
-def handle_errors(error):
-    """Placeholder for error handling logic."""
-    # In a real application, you might log errors or implement retry logic
-    print(f"An error occurred: {error}")
+
+class HostLimiter:
+    """Caps the number of concurrent requests made against each host."""
+
+    def __init__(self, per_host_limit):
+        self.per_host_limit = per_host_limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, url):
+        """Returns the semaphore guarding the host of the given URL."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._semaphores[host] = semaphore
+            return semaphore
+
+
+def handle_errors(error, url=None, state=None, attempt=None):
+    """Reports an error and, when a crawl state is given, records it against the URL."""
+    prefix = f"[attempt {attempt}] " if attempt else ""
+    print(f"{prefix}An error occurred: {error}")
+    if state is not None and url is not None:
+        state.record_error(url, str(error))
+
+
+def backoff_delay(attempt, base=SCRAPE_BACKOFF_BASE_SECONDS, cap=SCRAPE_BACKOFF_MAX_SECONDS):
+    """Exponential backoff with full jitter for the given 1-based attempt number."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+def retry_with_backoff(func, url=None, state=None, max_attempts=SCRAPE_MAX_ATTEMPTS,
+                       base_delay=SCRAPE_BACKOFF_BASE_SECONDS, max_delay=SCRAPE_BACKOFF_MAX_SECONDS):
+    """Calls func() until it returns a truthy result or attempts run out.
+
+    Exceptions and empty results both count as failures; each one goes through
+    handle_errors() so the crawl state keeps the attempt count and last error.
+    Returns the result, or None if every attempt failed.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            result = func()
+            if result:
+                return result
+            error = "no data returned"
+        except Exception as e:
+            error = e
+        handle_errors(error, url=url, state=state, attempt=attempt)
+        if attempt < max_attempts:
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
+    return None
@@ -1,5 +1,5 @@
 import streamlit as st
-from src.chatbot.chatbot import chatbot_respond
+from src.chatbot.chatbot import ChatbotEngine
 
 # Page configuration with custom theme
 st.set_page_config(
@@ -8,6 +8,15 @@ st.set_page_config(
     layout="wide"
 )
 
+
+@st.cache_resource
+def load_engine():
+    """One engine per server process, shared by every session and rerun; loads in the background."""
+    return ChatbotEngine().start(warm_up=True)
+
+
+engine = load_engine()
+
 # Custom CSS for better styling
 st.markdown("""
     <style>
@@ -63,36 +72,59 @@ for msg in st.session_state.messages:
     else:
         st.markdown(f'<div class="bot-message">{msg["content"]}</div>', unsafe_allow_html=True)
 
-# Chat input
-user_input = st.chat_input("What food are you craving today? 😋")
-
-if user_input:
-    # Add user message
-    st.session_state.messages.append({"role": "user", "content": user_input})
-    
-    # Get bot response
-    with st.spinner("SwiggyBot is thinking... 🤔"):
-        bot_response = chatbot_respond(user_input)
-        st.session_state.messages.append({"role": "assistant", "content": bot_response})
-    
-    # Force rerun to update chat
-    st.rerun()
-
 # Quick filters
 st.sidebar.title("Quick Filters")
+engine_status = engine.status()
+if 'loading' in engine_status.values():
+    st.sidebar.info("Loading the menu search... you can type your question meanwhile.")
+for name, state in engine_status.items():
+    if state.startswith('error'):
+        st.sidebar.warning(f"{name} unavailable ({state[len('error: '):]})")
+if engine.ready_seconds is not None:
+    st.sidebar.caption(f"Menu search ready in {engine.ready_seconds:.1f}s")
 st.sidebar.markdown("### Dietary Preferences")
-st.sidebar.checkbox("Vegetarian")
-st.sidebar.checkbox("Vegan")
-st.sidebar.checkbox("Gluten-Free")
+vegetarian = st.sidebar.checkbox("Vegetarian")
+vegan = st.sidebar.checkbox("Vegan")
+gluten_free = st.sidebar.checkbox("Gluten-Free")
 
 st.sidebar.markdown("### Price Range")
-price_range = st.sidebar.slider("Maximum Price (₹)", 0, 1000, 500)
+price_range = st.sidebar.slider("Maximum Price (₹)", 0, 1000, 1000, help="1000 means no limit")
 
 st.sidebar.markdown("### Sort By")
-st.sidebar.radio("", ["Rating", "Price: Low to High", "Price: High to Low", "Delivery Time"])
+sort_label = st.sidebar.radio("", ["Relevance", "Rating", "Price: Low to High", "Price: High to Low"])
+
+# Sidebar choices become metadata filters applied inside the search
+filters = {}
+if vegetarian:
+    filters["dish_type"] = "veg"
+if vegan:
+    filters["dietary_tags"] = "vegan"
+if gluten_free:
+    filters["gluten_free"] = True
+if price_range < 1000:
+    filters["price"] = (None, price_range)
+sort = {"Rating": "rating", "Price: Low to High": "price_asc", "Price: High to Low": "price_desc"}.get(sort_label)
 
 # Popular searches
 st.sidebar.markdown("### Popular Searches")
-st.sidebar.button("🔥 Spicy Biryani")
-st.sidebar.button("🍕 Pizza Deals")
-st.sidebar.button("🥗 Healthy Options")
\ No newline at end of file
+popular_search = None
+for label, query in (("🔥 Spicy Biryani", "Spicy Biryani"), ("🍕 Pizza Deals", "Pizza Deals"),
+                     ("🥗 Healthy Options", "Healthy Options")):
+    if st.sidebar.button(label):
+        popular_search = query
+
+# Chat input
+user_input = st.chat_input("What food are you craving today? 😋") or popular_search
+
+if user_input:
+    # Add user message
+    st.session_state.messages.append({"role": "user", "content": user_input})
+    
+    st.markdown(f'<div class="user-message">{user_input}</div>', unsafe_allow_html=True)
+
+    # Get bot response, shown as it is generated
+    bot_response = st.write_stream(engine.respond_stream(user_input, filters or None, sort))
+    st.session_state.messages.append({"role": "assistant", "content": bot_response})
+    
+    # Force rerun to update chat
+    st.rerun()
\ No newline at end of file